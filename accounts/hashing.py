@@ -0,0 +1,21 @@
+"""
+Password hashing for the provisioning worker pool
+
+This module deliberately does not set up Django: the spawned workers of
+provision_users only need the hasher instance they are sent, whose
+encode() and salt() do not read settings.
+"""
+
+
+def hash_passwords(hasher, passwords):
+    """
+    Hash a chunk of passwords, each with a fresh salt
+
+    Args:
+        hasher: Password hasher instance, e.g. get_hasher('default')
+        passwords: List of raw passwords
+
+    Returns:
+        list: Encoded passwords in the same order
+    """
+    return [hasher.encode(password, hasher.salt()) for password in passwords]
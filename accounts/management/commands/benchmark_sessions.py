@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from importlib import import_module
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request latency of the db, cache and cached_db session stores under concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--engines',
+            nargs='+',
+            choices=list(ENGINES),
+            default=list(ENGINES),
+            help='Session stores to measure'
+        )
+        parser.add_argument(
+            '--concurrency',
+            nargs='+',
+            type=int,
+            default=[1, 4, 16],
+            help='Numbers of concurrent threads to measure'
+        )
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=500,
+            help='Sessions created per store before measuring'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Simulated requests per store and concurrency level'
+        )
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.1,
+            help='Fraction of requests that modify and save their session'
+        )
+
+    def handle(self, *args, **options):
+        if options['sessions'] < 1 or options['requests'] < 1:
+            raise CommandError('--sessions and --requests must be positive')
+        if min(options['concurrency']) < 1:
+            raise CommandError('--concurrency values must be positive')
+
+        self.stdout.write(
+            f'{"store":<10} {"threads":>7} {"req/s":>9} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"p99 ms":>8} {"errors":>7}'
+        )
+        for name in options['engines']:
+            store_class = import_module(ENGINES[name]).SessionStore
+            keys = self.create_sessions(store_class, options['sessions'])
+            try:
+                for threads in options['concurrency']:
+                    latencies, errors, elapsed = self.measure(
+                        store_class, keys, threads,
+                        options['requests'], options['write_ratio']
+                    )
+                    self.report(name, threads, latencies, errors, elapsed)
+            finally:
+                for key in keys:
+                    store_class().delete(key)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def create_sessions(self, store_class, count):
+        keys = []
+        for number in range(count):
+            store = store_class()
+            store['_auth_user_id'] = str(number)
+            store['_auth_user_backend'] = 'accounts.backends.ProfileBackend'
+            store.create()
+            keys.append(store.session_key)
+        return keys
+
+    def measure(self, store_class, keys, threads, requests, write_ratio):
+        """
+        Run requests spread over threads; each one loads a session the way
+        SessionMiddleware and AuthenticationMiddleware do, and some save it
+
+        Returns:
+            tuple: (latencies in seconds, error count, wall-clock seconds)
+        """
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(count, seed):
+            rng = random.Random(seed)
+            timings = []
+            failed = 0
+            barrier.wait()
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    try:
+                        store = store_class(session_key=rng.choice(keys))
+                        store.get('_auth_user_id')
+                        if rng.random() < write_ratio:
+                            store['last_seen'] = time.time()
+                            store.save()
+                    except Exception:
+                        failed += 1
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(timings)
+                    errors.append(failed)
+
+        workers = [
+            threading.Thread(target=worker, args=(requests // threads + (index < requests % threads), index))
+            for index in range(threads)
+        ]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return latencies, sum(errors), time.perf_counter() - started
+
+    def report(self, name, threads, latencies, errors, elapsed):
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+        self.stdout.write(
+            f'{name:<10} {threads:>7} {len(latencies) / max(elapsed, 1e-9):>9.0f} '
+            f'{percentile(0.5):>8.2f} {percentile(0.95):>8.2f} {percentile(0.99):>8.2f} '
+            f'{errors:>7}'
+        )
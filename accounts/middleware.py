@@ -0,0 +1,23 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+PROFILE_BACKEND = 'accounts.backends.ProfileBackend'
+
+
+class ProfileBackendMiddleware:
+    """
+    Move sessions that logged in through the plain ModelBackend onto
+    ProfileBackend, so they load the profile with the user from their
+    first request instead of after the next login
+
+    Must come before AuthenticationMiddleware resolves request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) == MODEL_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = PROFILE_BACKEND
+        return self.get_response(request)
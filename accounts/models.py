@@ -34,9 +34,56 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Fields compared to decide whether the profile needs writing
+    TRACKED_FIELDS = ('role', 'phone', 'bio', 'profile_picture')
+    
     def __str__(self):
         return f"{self.user.username} - {self.role}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        saved = self._tracked_values()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and hasattr(self, '_loaded_values'):
+            # Fields left out of update_fields are still unsaved
+            saved = {
+                name: saved[name] if name in update_fields else value
+                for name, value in self._loaded_values.items()
+            }
+        self._loaded_values = saved
+    
+    def get_dirty_fields(self):
+        """
+        Return the tracked fields changed since the profile was loaded or saved
+        
+        Returns:
+            list: Field names; all tracked fields for an unsaved profile
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return list(self.TRACKED_FIELDS)
+        current = self._tracked_values()
+        return [
+            name for name in self.TRACKED_FIELDS 
+            if name in loaded and current[name] != loaded[name]
+        ]
+    
+    def _tracked_values(self):
+        deferred = self.get_deferred_fields()
+        values = {}
+        for name in self.TRACKED_FIELDS:
+            if name in deferred:
+                continue
+            field = self._meta.get_field(name)
+            values[name] = field.get_prep_value(field.value_from_object(self))
+        return values
+    
     class Meta:
         db_table = 'user_profiles'
         verbose_name = 'User Profile'
@@ -52,6 +99,18 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save UserProfile instance when User is saved"""
-    instance.profile.save()
+def save_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Save the UserProfile along with its User, but only if the profile was
+    loaded on the user and one of its own fields changed
+    """
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if not User.profile.is_cached(instance):
+        return
+    
+    dirty = instance.profile.get_dirty_fields()
+    if dirty:
+        instance.profile.save(update_fields=dirty + ['updated_at'])
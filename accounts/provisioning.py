@@ -0,0 +1,221 @@
+import csv
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from .hashing import hash_passwords
+from .models import UserProfile
+
+
+# Users validated, hashed and inserted per transaction
+PROVISION_BATCH_SIZE = 1000
+# Passwords sent to a worker per task
+HASH_CHUNK_SIZE = 50
+
+
+def iter_user_rows(file):
+    """
+    Yield (line number, row) from a CSV of accounts, binary or text
+
+    The header names the columns: username is required; email,
+    first_name, last_name, password and role are optional.
+    """
+    if isinstance(file.read(0), bytes):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+    reader = csv.DictReader(file)
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    if 'username' not in reader.fieldnames:
+        raise ValueError('CSV needs a username column')
+    for line_number, row in enumerate(reader, 2):
+        yield line_number, row
+
+
+class UserProvisioner:
+    """
+    Create accounts with their profiles in batches
+
+    Passwords are hashed across a pool of spawned worker processes while
+    the previous batch is written. Each batch is inserted inside one
+    transaction with a bulk_create of users and a bulk_create of profiles.
+    bulk_create sends no post_save, so create_user_profile does not run
+    and the profiles are created here, in the same transaction, with
+    their role already set: no user is committed without a profile.
+    """
+
+    def __init__(self, workers=None, batch_size=PROVISION_BATCH_SIZE, role='student', password=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.role = role
+        self.password = password
+        self.hasher = get_hasher('default')
+        self.seen = set()
+        self.results = []
+        self.stats = {'created': 0, 'exists': 0, 'duplicate': 0, 'invalid': 0, 'errors': []}
+
+    def run(self, rows, progress=None):
+        """
+        Provision every row from an iterable of (line number, row)
+
+        Args:
+            rows: Iterable such as iter_user_rows(file)
+            progress: Optional callable(stats) called after each batch
+
+        Returns:
+            dict: Counts of created, existing, duplicate and invalid rows,
+                  plus a list of (line number, message) errors
+        """
+        pool = None
+        if self.workers != 0:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+        try:
+            pending = None
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    pending = self._advance(pool, batch, pending, progress)
+                    batch = []
+            if batch:
+                pending = self._advance(pool, batch, pending, progress)
+            if pending:
+                self.write_batch(*pending)
+                if progress:
+                    progress(self.stats)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return self.stats
+
+    def _advance(self, pool, batch, pending, progress):
+        # Hash this batch in the pool while the previous one is written
+        users = self.prepare_batch(batch)
+        hashes = self.hash_batch(pool, users)
+        if pending:
+            self.write_batch(*pending)
+            if progress:
+                progress(self.stats)
+        return users, hashes
+
+    def prepare_batch(self, batch):
+        """Validate a batch and drop rows whose username exists or repeats"""
+        users = []
+        for line_number, row in batch:
+            try:
+                users.append(self.clean_row(row))
+            except ValidationError as e:
+                self.stats['invalid'] += 1
+                self.stats['errors'].append((line_number, ' '.join(e.messages)))
+                self.results.append(((row.get('username') or '').strip(), 'invalid'))
+
+        existing = set(User.objects.filter(
+            username__in=[user.username for user in users]
+        ).values_list('username', flat=True))
+
+        kept = []
+        for user in users:
+            if user.username in self.seen:
+                status = 'duplicate'
+            elif user.username in existing:
+                status = 'exists'
+            else:
+                status = None
+                self.seen.add(user.username)
+                kept.append(user)
+            if status:
+                self.stats[status] += 1
+                self.results.append((user.username, status))
+        return kept
+
+    def clean_row(self, row):
+        """Build an unsaved User from a CSV row, raw password and role attached"""
+        username = (row.get('username') or '').strip()
+        if not username:
+            raise ValidationError('Username is required')
+        if len(username) > 150:
+            raise ValidationError(f'Username is longer than 150 characters: {username[:40]}...')
+        UnicodeUsernameValidator()(username)
+
+        email = (row.get('email') or '').strip()
+        if email:
+            validate_email(email)
+
+        role = (row.get('role') or '').strip().lower() or self.role
+        if role not in dict(UserProfile.ROLE_CHOICES):
+            raise ValidationError(f'Unknown role {role!r} for {username}')
+
+        user = User(
+            username=username,
+            email=email,
+            first_name=(row.get('first_name') or '').strip()[:150],
+            last_name=(row.get('last_name') or '').strip()[:150],
+        )
+        user.raw_password = row.get('password') or self.password
+        user.role = role
+        return user
+
+    def hash_batch(self, pool, users):
+        """
+        Start hashing the passwords of a batch
+
+        Returns:
+            list: Futures (or, without a pool, lists) of encoded passwords
+                  for consecutive chunks of the users that have a password
+        """
+        passwords = [user.raw_password for user in users if user.raw_password]
+        chunks = [
+            passwords[start:start + HASH_CHUNK_SIZE]
+            for start in range(0, len(passwords), HASH_CHUNK_SIZE)
+        ]
+        if pool is None:
+            return [hash_passwords(self.hasher, chunk) for chunk in chunks]
+        return [pool.submit(hash_passwords, self.hasher, chunk) for chunk in chunks]
+
+    def write_batch(self, users, hashes):
+        """Insert a batch of users and their profiles in one transaction"""
+        encoded = iter([
+            password
+            for chunk in hashes
+            for password in (chunk if isinstance(chunk, list) else chunk.result())
+        ])
+        for user in users:
+            # Accounts without a password must reset it before logging in
+            user.password = next(encoded) if user.raw_password else make_password(None)
+            user.raw_password = None
+
+        with transaction.atomic():
+            # A username created since prepare_batch checked is skipped
+            # rather than failing the batch. Inserts that ignore conflicts
+            # return no IDs, so the rows are read back; each encoded
+            # password has its own salt, which tells ours apart
+            User.objects.bulk_create(users, batch_size=500, ignore_conflicts=True)
+            stored = {
+                username: (user_id, password)
+                for username, user_id, password in User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list('username', 'id', 'password')
+            }
+            created = []
+            for user in users:
+                user_id, password = stored[user.username]
+                if password == user.password:
+                    user.pk = user_id
+                    created.append(user)
+                else:
+                    self.stats['exists'] += 1
+                    self.results.append((user.username, 'exists'))
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, role=user.role) for user in created
+            ], batch_size=500)
+
+        self.stats['created'] += len(created)
+        self.results.extend((user.username, 'created') for user in created)
@@ -1,6 +1,20 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
 from .models import UserProfile
+from .provisioning import UserProvisioner
 
 
 class UserProfileTestCase(TestCase):
@@ -31,3 +45,184 @@ class UserProfileTestCase(TestCase):
         self.user.profile.role = 'instructor'
         self.user.profile.save()
         self.assertEqual(self.user.profile.role, 'instructor')
+
+
+class ProfileBackendTestCase(TestCase):
+    """
+    Test cases for loading the profile together with the session user
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='testpass123')
+    
+    def profile_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('courses:list'))
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in queries 
+            if query['sql'].startswith('SELECT') and 'FROM "user_profiles"' in query['sql']
+        ]
+    
+    def test_role_check_costs_no_query(self):
+        """Test the profile is joined to the user rather than loaded lazily"""
+        self.client.login(username='student', password='testpass123')
+        self.assertEqual(self.profile_queries(), [])
+    
+    def test_model_backend_session_upgraded(self):
+        """Test sessions from the plain ModelBackend move to ProfileBackend"""
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.profile_queries(), [])
+        self.assertEqual(
+            self.client.session[BACKEND_SESSION_KEY], 
+            'accounts.backends.ProfileBackend'
+        )
+
+
+class ProfilePersistenceTestCase(TestCase):
+    """
+    Test cases for writing the profile only when it changes
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='testpass123')
+    
+    def test_login_view_query_count(self):
+        """Test logging in neither loads nor writes the profile"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('accounts:login'), {
+                'username': 'student',
+                'password': 'testpass123'
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            [query['sql'] for query in queries if 'user_profiles' in query['sql']], 
+            []
+        )
+        # User lookup, session create (3), last_login update, session save (3)
+        self.assertEqual(len(queries), 9)
+    
+    def test_user_save_skips_clean_profile(self):
+        """Test saving a user does not rewrite an unchanged profile"""
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.first_name = 'Changed'
+        with self.assertNumQueries(1):
+            user.save()
+    
+    def test_user_save_writes_dirty_profile(self):
+        """Test a changed profile is still saved through its user"""
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.profile.role = 'instructor'
+        self.assertEqual(user.profile.get_dirty_fields(), ['role'])
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=user).role, 'instructor')
+        self.assertEqual(user.profile.get_dirty_fields(), [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionUsersTestCase(TestCase):
+    """
+    Test cases for bulk account provisioning
+    """
+    
+    def setUp(self):
+        User.objects.create_user(username='existing', password='testpass123')
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as csv_file:
+            csv_file.write(
+                'Username,Email,First_Name,Password,Role\n'
+                'alice,alice@example.com,Alice,secret-a,\n'
+                'bob,bob@example.com,Bob,secret-b,instructor\n'
+                'carol,,,,\n'
+                'existing,,,,\n'
+                'alice,,,,\n'
+                'bad user,,,,\n'
+                'dave,not-an-email,,,\n'
+            )
+    
+    def tearDown(self):
+        os.remove(self.path)
+    
+    def provision(self, *args):
+        output = io.StringIO()
+        call_command('provision_users', self.path, *args, stdout=output, stderr=io.StringIO())
+        return output.getvalue()
+    
+    def test_provision_in_process(self):
+        """Test users and profiles are created with roles and statuses reported"""
+        output = self.provision('--workers=0', '--batch-size=2')
+        self.assertIn('Created 3 user(s)', output)
+        self.assertIn('Skipped 1 existing and 1 repeated', output)
+        self.assertIn('2 row(s) were invalid', output)
+        
+        roles = dict(UserProfile.objects.values_list('user__username', 'role'))
+        self.assertEqual(roles, {
+            'existing': 'student', 'alice': 'student', 'bob': 'instructor', 'carol': 'student'
+        })
+        self.assertTrue(User.objects.get(username='bob').check_password('secret-b'))
+        self.assertFalse(User.objects.get(username='carol').has_usable_password())
+    
+    def test_username_taken_while_provisioning(self):
+        """Test a username created after the existence check is skipped, not fatal"""
+        provisioner = UserProvisioner(workers=0)
+        users = provisioner.prepare_batch([
+            (2, {'username': 'erin', 'password': 'secret-e'}),
+            (3, {'username': 'frank'}),
+        ])
+        User.objects.create_user(username='erin', password='other')
+        provisioner.write_batch(users, provisioner.hash_batch(None, users))
+        
+        self.assertEqual(provisioner.results, [('erin', 'exists'), ('frank', 'created')])
+        self.assertEqual((provisioner.stats['created'], provisioner.stats['exists']), (1, 1))
+        self.assertTrue(User.objects.get(username='erin').check_password('other'))
+        self.assertEqual(User.objects.get(username='frank').profile.role, 'student')
+    
+    def test_provision_with_pool(self):
+        """Test passwords hashed in worker processes verify"""
+        self.provision('--workers=1', '--role=instructor', '--password=default-pass')
+        carol = User.objects.select_related('profile').get(username='carol')
+        self.assertTrue(carol.check_password('default-pass'))
+        self.assertEqual(carol.profile.role, 'instructor')
+        self.assertTrue(User.objects.get(username='alice').check_password('secret-a'))
+
+
+class SessionStoreTestCase(TestCase):
+    """
+    Test cases for the cached session store and its maintenance commands
+    """
+    
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_session_read_from_cache(self):
+        """Test a saved session is written to the table but read from the cache"""
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store['key'] = 'value'
+        store.create()
+        self.assertTrue(Session.objects.filter(session_key=store.session_key).exists())
+        
+        with self.assertNumQueries(0):
+            loaded = import_module(settings.SESSION_ENGINE).SessionStore(store.session_key)
+            self.assertEqual(loaded['key'], 'value')
+    
+    def test_cleanup_sessions(self):
+        """Test expired rows are deleted in batches and live ones kept"""
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{number}', session_data='', expire_date=now - timedelta(days=1))
+            for number in range(5)
+        ] + [Session(session_key='live', session_data='', expire_date=now + timedelta(days=1))])
+        
+        output = io.StringIO()
+        call_command('cleanup_sessions', '--batch-size=2', stdout=output)
+        self.assertIn('Deleted 5 expired session(s)', output.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+    
+    def test_benchmark_sessions(self):
+        """Test the benchmark reports every store and removes its sessions"""
+        output = io.StringIO()
+        call_command(
+            'benchmark_sessions', '--sessions=3', '--requests=6', '--concurrency', '1', 
+            stdout=output
+        )
+        for name in ('db', 'cache', 'cached_db'):
+            self.assertRegex(output.getvalue(), rf'\n{name} +1 ')
+        self.assertFalse(Session.objects.exists())
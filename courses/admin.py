@@ -1,14 +1,22 @@
 from django.contrib import admin
-from .models import Course, Lesson, Enrollment, LessonProgress
+from .models import (
+    Course, CourseRecommendation, Lesson, Enrollment, LessonProgress, LessonUpload
+)
 
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     """Admin interface for Course model"""
-    list_display = ('title', 'instructor', 'category', 'price', 'created_at')
+    list_display = (
+        'title', 'instructor', 'category', 'price', 
+        'lesson_count', 'student_count', 'created_at'
+    )
     list_filter = ('category', 'created_at')
     search_fields = ('title', 'description', 'instructor__username')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'lesson_count', 'student_count', 'total_duration', 
+        'created_at', 'updated_at'
+    )
     
     fieldsets = (
         ('Basic Information', {
@@ -17,6 +25,9 @@ class CourseAdmin(admin.ModelAdmin):
         ('Pricing & Media', {
             'fields': ('price', 'thumbnail')
         }),
+        ('Statistics', {
+            'fields': ('lesson_count', 'student_count', 'total_duration')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -49,16 +60,50 @@ class LessonAdmin(admin.ModelAdmin):
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     """Admin interface for Enrollment model"""
-    list_display = ('student', 'course', 'enrolled_at', 'completed')
+    list_display = (
+        'student', 'course', 'enrolled_at', 
+        'progress_percentage', 'completed'
+    )
     list_filter = ('completed', 'enrolled_at')
     search_fields = ('student__username', 'course__title')
-    readonly_fields = ('enrolled_at',)
+    readonly_fields = (
+        'enrolled_at', 'completed_lessons', 'progress_percentage', 
+        'last_completed_lesson', 'completed_at'
+    )
 
 
 @admin.register(LessonProgress)
 class LessonProgressAdmin(admin.ModelAdmin):
     """Admin interface for Lesson Progress model"""
-    list_display = ('student', 'lesson', 'completed', 'completed_at')
+    list_display = (
+        'student', 'lesson', 'completed', 'completed_at', 
+        'position_seconds', 'watched_seconds'
+    )
     list_filter = ('completed', 'completed_at')
     search_fields = ('student__username', 'lesson__title')
-    readonly_fields = ('completed_at',)
+    readonly_fields = (
+        'completed_at', 'position_seconds', 'watched_seconds', 'last_watched_at'
+    )
+
+
+@admin.register(LessonUpload)
+class LessonUploadAdmin(admin.ModelAdmin):
+    """Admin interface for chunked Lesson Upload sessions"""
+    list_display = (
+        'filename', 'lesson', 'field', 'received_bytes', 
+        'total_size', 'status', 'updated_at'
+    )
+    list_filter = ('status', 'field')
+    search_fields = ('filename', 'lesson__title', 'uploaded_by__username')
+    readonly_fields = (
+        'id', 'received_bytes', 'sha256', 'status', 
+        'created_at', 'updated_at'
+    )
+
+
+@admin.register(CourseRecommendation)
+class CourseRecommendationAdmin(admin.ModelAdmin):
+    """Admin interface for precomputed Course Recommendations"""
+    list_display = ('course', 'rank', 'recommended', 'score', 'common_students')
+    search_fields = ('course__title', 'recommended__title')
+    raw_id_fields = ('course', 'recommended')
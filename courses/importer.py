@@ -0,0 +1,419 @@
+import csv
+import json
+import os
+import re
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import transaction
+from .models import Course, Lesson
+from .ordering import ORDER_GAP
+
+
+# Characters read from a JSON manifest at a time while streaming it
+JSON_READ_SIZE = 64 * 1024
+
+# Characters that can end a JSON string, or open or close a container
+_STRING_SPECIALS = re.compile(r'["\\]')
+_VALUE_SPECIALS = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r'[\s,\]]')
+
+
+class ManifestError(Exception):
+    """Raised for a manifest record that cannot be imported"""
+
+
+def iter_manifest(path):
+    """
+    Stream course records from a manifest file
+
+    Supported formats, chosen by extension:
+      .json   a top-level array of course objects, parsed one object at a time
+      .jsonl  one course object per line
+      .csv    one row per lesson; rows of the same course must be adjacent
+
+    A course object has title, description, category, price, instructor
+    (username), thumbnail (media path) and a lessons list whose items have
+    title, description, duration, video and pdf.
+
+    Yields:
+        tuple: (position, record) where position is the line or item
+               number used in error reports
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='' if extension == '.csv' else None, encoding='utf-8') as manifest:
+        if extension == '.csv':
+            yield from _iter_csv(manifest)
+        elif extension in ('.jsonl', '.ndjson'):
+            for line_number, line in enumerate(manifest, 1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+        elif extension == '.json':
+            yield from enumerate(_iter_json_array(manifest), 1)
+        else:
+            raise ManifestError(f'Unsupported manifest format: {extension or path}')
+
+
+class _ValueScanner:
+    """
+    Finds where a JSON object, array or string ends in a growing buffer
+
+    Scanning resumes where the previous call stopped, so an item spread
+    over many reads is scanned once rather than decoded again per read.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Characters already scanned past the start of the item
+        self.offset = 0
+        self.depth = 0
+        self.in_string = False
+
+    def find_end(self, buffer, start):
+        """Return the index just past the value at start, or None if it is incomplete"""
+        index = start + self.offset
+        while True:
+            pattern = _STRING_SPECIALS if self.in_string else _VALUE_SPECIALS
+            match = pattern.search(buffer, index)
+            if match is None or (match.group() == '\\' and match.end() == len(buffer)):
+                # Rescan a trailing backslash with the character it escapes
+                self.offset = (match.start() if match else len(buffer)) - start
+                return None
+            char = match.group()
+            index = match.end()
+            if char == '\\':
+                index += 1
+            elif char == '"':
+                self.in_string = not self.in_string
+            elif char in '[{':
+                self.depth += 1
+            else:
+                self.depth -= 1
+            if not self.in_string and self.depth <= 0:
+                self.reset()
+                return index
+
+
+def _iter_json_array(manifest):
+    """Decode the items of a top-level JSON array without reading it whole"""
+    decoder = json.JSONDecoder()
+    scanner = _ValueScanner()
+    buffer = ''
+    position = 0
+    started = False
+
+    while True:
+        chunk = manifest.read(JSON_READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started:
+                if position == len(buffer):
+                    break
+                if buffer[position] != '[':
+                    raise ManifestError('A .json manifest must be an array of courses')
+                started = True
+                position += 1
+                continue
+            if position == len(buffer):
+                break
+            if buffer[position] == ']':
+                return
+            if buffer[position] in '{["':
+                complete = scanner.find_end(buffer, position) is not None
+            else:
+                # A number or literal ends at the next separator
+                complete = _SCALAR_END.search(buffer, position) is not None
+            if not complete:
+                # Item is incomplete: read more unless the file has ended
+                if not chunk:
+                    raise ManifestError('Truncated or invalid JSON manifest')
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                raise ManifestError('Truncated or invalid JSON manifest')
+            yield item
+            position = end
+
+        if not chunk:
+            if started:
+                raise ManifestError('JSON manifest is missing its closing bracket')
+            return
+
+
+def _iter_csv(manifest):
+    """Group adjacent lesson rows of the same course into course records"""
+    course = None
+    key = None
+    first_line = None
+
+    for line_number, row in enumerate(csv.DictReader(manifest), 2):
+        row_key = (row.get('instructor'), row.get('course_title'))
+        if row_key != key:
+            if course is not None:
+                yield first_line, course
+            key = row_key
+            first_line = line_number
+            course = {
+                'title': row.get('course_title'),
+                'description': row.get('course_description', ''),
+                'category': row.get('category'),
+                'price': row.get('price'),
+                'instructor': row.get('instructor'),
+                'thumbnail': row.get('thumbnail'),
+                'lessons': [],
+            }
+        if row.get('lesson_title'):
+            course['lessons'].append({
+                'title': row['lesson_title'],
+                'description': row.get('lesson_description', ''),
+                'duration': row.get('duration'),
+                'video': row.get('video'),
+                'pdf': row.get('pdf'),
+            })
+
+    if course is not None:
+        yield first_line, course
+
+
+class CourseImporter:
+    """
+    Import course records in batches
+
+    Each batch of courses is written inside one transaction: the courses
+    with one bulk_create, their lessons with another, then their counters
+    are rebuilt in one UPDATE. Instructors are resolved with one query per
+    batch and media files are linked into storage rather than copied.
+    """
+
+    def __init__(self, media_dir, batch_size=200, dry_run=False, skip_existing=False):
+        self.media_dir = os.path.realpath(media_dir) if media_dir else None
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.skip_existing = skip_existing
+        self.instructors = {}
+        self.stats = {
+            'courses': 0, 'lessons': 0, 'files': 0, 'thumbnails': 0,
+            'bytes': 0, 'skipped': 0, 'errors': [],
+        }
+
+    def run(self, records, progress=None, imported=None):
+        """
+        Import every record from an iterable of (position, record)
+
+        Args:
+            records: Iterable such as iter_manifest(path)
+            progress: Optional callable(stats) called after each batch
+            imported: Optional callable(courses, lessons) called with the
+                      instances each batch created, once it is committed
+
+        Returns:
+            dict: Counts of courses, lessons, files, thumbnails, bytes and
+                  skipped records, plus a list of (position, message) errors
+        """
+        def flush(batch):
+            courses, lessons = self.import_batch(batch)
+            if imported and courses:
+                imported(courses, lessons)
+            if progress:
+                progress(self.stats)
+
+        batch = []
+        for position, record in records:
+            batch.append((position, record))
+            if len(batch) >= self.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        return self.stats
+
+    def import_batch(self, batch):
+        """
+        Validate and write one batch of records
+
+        Returns:
+            tuple: (courses, lessons) created, both empty on a dry run
+        """
+        self._load_instructors({
+            record.get('instructor') for _, record in batch if isinstance(record, dict)
+        })
+
+        cleaned = []
+        for position, record in batch:
+            try:
+                cleaned.append(self.clean_course(record))
+            except ManifestError as e:
+                self.stats['errors'].append((position, str(e)))
+
+        if self.skip_existing and cleaned:
+            existing = set(Course.objects.filter(
+                instructor_id__in={course['instructor'].id for course in cleaned},
+                title__in={course['title'] for course in cleaned}
+            ).values_list('instructor_id', 'title'))
+            kept = [
+                course for course in cleaned
+                if (course['instructor'].id, course['title']) not in existing
+            ]
+            self.stats['skipped'] += len(cleaned) - len(kept)
+            cleaned = kept
+
+        if self.dry_run:
+            self.stats['courses'] += len(cleaned)
+            self.stats['lessons'] += sum(len(course['lessons']) for course in cleaned)
+            return [], []
+
+        # Files are linked before the transaction; blobs of a failed batch
+        # are unreferenced and removed by gc_media_blobs
+        courses = []
+        for course in cleaned:
+            instance = Course(
+                instructor=course['instructor'],
+                title=course['title'],
+                description=course['description'],
+                category=course['category'],
+                price=course['price'],
+            )
+            if course['thumbnail']:
+                instance.thumbnail = self.attach(instance.thumbnail, course['thumbnail'])
+                self.stats['thumbnails'] += 1
+            courses.append(instance)
+
+        lessons = []
+        for instance, course in zip(courses, cleaned):
+            for position, lesson in enumerate(course['lessons'], 1):
+                lesson_instance = Lesson(
+                    title=lesson['title'],
+                    description=lesson['description'],
+                    duration=lesson['duration'],
+                    order=position * ORDER_GAP,
+                )
+                if lesson['video']:
+                    lesson_instance.video_file = self.attach(lesson_instance.video_file, lesson['video'])
+                if lesson['pdf']:
+                    lesson_instance.pdf_file = self.attach(lesson_instance.pdf_file, lesson['pdf'])
+                lessons.append((instance, lesson_instance))
+
+        with transaction.atomic():
+            Course.objects.bulk_create(courses)
+            for course, lesson in lessons:
+                lesson.course = course
+            Lesson.objects.bulk_create([lesson for _, lesson in lessons], batch_size=500)
+            Course.rebuild_counters(Course.objects.filter(id__in=[course.id for course in courses]))
+
+        self.stats['courses'] += len(courses)
+        self.stats['lessons'] += len(lessons)
+        return courses, [lesson for _, lesson in lessons]
+
+    def clean_course(self, record):
+        """Validate a course record and resolve its instructor and media paths"""
+        if not isinstance(record, dict):
+            raise ManifestError('Course record must be an object')
+
+        title = (record.get('title') or '').strip()
+        if not title:
+            raise ManifestError('Course title is required')
+        if len(title) > 200:
+            raise ManifestError(f'Course title is longer than 200 characters: {title[:40]}...')
+
+        instructor = self.instructors.get(record.get('instructor'))
+        if instructor is None:
+            raise ManifestError(f'Unknown instructor {record.get("instructor")!r} for {title!r}')
+
+        category = record.get('category') or 'other'
+        if category not in dict(Course.CATEGORY_CHOICES):
+            raise ManifestError(f'Unknown category {category!r} for {title!r}')
+
+        try:
+            price = Decimal(str(record.get('price') or 0))
+        except InvalidOperation:
+            raise ManifestError(f'Invalid price for {title!r}')
+        if not price.is_finite() or price < 0 or price >= Decimal('1e8'):
+            raise ManifestError(f'Invalid price for {title!r}')
+
+        lessons = record.get('lessons') or []
+        if not isinstance(lessons, list):
+            raise ManifestError(f'lessons must be a list for {title!r}')
+
+        return {
+            'title': title,
+            'description': record.get('description') or '',
+            'instructor': instructor,
+            'category': category,
+            'price': price,
+            'thumbnail': self.resolve_media(record.get('thumbnail')),
+            'lessons': [self.clean_lesson(lesson, title) for lesson in lessons],
+        }
+
+    def clean_lesson(self, record, course_title):
+        if not isinstance(record, dict) or not (record.get('title') or '').strip():
+            raise ManifestError(f'Every lesson of {course_title!r} needs a title')
+        try:
+            duration = int(record.get('duration') or 0)
+        except (TypeError, ValueError):
+            raise ManifestError(f'Invalid duration for lesson {record["title"]!r}')
+        if duration < 0:
+            raise ManifestError(f'Invalid duration for lesson {record["title"]!r}')
+
+        return {
+            'title': record['title'].strip()[:200],
+            'description': record.get('description') or '',
+            'duration': duration,
+            'video': self.resolve_media(record.get('video')),
+            'pdf': self.resolve_media(record.get('pdf')),
+        }
+
+    def resolve_media(self, relative_path):
+        """Return the absolute path of a media file inside the media directory"""
+        if not relative_path:
+            return None
+        if self.media_dir is None:
+            raise ManifestError(f'{relative_path}: pass --media-dir to attach files')
+
+        path = os.path.realpath(os.path.join(self.media_dir, relative_path))
+        if os.path.commonpath([path, self.media_dir]) != self.media_dir:
+            raise ManifestError(f'{relative_path}: path is outside the media directory')
+        if not os.path.isfile(path):
+            raise ManifestError(f'{relative_path}: file not found')
+        return path
+
+    def attach(self, field_file, path):
+        """
+        Put a media file in the field's storage, linking instead of copying
+
+        Returns:
+            str: Storage name to assign to the field
+        """
+        storage = field_file.storage
+        name = field_file.field.generate_filename(field_file.instance, os.path.basename(path))
+        self.stats['files'] += 1
+        self.stats['bytes'] += os.path.getsize(path)
+
+        if hasattr(storage, 'link_file'):
+            return storage.link_file(path, name)
+
+        try:
+            location = os.path.realpath(storage.path(''))
+        except NotImplementedError:
+            location = None
+        if location and os.path.commonpath([path, location]) == location:
+            # Already inside the storage: reference it where it is
+            return os.path.relpath(path, location).replace(os.sep, '/')
+
+        with open(path, 'rb') as source:
+            return storage.save(name, File(source))
+
+    def _load_instructors(self, usernames):
+        missing = {
+            username for username in usernames
+            if username and username not in self.instructors
+        }
+        if missing:
+            for user in User.objects.filter(username__in=missing):
+                self.instructors[user.username] = user
@@ -0,0 +1,38 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from courses.models import LessonUpload
+from courses.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were abandoned before being finalized'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=48,
+            help='Discard pending uploads not touched for this many hours (default: 48)'
+        )
+        parser.add_argument(
+            '--completed',
+            action='store_true',
+            help='Also delete the records of finalized uploads'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        
+        stale = LessonUpload.objects.filter(status='pending', updated_at__lt=cutoff)
+        discarded = 0
+        for upload in stale.iterator():
+            discard_upload(upload)
+            discarded += 1
+        
+        message = f'Discarded {discarded} abandoned upload(s)'
+        if options['completed']:
+            deleted, _ = LessonUpload.objects.filter(status='complete').delete()
+            message += f', deleted {deleted} completed upload record(s)'
+        
+        self.stdout.write(self.style.SUCCESS(message))
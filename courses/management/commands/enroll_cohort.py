@@ -0,0 +1,61 @@
+import csv
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from courses.services import ENROLL_CHUNK_SIZE, bulk_enroll, read_usernames
+
+
+class Command(BaseCommand):
+    help = 'Enroll a list of students in a course from usernames or a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int, help='Course to enroll the students in')
+        parser.add_argument('usernames', nargs='*', help='Usernames to enroll')
+        parser.add_argument(
+            '--file',
+            help='CSV file with a username column (or usernames in the first column)'
+        )
+        parser.add_argument(
+            '--report',
+            help='Write the per-row result (username,status) to this CSV file'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=ENROLL_CHUNK_SIZE,
+            help='Users resolved and enrollments inserted per query'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError(f'Course {options["course_id"]} does not exist')
+        
+        if not options['usernames'] and not options['file']:
+            raise CommandError('Pass usernames or --file')
+        
+        started = time.perf_counter()
+        if options['file']:
+            with open(options['file'], newline='', encoding='utf-8-sig') as csv_file:
+                usernames = list(options['usernames']) + list(read_usernames(csv_file))
+        else:
+            usernames = options['usernames']
+        
+        results = bulk_enroll(course, usernames, chunk_size=options['chunk_size'])
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.writer(report)
+                writer.writerow(['username', 'status'])
+                writer.writerows(results)
+        
+        summary = Counter(status for _, status in results)
+        for status, count in sorted(summary.items()):
+            self.stdout.write(f'  {status}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(results)} row(s) for "{course.title}" in {elapsed:.2f}s '
+            f'({len(results) / elapsed:.0f} rows/s)'
+        ))
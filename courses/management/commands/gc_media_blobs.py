@@ -0,0 +1,65 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from courses.services import get_blob_reference_counts
+from courses.storage import BLOB_DIR, ContentAddressedStorage, content_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs no longer referenced by any course or lesson'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Keep unreferenced blobs younger than this many hours (default: 24)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting anything'
+        )
+
+    def handle(self, *args, **options):
+        storage = content_storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('Media deduplication is not enabled')
+        
+        # Blobs are written before the row referencing them is committed,
+        # so recent unreferenced blobs may still be in use
+        cutoff = time.time() - options['min_age'] * 3600
+        references = get_blob_reference_counts()
+        
+        kept = deleted = freed = saved = 0
+        for digest, name in storage.iter_blobs():
+            path = storage.path(name)
+            size = os.path.getsize(path)
+            
+            count = references.get(digest, 0)
+            if count or os.path.getmtime(path) > cutoff:
+                kept += 1
+                saved += size * max(count - 1, 0)
+                continue
+            
+            deleted += 1
+            freed += size
+            if not options['dry_run']:
+                os.remove(path)
+        
+        stale_temp = 0
+        temp_dir = storage.path(os.path.join(BLOB_DIR, 'tmp'))
+        if os.path.isdir(temp_dir):
+            for entry in os.scandir(temp_dir):
+                if entry.stat().st_mtime < cutoff:
+                    stale_temp += 1
+                    if not options['dry_run']:
+                        os.remove(entry.path)
+        
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} unreferenced blob file(s), freeing {freed / 1048576:.1f} MB; '
+            f'kept {kept}'
+        ))
+        self.stdout.write(f'{action} {stale_temp} abandoned temporary file(s)')
+        self.stdout.write(f'Deduplication is saving {saved / 1048576:.1f} MB')
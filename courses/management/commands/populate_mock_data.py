@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from courses.models import Course, Lesson, Enrollment
+from courses.ordering import ORDER_GAP
 from accounts.models import UserProfile
 
 
@@ -172,7 +173,7 @@ class Command(BaseCommand):
                         defaults={
                             'description': lesson_info['description'],
                             'duration': lesson_info['duration'],
-                            'order': order
+                            'order': order * ORDER_GAP
                         }
                     )
                     if created:
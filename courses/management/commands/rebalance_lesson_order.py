@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Window
+from django.db.models.functions import Lag
+from courses.models import Lesson
+from courses.ordering import ORDER_GAP, rebalance_lessons
+
+
+class Command(BaseCommand):
+    help = 'Respace lesson orders so every course has room for future moves'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_ids',
+            nargs='*',
+            type=int,
+            help='Only rebalance these courses (default: courses that need it)'
+        )
+        parser.add_argument(
+            '--min-gap',
+            type=int,
+            default=ORDER_GAP // 64,
+            help='Rebalance courses where two neighbouring lessons are closer than this'
+        )
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids']
+        if not course_ids:
+            course_ids = self.crowded_courses(options['min_gap'])
+        
+        moved = 0
+        for course_id in course_ids:
+            moved += rebalance_lessons(course_id)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebalanced {len(course_ids)} course(s), moved {moved} lesson(s)'
+        ))
+    
+    def crowded_courses(self, min_gap):
+        """Courses with any two neighbouring lessons closer than min_gap"""
+        gaps = Lesson.objects.annotate(
+            gap=F('order') - Window(
+                Lag('order'), 
+                partition_by=F('course_id'), 
+                order_by=[F('order').asc(), F('created_at').asc(), F('id').asc()]
+            )
+        ).filter(gap__lt=min_gap).order_by().values_list('course_id', flat=True)
+        return sorted(set(gaps))
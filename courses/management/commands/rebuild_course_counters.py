@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized lesson, student and duration counters on courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_ids',
+            nargs='*',
+            type=int,
+            help='Only rebuild these courses (default: all courses)'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Course.objects.all()
+        if options['course_ids']:
+            queryset = queryset.filter(id__in=options['course_ids'])
+        
+        updated = Course.rebuild_counters(queryset)
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} course(s)'))
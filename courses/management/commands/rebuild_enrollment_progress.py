@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Enrollment
+from courses.services import compute_progress_for_pairs
+
+
+class Command(BaseCommand):
+    help = 'Backfill or verify the materialized progress stored on enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report enrollments whose stored progress has drifted'
+        )
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='Limit to this course ID (may be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Enrollments compared per batch in verify mode'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Enrollment.objects.all()
+        if options['course_ids']:
+            queryset = queryset.filter(course_id__in=options['course_ids'])
+        
+        if options['verify']:
+            self.verify(queryset, options['batch_size'])
+            return
+        
+        with transaction.atomic():
+            updated = Enrollment.rebuild_progress(queryset)
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt progress for {updated} enrollment(s)'))
+
+    def verify(self, queryset, batch_size):
+        """Compare stored progress with a fresh calculation, batch by batch"""
+        rows = queryset.order_by('pk').values_list(
+            'pk', 'student_id', 'course_id',
+            'completed_lessons', 'progress_percentage', 'completed'
+        )
+        
+        checked = 0
+        drifted = 0
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            
+            expected = compute_progress_for_pairs(
+                (student_id, course_id) for _, student_id, course_id, *_ in batch
+            )
+            for pk, student_id, course_id, completed_lessons, percentage, completed in batch:
+                stats = expected[(student_id, course_id)]
+                is_complete = (
+                    stats['total_lessons'] > 0 
+                    and stats['completed_lessons'] >= stats['total_lessons']
+                )
+                if (
+                    completed_lessons != stats['completed_lessons'] 
+                    or percentage != stats['percentage'] 
+                    or completed != is_complete
+                ):
+                    drifted += 1
+                    self.stdout.write(
+                        f'  Enrollment {pk}: stored {completed_lessons} lessons/{percentage}%, '
+                        f'expected {stats["completed_lessons"]} lessons/{stats["percentage"]}%'
+                    )
+            checked += len(batch)
+        
+        if drifted:
+            self.stdout.write(self.style.WARNING(
+                f'{drifted} of {checked} enrollment(s) have drifted; '
+                f'run without --verify to rebuild'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {checked} enrollment(s) are consistent'))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from courses.recommendations import (
+    BLOCK_CELLS, MIN_COMMON_STUDENTS, TOP_K, refresh_recommendations
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "students who took this also took" course neighbours from enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=TOP_K,
+            help='Neighbours stored per course'
+        )
+        parser.add_argument(
+            '--min-common',
+            type=int,
+            default=MIN_COMMON_STUDENTS,
+            help='Minimum shared students for two courses to be neighbours'
+        )
+        parser.add_argument(
+            '--block-cells',
+            type=int,
+            default=BLOCK_CELLS,
+            help='Similarity cells computed per block; bounds memory use'
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['block_cells'] < 1:
+            raise CommandError('--top-k and --block-cells must be positive')
+
+        started = time.perf_counter()
+        stats = refresh_recommendations(
+            top_k=options['top_k'],
+            min_common=options['min_common'],
+            block_cells=options['block_cells']
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stats["recommendations"]} recommendation(s) for {stats["courses"]} '
+            f'course(s) from {stats["enrollments"]} enrollment(s) by {stats["students"]} '
+            f'student(s) in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,190 @@
+import asyncio
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+# Bytes read per chunk when streaming a file to the client
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_file_etag(field_file):
+    """
+    Build a strong ETag for a stored file
+
+    Content-addressed files use their SHA-256; other files fall back
+    to their size and mtime.
+
+    Args:
+        field_file: FieldFile from a FileField
+
+    Returns:
+        str: Quoted ETag value
+    """
+    storage = field_file.storage
+    return _make_etag(
+        storage,
+        field_file.name,
+        storage.size(field_file.name),
+        storage.get_modified_time(field_file.name).timestamp()
+    )
+
+
+def _make_etag(storage, name, size, modified):
+    digest = storage.get_digest(name) if hasattr(storage, 'get_digest') else None
+    if digest:
+        return quote_etag(digest)
+    return quote_etag(f'{size:x}-{int(modified * 1000000):x}')
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range `Range: bytes=...` header
+
+    Multiple ranges are not supported; callers fall back to sending the
+    whole file, which RFC 9110 allows.
+
+    Args:
+        header: Raw Range header value
+        size: Total size of the file in bytes
+
+    Returns:
+        tuple: (start, end) inclusive byte positions, None if the header
+               is absent or not understood, or 'unsatisfiable'
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        return 'unsatisfiable'
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Return True if the If-Range validator still matches the file"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('W/'):
+        # Weak validators never match for ranges
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+async def _read_chunks(field_file, start, length):
+    """Stream `length` bytes from `start` without loading the file into memory"""
+    handle = await asyncio.to_thread(field_file.storage.open, field_file.name, 'rb')
+    try:
+        await asyncio.to_thread(handle.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(handle.read, min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(handle.close)
+
+
+def serve_protected_file(request, field_file, download=False):
+    """
+    Serve a stored file with Range, If-Range and ETag support
+
+    When LESSON_MEDIA_OFFLOAD is 'x-accel' or 'x-sendfile' the byte
+    transfer is handed to the front proxy (nginx X-Accel-Redirect or
+    Apache/lighttpd X-Sendfile), which then handles ranges itself.
+    Otherwise the file is streamed in chunks from an async iterator.
+
+    Args:
+        request: HttpRequest that has already passed access checks
+        field_file: FieldFile to serve
+        download: Send Content-Disposition: attachment
+
+    Returns:
+        HttpResponse: 200, 206, 304 or 416 response
+    """
+    storage = field_file.storage
+    name = field_file.name
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    disposition = 'attachment' if download else 'inline'
+    filename = os.path.basename(name).replace('"', '')
+
+    offload = getattr(settings, 'LESSON_MEDIA_OFFLOAD', None)
+    if offload == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'LESSON_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+        return response
+    if offload == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+        return response
+
+    size = storage.size(name)
+    last_modified = storage.get_modified_time(name).timestamp()
+    etag = _make_etag(storage, name, size, last_modified)
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range_header(request.headers.get('Range'), size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        status = 206
+    else:
+        start, end = 0, size - 1
+        status = 200
+    length = max(end - start + 1, 0)
+
+    response = StreamingHttpResponse(
+        _read_chunks(field_file, start, length),
+        status=status,
+        content_type=content_type
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-18 18:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    lessons = Lesson.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    enrollments = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course')
+
+    Course.objects.order_by().update(
+        lesson_count=Coalesce(Subquery(lessons.annotate(c=Count('pk')).values('c')), 0),
+        total_duration=Coalesce(Subquery(lessons.annotate(s=Sum('duration')).values('s')), 0),
+        student_count=Coalesce(Subquery(enrollments.annotate(c=Count('pk')).values('c')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='student_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_duration',
+            field=models.IntegerField(default=0, editable=False, help_text='Total lesson duration in minutes'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 18:36
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_lesson_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=courses.storage.get_media_storage, upload_to='course_thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.get_media_storage, upload_to='lesson_pdfs/'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='video_file',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.get_media_storage, upload_to='lesson_videos/'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+ORDER_GAP = 1024
+
+
+def spread_lesson_order(apps, schema_editor):
+    # Respace existing 1, 2, 3... orders ORDER_GAP apart within each course
+    Lesson = apps.get_model('courses', 'Lesson')
+    lessons = Lesson.objects.order_by('course_id', 'order', 'created_at', 'id').only(
+        'id', 'course_id', 'order'
+    )
+
+    moved = []
+    course_id = position = None
+    for lesson in lessons.iterator(chunk_size=2000):
+        if lesson.course_id != course_id:
+            course_id, position = lesson.course_id, 0
+        position += 1
+        lesson.order = position * ORDER_GAP
+        moved.append(lesson)
+        if len(moved) >= 2000:
+            Lesson.objects.bulk_update(moved, ['order'])
+            moved = []
+    Lesson.objects.bulk_update(moved, ['order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_media_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_lesson_order, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'order'], name='lesson_course_order_idx'),
+        ),
+    ]
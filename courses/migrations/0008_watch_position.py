@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_sparse_lesson_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='last_watched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='position_seconds',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='watched_seconds',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,17 @@
-from django.db import models
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .storage import get_media_storage
 
 
 class Course(models.Model):
@@ -37,26 +49,76 @@ class Course(models.Model):
     )
     thumbnail = models.ImageField(
         upload_to='course_thumbnails/', 
+        storage=get_media_storage,
         blank=True, 
         null=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized counters, maintained by the Lesson/Enrollment signals
+    # below and rebuilt with `manage.py rebuild_course_counters`
+    lesson_count = models.IntegerField(default=0, editable=False)
+    student_count = models.IntegerField(default=0, editable=False)
+    total_duration = models.IntegerField(
+        default=0, 
+        editable=False, 
+        help_text='Total lesson duration in minutes'
+    )
+    
     def __str__(self):
         return self.title
     
     def get_total_lessons(self):
         """Return total number of lessons in this course"""
-        return self.lessons.count()
+        return self.lesson_count
     
     def get_total_students(self):
         """Return total number of enrolled students"""
-        return self.enrollments.count()
+        return self.student_count
+    
+    @classmethod
+    def rebuild_counters(cls, queryset=None):
+        """
+        Recompute the denormalized counters from the source tables
+        
+        Args:
+            queryset: Optional Course queryset to limit the rebuild
+        
+        Returns:
+            int: Number of courses updated
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        
+        lessons = Lesson.objects.filter(
+            course=OuterRef('pk')
+        ).order_by().values('course')
+        enrollments = Enrollment.objects.filter(
+            course=OuterRef('pk')
+        ).order_by().values('course')
+        
+        return queryset.order_by().update(
+            lesson_count=Coalesce(
+                Subquery(lessons.annotate(c=Count('pk')).values('c')), 0
+            ),
+            total_duration=Coalesce(
+                Subquery(lessons.annotate(s=Sum('duration')).values('s')), 0
+            ),
+            student_count=Coalesce(
+                Subquery(enrollments.annotate(c=Count('pk')).values('c')), 0
+            ),
+        )
     
     class Meta:
         db_table = 'courses'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination orders for the catalog
+            models.Index(fields=['-created_at', '-id'], name='course_newest_idx'),
+            models.Index(fields=['-student_count', '-id'], name='course_popular_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='course_category_idx'),
+        ]
         verbose_name = 'Course'
         verbose_name_plural = 'Courses'
 
@@ -75,14 +137,17 @@ class Lesson(models.Model):
     description = models.TextField(blank=True)
     video_file = models.FileField(
         upload_to='lesson_videos/', 
+        storage=get_media_storage,
         blank=True, 
         null=True
     )
     pdf_file = models.FileField(
         upload_to='lesson_pdfs/', 
+        storage=get_media_storage,
         blank=True, 
         null=True
     )
+    # Sparse: consecutive lessons are ORDER_GAP apart (see ordering.py)
     order = models.IntegerField(default=0)
     duration = models.IntegerField(
         default=0, 
@@ -90,12 +155,24 @@ class Lesson(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so counter signals can apply deltas
+        if 'course_id' in instance.__dict__ and 'duration' in instance.__dict__:
+            instance._loaded_course_id = instance.course_id
+            instance._loaded_duration = instance.duration
+        return instance
+    
     def __str__(self):
         return f"{self.course.title} - {self.title}"
     
     class Meta:
         db_table = 'lessons'
         ordering = ['order', 'created_at']
+        indexes = [
+            models.Index(fields=['course', 'order'], name='lesson_course_order_idx'),
+        ]
         verbose_name = 'Lesson'
         verbose_name_plural = 'Lessons'
 
@@ -118,20 +195,177 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed = models.BooleanField(default=False)
     
+    # Materialized progress, updated at write time by mark_lesson_complete
+    # and the Lesson signals, rebuilt with `manage.py rebuild_enrollment_progress`
+    completed_lessons = models.IntegerField(default=0, editable=False)
+    progress_percentage = models.IntegerField(default=0, editable=False)
+    last_completed_lesson = models.ForeignKey(
+        'Lesson', 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True, 
+        editable=False, 
+        related_name='+'
+    )
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
     
     def get_progress_percentage(self):
-        """Calculate course completion percentage"""
-        total_lessons = self.course.lessons.count()
-        if total_lessons == 0:
-            return 0
-        completed_lessons = LessonProgress.objects.filter(
-            student=self.student,
-            lesson__course=self.course,
+        """Return course completion percentage"""
+        return self.progress_percentage
+    
+    @staticmethod
+    def _course_ids_cache_key(student_id):
+        return f'courses:enrolled:{student_id}'
+    
+    @classmethod
+    def get_course_ids(cls, student_id, refresh=False):
+        """
+        Return the IDs of the courses a student is enrolled in
+        
+        The set is kept in the cache framework, so membership checks on
+        every course page cost no query after the first one. It is
+        invalidated by the Enrollment signals and by bulk enrollment.
+        With ENROLLMENT_CACHE_TIMEOUT = 0 (the default without a shared
+        cache) it is read from the database every time.
+        
+        Args:
+            student_id: ID of the student user
+            refresh: Reload the set from the database even if cached
+        
+        Returns:
+            frozenset: Course IDs
+        """
+        timeout = getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 300)
+        key = cls._course_ids_cache_key(student_id)
+        course_ids = None if refresh or not timeout else cache.get(key)
+        if course_ids is None:
+            course_ids = frozenset(cls.objects.filter(
+                student_id=student_id
+            ).values_list('course_id', flat=True))
+            if timeout:
+                cache.set(key, course_ids, timeout)
+        return course_ids
+    
+    @classmethod
+    def is_enrolled(cls, student_id, course_id):
+        """
+        Return whether a student is enrolled in a course
+        
+        A miss is re-checked against the database once, so an enrollment
+        made through another process's cache is never refused.
+        """
+        if course_id in cls.get_course_ids(student_id):
+            return True
+        if not getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 300):
+            return False
+        return course_id in cls.get_course_ids(student_id, refresh=True)
+    
+    @classmethod
+    def invalidate_course_ids(cls, *student_ids):
+        """
+        Drop the cached enrolled-course sets of the given students
+        
+        Call it with every enroll or unenroll. The keys are dropped now and
+        again after commit, so a request that refilled them before the
+        commit does not keep the old set.
+        """
+        keys = [cls._course_ids_cache_key(student_id) for student_id in student_ids]
+        if keys:
+            cache.delete_many(keys)
+            transaction.on_commit(lambda: cache.delete_many(keys))
+    
+    @classmethod
+    def record_lesson_completion(cls, student_id, lesson):
+        """
+        Apply one newly completed lesson to the student's enrollment
+        
+        Must be called once per LessonProgress transition to completed,
+        inside the same transaction as that write.
+        
+        Args:
+            student_id: ID of the student user
+            lesson: Lesson instance that was completed
+        """
+        enrollment = cls.objects.filter(
+            student_id=student_id, 
+            course_id=lesson.course_id
+        )
+        enrollment.update(
+            completed_lessons=F('completed_lessons') + 1,
+            last_completed_lesson=lesson
+        )
+        cls.refresh_progress(enrollment)
+    
+    @classmethod
+    def refresh_progress(cls, queryset):
+        """
+        Recompute percentage, completed and completed_at from the
+        materialized completed_lessons and the course lesson counter
+        
+        Args:
+            queryset: Enrollment queryset to refresh
+        """
+        total = Subquery(
+            Course.objects.filter(pk=OuterRef('course_id')).values('lesson_count')[:1]
+        )
+        no_lessons = LessThanOrEqual(total, 0)
+        finished = Q(completed_lessons__gte=total)
+        
+        queryset.order_by().update(
+            progress_percentage=Case(
+                When(no_lessons, then=Value(0)),
+                When(finished, then=Value(100)),
+                default=F('completed_lessons') * 100 / total,
+                output_field=IntegerField()
+            ),
+            completed=Case(
+                When(no_lessons, then=Value(False)),
+                When(finished, then=Value(True)),
+                default=Value(False)
+            ),
+            completed_at=Case(
+                When(no_lessons, then=Value(None)),
+                When(finished, then=Coalesce(F('completed_at'), Value(timezone.now()))),
+                default=Value(None)
+            )
+        )
+    
+    @classmethod
+    def rebuild_progress(cls, queryset=None):
+        """
+        Recompute the materialized progress from LessonProgress
+        
+        Args:
+            queryset: Optional Enrollment queryset to limit the rebuild
+        
+        Returns:
+            int: Number of enrollments updated
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        
+        completed = LessonProgress.objects.filter(
+            student_id=OuterRef('student_id'),
+            lesson__course_id=OuterRef('course_id'),
             completed=True
-        ).count()
-        return int((completed_lessons / total_lessons) * 100)
+        ).order_by()
+        
+        updated = queryset.order_by().update(
+            completed_lessons=Coalesce(
+                Subquery(
+                    completed.values('student_id').annotate(c=Count('pk')).values('c')
+                ), 
+                0
+            ),
+            last_completed_lesson=Subquery(
+                completed.order_by('-completed_at', '-pk').values('lesson_id')[:1]
+            )
+        )
+        cls.refresh_progress(queryset)
+        return updated
     
     class Meta:
         db_table = 'enrollments'
@@ -159,6 +393,12 @@ class LessonProgress(models.Model):
     completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    # Playback state from the heartbeat endpoint, written in batches by
+    # courses.watch_buffer rather than on every request
+    position_seconds = models.IntegerField(default=0)
+    watched_seconds = models.IntegerField(default=0)
+    last_watched_at = models.DateTimeField(null=True, blank=True)
+    
     def __str__(self):
         return f"{self.student.username} - {self.lesson.title}"
     
@@ -167,3 +407,194 @@ class LessonProgress(models.Model):
         unique_together = ('student', 'lesson')
         verbose_name = 'Lesson Progress'
         verbose_name_plural = 'Lesson Progress'
+
+
+class LessonUpload(models.Model):
+    """
+    Lesson Upload Model
+    Tracks a chunked, resumable upload of a large lesson file
+    """
+    FIELD_CHOICES = (
+        ('video_file', 'Video'),
+        ('pdf_file', 'PDF'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey(
+        Lesson, 
+        on_delete=models.CASCADE, 
+        related_name='uploads'
+    )
+    uploaded_by = models.ForeignKey(
+        User, 
+        on_delete=models.CASCADE, 
+        related_name='lesson_uploads'
+    )
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(
+        max_length=20, 
+        choices=STATUS_CHOICES, 
+        default='pending'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size})"
+    
+    class Meta:
+        db_table = 'lesson_uploads'
+        ordering = ['-created_at']
+        verbose_name = 'Lesson Upload'
+        verbose_name_plural = 'Lesson Uploads'
+
+
+class CourseRecommendation(models.Model):
+    """
+    Course Recommendation Model
+    Precomputed "students who took this also took" neighbours of a course,
+    rebuilt by `manage.py refresh_course_recommendations`
+    """
+    course = models.ForeignKey(
+        Course, 
+        on_delete=models.CASCADE, 
+        related_name='recommendations'
+    )
+    recommended = models.ForeignKey(
+        Course, 
+        on_delete=models.CASCADE, 
+        related_name='+'
+    )
+    # 1 is the most similar neighbour
+    rank = models.PositiveSmallIntegerField()
+    # Cosine similarity of the two courses' enrolled-student sets
+    score = models.FloatField()
+    common_students = models.IntegerField()
+    
+    def __str__(self):
+        return f"{self.course_id} -> {self.recommended_id} ({self.score:.3f})"
+    
+    class Meta:
+        db_table = 'course_recommendations'
+        # Also the index behind the page-time lookup by course
+        unique_together = ('course', 'rank')
+        ordering = ['course', 'rank']
+        verbose_name = 'Course Recommendation'
+        verbose_name_plural = 'Course Recommendations'
+
+
+# Signals to keep the Course counters current
+def _adjust_course_counters(course_id, **deltas):
+    """Apply counter deltas to a course with a single UPDATE"""
+    if not course_id:
+        return
+    Course.objects.filter(pk=course_id).update(**{
+        field: F(field) + delta
+        for field, delta in deltas.items()
+        if delta
+    })
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, raw=False, **kwargs):
+    """Update lesson count and total duration when a lesson is saved"""
+    if raw:
+        return
+    duration = int(instance.duration or 0)
+    
+    if created:
+        _adjust_course_counters(
+            instance.course_id, 
+            lesson_count=1, 
+            total_duration=duration
+        )
+    elif hasattr(instance, '_loaded_duration'):
+        old_course_id = instance._loaded_course_id
+        old_duration = int(instance._loaded_duration or 0)
+        
+        if old_course_id != instance.course_id:
+            _adjust_course_counters(
+                old_course_id, 
+                lesson_count=-1, 
+                total_duration=-old_duration
+            )
+            _adjust_course_counters(
+                instance.course_id, 
+                lesson_count=1, 
+                total_duration=duration
+            )
+        elif old_duration != duration:
+            _adjust_course_counters(
+                instance.course_id, 
+                total_duration=duration - old_duration
+            )
+    else:
+        # Instance was not loaded from the database, so no baseline to diff
+        Course.rebuild_counters(Course.objects.filter(pk=instance.course_id))
+    
+    if created:
+        # A new lesson lowers everyone's percentage in the course
+        Enrollment.refresh_progress(
+            Enrollment.objects.filter(course_id=instance.course_id)
+        )
+    elif getattr(instance, '_loaded_course_id', instance.course_id) != instance.course_id:
+        Enrollment.rebuild_progress(Enrollment.objects.filter(
+            course_id__in=[instance._loaded_course_id, instance.course_id]
+        ))
+    
+    instance._loaded_course_id = instance.course_id
+    instance._loaded_duration = duration
+
+
+@receiver(pre_delete, sender=Lesson)
+def lesson_deleting(sender, instance, **kwargs):
+    """Drop the lesson from the completed count of students who finished it"""
+    finished_by = LessonProgress.objects.filter(
+        lesson=instance, 
+        completed=True
+    ).values('student_id')
+    Enrollment.objects.filter(
+        course_id=instance.course_id, 
+        student_id__in=finished_by
+    ).update(completed_lessons=F('completed_lessons') - 1)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    """Update lesson count and total duration when a lesson is deleted"""
+    _adjust_course_counters(
+        instance.course_id, 
+        lesson_count=-1, 
+        total_duration=-int(instance.duration or 0)
+    )
+    Enrollment.refresh_progress(
+        Enrollment.objects.filter(course_id=instance.course_id)
+    )
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Update student count when an enrollment is created, and start its
+    progress from lessons the student completed before (re-)enrolling
+    """
+    if created and not raw:
+        _adjust_course_counters(instance.course_id, student_count=1)
+        Enrollment.invalidate_course_ids(instance.student_id)
+        Enrollment.rebuild_progress(Enrollment.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    """Update student count when an enrollment is deleted"""
+    _adjust_course_counters(instance.course_id, student_count=-1)
+    Enrollment.invalidate_course_ids(instance.student_id)
@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from django.db import transaction
+from django.db.models import Max, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Lesson
+
+
+# Spacing between consecutive Lesson.order values. Moving a lesson
+# picks a value inside the gap between its new neighbours, so only the
+# moved rows change; a gap of 1024 absorbs ten halvings before a
+# course needs rebalancing.
+ORDER_GAP = 1024
+
+
+class ReorderError(Exception):
+    """Raised when a requested lesson order cannot be applied"""
+
+
+def next_order_expression(course_id):
+    """
+    Expression for the order of a lesson appended to a course
+
+    Evaluated inside the INSERT statement, so concurrent adds do not
+    read the same maximum and no separate COUNT query is needed.
+    """
+    last_order = Lesson.objects.filter(course_id=course_id).order_by().values(
+        'course_id'
+    ).annotate(last=Max('order')).values('last')
+    return Coalesce(Subquery(last_order), Value(0)) + ORDER_GAP
+
+
+def reorder_lessons(course, lesson_ids):
+    """
+    Put a course's lessons in the given order, moving as few rows as possible
+
+    The longest run of lessons that are already in increasing order
+    stays where it is; every other lesson gets a value spaced evenly
+    inside the gap between its new neighbours. The moved rows are saved
+    with a single bulk_update. If a gap is too small for the lessons
+    that must fit into it, the whole course is renumbered instead.
+
+    Args:
+        course: Course whose lessons are reordered
+        lesson_ids: Every lesson ID of the course, in the desired order
+
+    Returns:
+        int: Number of lessons whose order changed
+    """
+    with transaction.atomic():
+        current = dict(
+            Lesson.objects.filter(course=course).order_by().values_list('id', 'order')
+        )
+        if len(lesson_ids) != len(current) or set(lesson_ids) != current.keys():
+            raise ReorderError('lesson_ids must list every lesson of the course exactly once')
+
+        orders = [current[lesson_id] for lesson_id in lesson_ids]
+        new_orders = _fill_gaps(orders, _longest_increasing(orders))
+        if new_orders is None:
+            new_orders = [ORDER_GAP * position for position in range(1, len(orders) + 1)]
+
+        moved = [
+            Lesson(id=lesson_id, order=order)
+            for lesson_id, order in zip(lesson_ids, new_orders)
+            if current[lesson_id] != order
+        ]
+        Lesson.objects.bulk_update(moved, ['order'], batch_size=500)
+    return len(moved)
+
+
+def rebalance_lessons(course_id):
+    """
+    Respace a course's lesson orders ORDER_GAP apart, keeping their order
+
+    Args:
+        course_id: ID of the course to rebalance
+
+    Returns:
+        int: Number of lessons whose order changed
+    """
+    with transaction.atomic():
+        rows = Lesson.objects.filter(course_id=course_id).order_by(
+            'order', 'created_at', 'id'
+        ).values_list('id', 'order')
+        moved = [
+            Lesson(id=lesson_id, order=ORDER_GAP * position)
+            for position, (lesson_id, order) in enumerate(rows, 1)
+            if order != ORDER_GAP * position
+        ]
+        Lesson.objects.bulk_update(moved, ['order'], batch_size=500)
+    return len(moved)
+
+
+def _longest_increasing(values):
+    """Return the positions of a longest strictly increasing subsequence"""
+    tails = []
+    tail_positions = []
+    previous = [None] * len(values)
+
+    for position, value in enumerate(values):
+        index = bisect_left(tails, value)
+        if index == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[index] = value
+            tail_positions[index] = position
+        previous[position] = tail_positions[index - 1] if index else None
+
+    keep = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        keep.add(position)
+        position = previous[position]
+    return keep
+
+
+def _fill_gaps(orders, keep):
+    """
+    Assign orders to the positions not kept, between their kept neighbours
+
+    Returns:
+        list: New order per position, or None if some gap is too small
+    """
+    new_orders = list(orders)
+    position = 0
+    while position < len(orders):
+        if position in keep:
+            position += 1
+            continue
+
+        start = position
+        while position < len(orders) and position not in keep:
+            position += 1
+        count = position - start
+
+        low = new_orders[start - 1] if start > 0 else None
+        high = orders[position] if position < len(orders) else None
+        if low is None and high is None:
+            low, high = 0, ORDER_GAP * (count + 1)
+        elif low is None:
+            low = high - ORDER_GAP * (count + 1)
+        elif high is None:
+            high = low + ORDER_GAP * (count + 1)
+
+        step = (high - low) // (count + 1)
+        if step < 1:
+            return None
+        for offset in range(count):
+            new_orders[start + offset] = low + step * (offset + 1)
+
+    return new_orders
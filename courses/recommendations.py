@@ -0,0 +1,148 @@
+import numpy as np
+from scipy import sparse
+from django.db import connection, transaction
+from .models import CourseRecommendation, Enrollment
+
+
+# Neighbours stored per course
+TOP_K = 10
+# Pairs of courses with fewer shared students than this are not recommended
+MIN_COMMON_STUDENTS = 2
+# Similarity cells (courses in a block x all courses) held in memory at once
+BLOCK_CELLS = 4_000_000
+# Enrollment rows fetched from the database cursor at a time
+FETCH_SIZE = 50_000
+
+
+def load_enrollment_matrix(fetch_size=FETCH_SIZE):
+    """
+    Read the Enrollment table into a sparse student x course matrix
+
+    Rows are streamed from a raw cursor into NumPy arrays, skipping model
+    instantiation entirely.
+
+    Returns:
+        tuple: (matrix, course_ids) where matrix is a binary CSR matrix with
+               one row per enrolled student and one column per course, and
+               course_ids maps column positions back to Course IDs
+    """
+    queryset = Enrollment.objects.order_by().values_list('student_id', 'course_id')
+    sql, params = queryset.query.sql_with_params()
+
+    parts = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            parts.append(np.array(rows, dtype=np.int64))
+
+    if not parts:
+        return sparse.csr_matrix((0, 0), dtype=np.int32), np.empty(0, dtype=np.int64)
+
+    pairs = np.concatenate(parts)
+    _, student_index = np.unique(pairs[:, 0], return_inverse=True)
+    course_ids, course_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (student_index, course_index)),
+        shape=(student_index.max() + 1, len(course_ids))
+    )
+    # Enrollments are unique per (student, course), but stay binary regardless
+    matrix.data[:] = 1
+    return matrix, course_ids
+
+
+def iter_neighbours(matrix, top_k=TOP_K, min_common=MIN_COMMON_STUDENTS, block_cells=BLOCK_CELLS):
+    """
+    Compute the top-k cosine neighbours of every course, a block at a time
+
+    For binary enrollments the cosine similarity of courses a and b is
+    common(a, b) / sqrt(students(a) * students(b)). The co-enrollment counts
+    of a block of courses against all courses come from one sparse product,
+    so memory is bounded by block_cells rather than courses squared.
+
+    Args:
+        matrix: Binary student x course matrix from load_enrollment_matrix
+        top_k: Neighbours to keep per course
+        min_common: Minimum shared students for a neighbour to count
+        block_cells: Upper bound on the dense similarity block size
+
+    Yields:
+        tuple: (start, neighbours, scores, common) for the courses in column
+               positions start..start + len(neighbours); each array has
+               one row per course and top_k columns sorted by descending
+               score, with a score of 0 marking an empty slot
+    """
+    courses = matrix.shape[1]
+    k = min(top_k, courses - 1)
+    if k <= 0:
+        return
+
+    by_course = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(matrix.sum(axis=0), dtype=np.float64).ravel())
+    block = max(1, block_cells // courses)
+
+    for start in range(0, courses, block):
+        stop = min(start + block, courses)
+        rows = np.arange(stop - start)
+
+        common = (by_course[start:stop] @ matrix).toarray()
+        common[rows, rows + start] = 0
+        scores = common / np.outer(norms[start:stop], norms)
+        scores[common < min_common] = 0
+
+        neighbours = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, neighbours, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        neighbours = np.take_along_axis(neighbours, order, axis=1)
+
+        yield (
+            start,
+            neighbours,
+            np.take_along_axis(top_scores, order, axis=1),
+            np.take_along_axis(common, neighbours, axis=1),
+        )
+
+
+def refresh_recommendations(top_k=TOP_K, min_common=MIN_COMMON_STUDENTS, block_cells=BLOCK_CELLS):
+    """
+    Rebuild the CourseRecommendation table from the current enrollments
+
+    The table is replaced in one transaction, so pages keep reading the
+    previous neighbours until the new ones are committed.
+
+    Returns:
+        dict: Counts of enrollments, students, courses and recommendations
+    """
+    matrix, course_ids = load_enrollment_matrix()
+
+    recommendations = []
+    for start, neighbours, scores, common in iter_neighbours(
+        matrix, top_k=top_k, min_common=min_common, block_cells=block_cells
+    ):
+        for offset in range(len(neighbours)):
+            course_id = int(course_ids[start + offset])
+            for rank, (neighbour, score, shared) in enumerate(
+                zip(neighbours[offset], scores[offset], common[offset]), 1
+            ):
+                if score <= 0:
+                    break
+                recommendations.append(CourseRecommendation(
+                    course_id=course_id,
+                    recommended_id=int(course_ids[neighbour]),
+                    rank=rank,
+                    score=float(score),
+                    common_students=int(shared)
+                ))
+
+    with transaction.atomic():
+        CourseRecommendation.objects.all().delete()
+        CourseRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+
+    return {
+        'enrollments': matrix.nnz,
+        'students': matrix.shape[0],
+        'courses': matrix.shape[1],
+        'recommendations': len(recommendations),
+    }
@@ -0,0 +1,484 @@
+import base64
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
+from .models import Course, CourseRecommendation, Enrollment, Lesson, LessonProgress
+from .storage import BLOB_DIR, get_blob_digest
+
+
+def get_progress_for_pairs(pairs):
+    """
+    Read lesson progress for a set of (student, course) pairs
+
+    Reads the materialized progress stored on Enrollment, so it costs a
+    single query regardless of how many pairs are requested. Pairs with
+    no enrollment report zero completed lessons; looking up their lesson
+    totals costs one more query.
+
+    Args:
+        pairs: Iterable of (student_id, course_id) tuples
+
+    Returns:
+        dict: Maps each (student_id, course_id) pair to a dict with
+              total_lessons, completed_lessons and percentage
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    student_ids = {student_id for student_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    rows = Enrollment.objects.filter(
+        student_id__in=student_ids,
+        course_id__in=course_ids
+    ).values_list(
+        'student_id', 'course_id', 'course__lesson_count',
+        'completed_lessons', 'progress_percentage'
+    ).order_by()
+
+    progress = {}
+    for student_id, course_id, total, completed, percentage in rows:
+        if (student_id, course_id) in pairs:
+            progress[(student_id, course_id)] = {
+                'total_lessons': total,
+                'completed_lessons': completed,
+                'percentage': percentage,
+            }
+
+    missing = pairs - progress.keys()
+    if missing:
+        totals = dict(
+            Course.objects.filter(
+                id__in={course_id for _, course_id in missing}
+            ).values_list('id', 'lesson_count')
+        )
+        for pair in missing:
+            progress[pair] = _build_progress(totals.get(pair[1], 0), 0)
+
+    return progress
+
+
+def compute_progress_for_pairs(pairs):
+    """
+    Compute lesson progress for (student, course) pairs from LessonProgress
+
+    This is the read-time calculation the materialized progress replaces.
+    It runs two grouped queries and is used to verify and backfill the
+    stored values.
+
+    Args:
+        pairs: Iterable of (student_id, course_id) tuples
+
+    Returns:
+        dict: Maps each (student_id, course_id) pair to a dict with
+              total_lessons, completed_lessons and percentage
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    student_ids = {student_id for student_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    totals = dict(
+        Course.objects.filter(id__in=course_ids).values_list('id', 'lesson_count')
+    )
+
+    completed_rows = LessonProgress.objects.filter(
+        student_id__in=student_ids,
+        lesson__course_id__in=course_ids,
+        completed=True
+    ).values('student_id', 'lesson__course_id').annotate(
+        completed_count=Count('id')
+    ).order_by()
+
+    completed = {
+        (row['student_id'], row['lesson__course_id']): row['completed_count']
+        for row in completed_rows
+    }
+
+    return {
+        pair: _build_progress(totals.get(pair[1], 0), completed.get(pair, 0))
+        for pair in pairs
+    }
+
+
+def get_progress(student_id, course_id):
+    """
+    Read lesson progress for a single student in a single course
+
+    Args:
+        student_id: ID of the student user
+        course_id: ID of the course
+
+    Returns:
+        dict: total_lessons, completed_lessons and percentage
+    """
+    return get_progress_for_pairs([(student_id, course_id)])[(student_id, course_id)]
+
+
+def attach_progress(enrollments):
+    """
+    Annotate enrollment objects with their lesson totals
+
+    Completed lessons and percentage are already materialized on each
+    enrollment; this adds total_lessons from the course counter. Load
+    the enrollments with select_related('course') to avoid extra queries.
+
+    Args:
+        enrollments: Iterable of Enrollment instances
+
+    Returns:
+        list: The same enrollments as a list
+    """
+    enrollments = list(enrollments)
+
+    for enrollment in enrollments:
+        enrollment.total_lessons = enrollment.course.lesson_count
+
+    return enrollments
+
+
+def _build_progress(total_lessons, completed_lessons):
+    """Build a progress dict, clamping stale completions to the total"""
+    completed_lessons = min(completed_lessons, total_lessons)
+    if total_lessons == 0:
+        percentage = 0
+    else:
+        percentage = completed_lessons * 100 // total_lessons
+
+    return {
+        'total_lessons': total_lessons,
+        'completed_lessons': completed_lessons,
+        'percentage': percentage,
+    }
+
+
+CATALOG_PAGE_SIZE = 24
+
+CATALOG_SORTS = {
+    # sort key: (ordering field, label)
+    'newest': ('created_at', 'Newest'),
+    'popular': ('student_count', 'Most Popular'),
+}
+
+
+def filter_catalog(queryset, category=None, min_price=None, max_price=None, pricing=None):
+    """
+    Apply the catalog filters to a Course queryset
+
+    Args:
+        queryset: Course queryset
+        category: Category key from Course.CATEGORY_CHOICES
+        min_price: Lowest price to include, as a string or Decimal
+        max_price: Highest price to include, as a string or Decimal
+        pricing: 'free' or 'paid'
+
+    Returns:
+        QuerySet: The filtered queryset; invalid values are ignored
+    """
+    if category in dict(Course.CATEGORY_CHOICES):
+        queryset = queryset.filter(category=category)
+
+    min_price = _parse_price(min_price)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+
+    max_price = _parse_price(max_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    if pricing == 'free':
+        queryset = queryset.filter(price=0)
+    elif pricing == 'paid':
+        queryset = queryset.filter(price__gt=0)
+
+    return queryset
+
+
+def get_catalog_page(queryset, sort='newest', cursor=None, page_size=CATALOG_PAGE_SIZE):
+    """
+    Fetch one page of courses using keyset (cursor) pagination
+
+    Courses are ordered descending by the sort field with the primary
+    key as tie-breaker, and the page after a cursor is selected with a
+    range condition on that pair so every page is an index range scan
+    regardless of how deep the reader has paged.
+
+    Args:
+        queryset: Filtered Course queryset
+        sort: Key from CATALOG_SORTS
+        cursor: Opaque cursor from a previous page, or None for the first page
+        page_size: Number of courses per page
+
+    Returns:
+        tuple: (list of courses, cursor for the next page or None)
+    """
+    field = CATALOG_SORTS.get(sort, CATALOG_SORTS['newest'])[0]
+    queryset = queryset.order_by(f'-{field}', '-id')
+
+    position = decode_cursor(cursor, field)
+    if position is not None:
+        value, last_id = position
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id})
+        )
+
+    courses = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(courses) > page_size:
+        courses = courses[:page_size]
+        last = courses[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+
+    return courses, next_cursor
+
+
+def encode_cursor(value, last_id):
+    """Encode the last row's sort value and ID as an opaque URL-safe cursor"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, last_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """Decode a cursor, returning None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if field == 'created_at':
+            value = datetime.fromisoformat(value)
+        else:
+            value = int(value)
+        return value, int(last_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_price(value):
+    """Parse a non-negative price, returning None for blank or invalid input"""
+    if value in (None, ''):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return price
+
+
+# File fields whose values may point into the content-addressed store
+BLOB_FIELDS = (
+    (Course, 'thumbnail'),
+    (Lesson, 'video_file'),
+    (Lesson, 'pdf_file'),
+)
+
+
+def get_blob_reference_counts():
+    """
+    Count how many file field values point at each stored blob
+
+    Runs one grouped query per field in BLOB_FIELDS.
+
+    Returns:
+        Counter: Maps blob digest to its number of references
+    """
+    counts = Counter()
+    for model, field in BLOB_FIELDS:
+        rows = model.objects.filter(
+            **{f'{field}__startswith': f'{BLOB_DIR}/'}
+        ).values_list(field).annotate(references=Count('pk')).order_by()
+        for name, references in rows:
+            digest = get_blob_digest(name)
+            if digest:
+                counts[digest] += references
+    return counts
+
+
+# Users resolved and enrollments inserted per statement; stays under
+# SQLite's limit on query parameters
+ENROLL_CHUNK_SIZE = 500
+
+
+def bulk_enroll(course, usernames, chunk_size=ENROLL_CHUNK_SIZE):
+    """
+    Enroll many students in a course at once
+
+    Usernames are resolved with one IN query per chunk and new enrollments
+    are inserted with bulk_create(ignore_conflicts=True), so rows created
+    concurrently by other requests are skipped rather than failing the
+    batch, and reported as already enrolled. The course's student counter
+    is recounted once at the end.
+
+    Args:
+        course: Course to enroll the students in
+        usernames: Iterable of usernames, e.g. from read_usernames()
+        chunk_size: Users resolved and enrollments inserted per query
+
+    Returns:
+        list: (username, status) per input row, where status is one of
+              'enrolled', 'already_enrolled', 'not_found', 'not_student'
+              or 'duplicate'
+    """
+    rows = []
+    seen = set()
+    statuses = {}
+    chunk = []
+
+    def enroll_chunk():
+        users = {
+            username: (user_id, role)
+            for username, user_id, role in User.objects.filter(
+                username__in=chunk
+            ).values_list('username', 'id', 'profile__role')
+        }
+        enrolled = set(Enrollment.objects.filter(
+            course=course,
+            student_id__in=[user_id for user_id, _ in users.values()]
+        ).values_list('student_id', flat=True))
+
+        new = []
+        usernames_by_id = {}
+        for username in chunk:
+            user_id, role = users.get(username, (None, None))
+            if user_id is None:
+                statuses[username] = 'not_found'
+            elif role != 'student':
+                statuses[username] = 'not_student'
+            elif user_id in enrolled:
+                statuses[username] = 'already_enrolled'
+            else:
+                statuses[username] = 'enrolled'
+                usernames_by_id[user_id] = username
+                new.append(Enrollment(student_id=user_id, course=course))
+
+        Enrollment.objects.bulk_create(new, ignore_conflicts=True)
+        # A row enrolled concurrently since the check above was skipped;
+        # it is told apart from ours by its enrolled_at
+        stored = dict(Enrollment.objects.filter(
+            course=course,
+            student_id__in=[enrollment.student_id for enrollment in new]
+        ).values_list('student_id', 'enrolled_at'))
+        new_ids = []
+        for enrollment in new:
+            if stored.get(enrollment.student_id) == enrollment.enrolled_at:
+                new_ids.append(enrollment.student_id)
+            else:
+                statuses[usernames_by_id[enrollment.student_id]] = 'already_enrolled'
+
+        # bulk_create skips the signal that invalidates the membership cache
+        Enrollment.invalidate_course_ids(*new_ids)
+        chunk.clear()
+
+    with transaction.atomic():
+        for username in usernames:
+            username = username.strip()
+            if not username:
+                continue
+            if username in seen:
+                rows.append((username, True))
+                continue
+            seen.add(username)
+            rows.append((username, False))
+            chunk.append(username)
+            if len(chunk) >= chunk_size:
+                enroll_chunk()
+        if chunk:
+            enroll_chunk()
+
+        # bulk_create skips the post_save signal that maintains the counter
+        # and starts progress from lessons completed before enrolling; new
+        # rows are among those still at zero
+        Course.rebuild_counters(Course.objects.filter(pk=course.pk))
+        Enrollment.rebuild_progress(Enrollment.objects.filter(course=course, progress_percentage=0))
+
+    return [
+        (username, 'duplicate' if duplicate else statuses[username])
+        for username, duplicate in rows
+    ]
+
+
+def read_usernames(file):
+    """
+    Yield usernames from a CSV file object, binary or text
+
+    Uses the 'username' column if the first row has one, otherwise the
+    first column of every row.
+    """
+    if isinstance(file.read(0), bytes):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+    rows = csv.reader(file)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    column = 0
+    normalized = [cell.strip().lower() for cell in header]
+    if 'username' in normalized:
+        column = normalized.index('username')
+    elif header:
+        yield header[0]
+
+    for row in rows:
+        if len(row) > column:
+            yield row[column]
+
+
+RECOMMENDATION_LIMIT = 4
+
+
+def get_similar_courses(course_id, limit=RECOMMENDATION_LIMIT):
+    """
+    Return the courses most often taken together with a course
+
+    One query on the (course, rank) index of the precomputed table.
+
+    Returns:
+        list: Course instances, most similar first
+    """
+    recommendations = CourseRecommendation.objects.filter(
+        course_id=course_id
+    ).select_related('recommended__instructor')[:limit]
+    return [recommendation.recommended for recommendation in recommendations]
+
+
+def get_recommended_courses(student_id, limit=RECOMMENDATION_LIMIT):
+    """
+    Recommend courses to a student from the neighbours of their courses
+
+    Candidates are scored by summing their similarity to each course the
+    student is enrolled in. Costs one query when the enrolled set is
+    cached (ENROLLMENT_CACHE_TIMEOUT, only on by default with a shared
+    cache), and two otherwise.
+
+    Returns:
+        list: Course instances the student is not enrolled in, best first
+    """
+    enrolled = Enrollment.get_course_ids(student_id)
+    if not enrolled:
+        return []
+
+    scores = Counter()
+    courses = {}
+    for recommendation in CourseRecommendation.objects.filter(
+        course_id__in=enrolled
+    ).exclude(
+        recommended_id__in=enrolled
+    ).select_related('recommended__instructor'):
+        scores[recommendation.recommended_id] += recommendation.score
+        courses[recommendation.recommended_id] = recommendation.recommended
+
+    return [courses[course_id] for course_id, _ in scores.most_common(limit)]
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+
+
+# Blobs live under this directory of MEDIA_ROOT, fanned out by digest
+BLOB_DIR = 'cas'
+
+_BLOB_NAME_RE = re.compile(r'^cas/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[^./]+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that keeps each distinct file once, named by its SHA-256
+
+    Saving hashes the content while streaming it to a temporary file,
+    then renames it to cas/<ab>/<cd>/<digest><ext>. If that blob already
+    exists the new copy is discarded, so the same intro video uploaded
+    to twenty lessons occupies disk space once. The name stored on the
+    model is the blob name, which makes references countable from the
+    file fields (see courses.services.get_blob_reference_counts) and
+    gives every file a strong ETag for free.
+
+    Variants written next to a blob (e.g. <digest>.card.jpg thumbnails)
+    share its digest prefix and are garbage-collected with it.
+    """
+
+    CHUNK_SIZE = 256 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The requested name is replaced by the digest in _save, so
+        # there is no collision to avoid
+        return name
+
+    def _save(self, name, content):
+        temp_dir = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(temp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            return self.adopt_file(temp_path, name, digest.hexdigest())
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def adopt_file(self, path, name, digest):
+        """
+        Move an already hashed local file into the blob store
+
+        Args:
+            path: Path of the file on the same filesystem as MEDIA_ROOT
+            name: Requested name; only its extension is kept
+            digest: Hex SHA-256 of the file
+
+        Returns:
+            str: Storage name of the blob
+        """
+        blob_name = get_blob_name(digest, name)
+        blob_path = self.path(blob_name)
+
+        if _touch(blob_path):
+            os.remove(path)
+            return blob_name
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        # Concurrent saves of the same content rename identical files
+        # onto the same path, which is harmless
+        os.replace(path, blob_path)
+        return blob_name
+
+    def link_file(self, path, name):
+        """
+        Add an existing local file to the blob store without copying it
+
+        The file is hashed in place and hard-linked into the store; a
+        copy is made only if it lives on another filesystem. A linked
+        source shares the blob's inode, so it must not be edited in
+        place afterwards.
+
+        Args:
+            path: Path of the source file, which is left untouched
+            name: Requested name; only its extension is kept
+
+        Returns:
+            str: Storage name of the blob
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+
+        blob_name = get_blob_name(digest, name)
+        if _touch(self.path(blob_name)):
+            return blob_name
+
+        temp_dir = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, f'{digest}.{os.getpid()}.link')
+        try:
+            os.link(path, temp_path)
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        return self.adopt_file(temp_path, name, digest)
+
+    def get_digest(self, name):
+        """Return the SHA-256 a blob is named after, or None for other files"""
+        return get_blob_digest(name)
+
+    def iter_blobs(self):
+        """
+        Yield (digest, name) for every file in the blob store
+
+        Variants stored next to a blob are yielded with the blob's digest.
+        """
+        root = self.path(BLOB_DIR)
+        for directory, subdirectories, filenames in os.walk(root):
+            if directory == root:
+                subdirectories[:] = [name for name in subdirectories if name != 'tmp']
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(directory, filename), self.location)
+                name = name.replace(os.sep, '/')
+                digest = filename.split('.', 1)[0]
+                if re.fullmatch(r'[0-9a-f]{64}', digest):
+                    yield digest, name
+
+
+def _touch(path):
+    """
+    Refresh a blob's mtime if it exists, returning whether it does
+
+    gc_media_blobs keeps unreferenced blobs younger than its cutoff, as
+    their row may not be committed yet; a blob reused by a new save must
+    look new too, or a GC run before that commit deletes it.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def get_blob_name(digest, name=''):
+    """Return the storage name for a digest, keeping the original extension"""
+    extension = os.path.splitext(name)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def get_blob_digest(name):
+    """Return the digest from a blob name, or None if it is not a blob"""
+    match = _BLOB_NAME_RE.match(name or '')
+    return match.group(1) if match else None
+
+
+def get_media_storage():
+    """
+    Storage used by lesson and course file fields
+
+    Content-addressed unless MEDIA_DEDUPLICATE is False. Files saved
+    before deduplication was enabled keep their names and are served
+    as before.
+    """
+    if getattr(settings, 'MEDIA_DEDUPLICATE', True):
+        return content_storage
+    return default_storage
+
+
+content_storage = ContentAddressedStorage()
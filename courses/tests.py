@@ -1,6 +1,34 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from .models import Course, Lesson, Enrollment, LessonProgress
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    Course, CourseRecommendation, Lesson, Enrollment, LessonProgress, LessonUpload
+)
+from .importer import ManifestError, _iter_json_array
+from .media import get_file_etag, parse_range_header
+from .ordering import ORDER_GAP
+from .services import (
+    bulk_enroll, get_blob_reference_counts, get_progress_for_pairs, 
+    compute_progress_for_pairs, get_recommended_courses, get_similar_courses, 
+    read_usernames
+)
+from .uploads import finalize_upload
+from .watch_buffer import get_watch_buffer, reset_watch_buffer
 
 
 class CourseModelTestCase(TestCase):
@@ -59,3 +87,1012 @@ class EnrollmentTestCase(TestCase):
         self.assertIsNotNone(enrollment)
         self.assertEqual(enrollment.student, self.student)
         self.assertEqual(enrollment.course, self.course)
+
+
+class CourseCounterTestCase(TestCase):
+    """Test cases for the denormalized Course counters"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            password='test123'
+        )
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+    
+    def test_lesson_counters(self):
+        """Test lesson create, update and delete keep counters current"""
+        lesson = Lesson.objects.create(course=self.course, title='One', duration=30)
+        Lesson.objects.create(course=self.course, title='Two', duration=15)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.get_total_lessons(), 2)
+        self.assertEqual(self.course.total_duration, 45)
+        
+        lesson = Lesson.objects.get(pk=lesson.pk)
+        lesson.duration = 40
+        lesson.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_duration, 55)
+        
+        lesson.delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.get_total_lessons(), 1)
+        self.assertEqual(self.course.total_duration, 15)
+    
+    def test_student_counter(self):
+        """Test enrollment create and delete keep the student count current"""
+        enrollment = Enrollment.objects.create(
+            student=self.student,
+            course=self.course
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.get_total_students(), 1)
+        
+        enrollment.delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.get_total_students(), 0)
+    
+    def test_rebuild_counters(self):
+        """Test rebuild fixes drifted counters"""
+        Lesson.objects.create(course=self.course, title='One', duration=30)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        Course.objects.update(lesson_count=7, student_count=7, total_duration=7)
+        
+        Course.rebuild_counters()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lesson_count, 1)
+        self.assertEqual(self.course.student_count, 1)
+        self.assertEqual(self.course.total_duration, 30)
+
+
+class ProgressServiceTestCase(TestCase):
+    """Test cases for the progress service and materialized progress"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='test123')
+            for i in range(3)
+        ]
+        self.courses = []
+        for i in range(4):
+            course = Course.objects.create(
+                instructor=self.instructor,
+                title=f'Course {i}',
+                description='Test Description'
+            )
+            for j in range(4):
+                Lesson.objects.create(course=course, title=f'Lesson {j}')
+            for student in self.students:
+                Enrollment.objects.create(student=student, course=course)
+            self.courses.append(course)
+        
+        self.client = Client()
+        self.client.login(username='student0', password='test123')
+    
+    def complete(self, lesson):
+        return self.client.get(reverse('courses:mark_complete', args=[lesson.id]))
+    
+    def test_progress_values(self):
+        """Test totals, completed counts and percentage"""
+        student, course = self.students[0], self.courses[0]
+        for lesson in course.lessons.all()[:3]:
+            self.complete(lesson)
+        
+        expected = {
+            'total_lessons': 4,
+            'completed_lessons': 3,
+            'percentage': 75,
+        }
+        pair = (student.id, course.id)
+        self.assertEqual(get_progress_for_pairs([pair])[pair], expected)
+        self.assertEqual(compute_progress_for_pairs([pair])[pair], expected)
+    
+    def test_constant_query_count(self):
+        """Test the number of queries does not grow with the number of pairs"""
+        pairs = [
+            (student.id, course.id)
+            for student in self.students
+            for course in self.courses
+        ]
+        with self.assertNumQueries(1):
+            progress = get_progress_for_pairs(pairs)
+        self.assertEqual(len(progress), len(pairs))
+    
+    def test_completion_sets_enrollment_completed(self):
+        """Test completing every lesson marks the enrollment completed once"""
+        course = self.courses[0]
+        lessons = list(course.lessons.all())
+        for lesson in lessons:
+            self.complete(lesson)
+        self.complete(lessons[0])
+        
+        enrollment = Enrollment.objects.get(student=self.students[0], course=course)
+        self.assertEqual(enrollment.completed_lessons, 4)
+        self.assertEqual(enrollment.progress_percentage, 100)
+        self.assertTrue(enrollment.completed)
+        self.assertIsNotNone(enrollment.completed_at)
+        self.assertEqual(enrollment.last_completed_lesson, lessons[-1])
+    
+    def test_lesson_add_and_delete_update_progress(self):
+        """Test adding and deleting lessons keeps stored progress current"""
+        course = self.courses[0]
+        lessons = list(course.lessons.all())
+        for lesson in lessons:
+            self.complete(lesson)
+        
+        new_lesson = Lesson.objects.create(course=course, title='Bonus')
+        enrollment = Enrollment.objects.get(student=self.students[0], course=course)
+        self.assertEqual(enrollment.progress_percentage, 80)
+        self.assertFalse(enrollment.completed)
+        
+        new_lesson.delete()
+        lessons[0].delete()
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.completed_lessons, 3)
+        self.assertEqual(enrollment.progress_percentage, 100)
+        self.assertTrue(enrollment.completed)
+    
+    def test_rebuild_progress(self):
+        """Test rebuild restores drifted progress from LessonProgress"""
+        course = self.courses[0]
+        for lesson in course.lessons.all()[:2]:
+            self.complete(lesson)
+        Enrollment.objects.update(completed_lessons=0, progress_percentage=0)
+        
+        Enrollment.rebuild_progress()
+        enrollment = Enrollment.objects.get(student=self.students[0], course=course)
+        self.assertEqual(enrollment.completed_lessons, 2)
+        self.assertEqual(enrollment.progress_percentage, 50)
+
+
+    def test_enrollment_starts_from_completed_lessons(self):
+        """Test re-enrolling, or enrolling after completing lessons, keeps that progress"""
+        student, course = self.students[0], self.courses[0]
+        lessons = list(course.lessons.all())
+        self.complete(lessons[0])
+        self.complete(lessons[1])
+        
+        Enrollment.objects.filter(student=student, course=course).delete()
+        Enrollment.objects.create(student=student, course=course)
+        enrollment = Enrollment.objects.get(student=student, course=course)
+        self.assertEqual(enrollment.completed_lessons, 2)
+        self.assertEqual(enrollment.progress_percentage, 50)
+        self.assertEqual(enrollment.last_completed_lesson, lessons[1])
+        
+        # Completions recorded while not enrolled count once enrolled
+        enrollment.delete()
+        self.complete(lessons[2])
+        self.complete(lessons[3])
+        bulk_enroll(course, [student.username])
+        enrollment = Enrollment.objects.get(student=student, course=course)
+        self.assertEqual(enrollment.progress_percentage, 100)
+        self.assertTrue(enrollment.completed)
+
+
+class CourseCatalogViewTestCase(TestCase):
+    """Test cases for the paginated, filtered course catalog"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            password='test123'
+        )
+        for i in range(30):
+            Course.objects.create(
+                instructor=self.instructor,
+                title=f'Course {i}',
+                description='Test Description',
+                category='programming' if i % 2 else 'database',
+                price=0 if i % 3 == 0 else 100 + i
+            )
+        self.client = Client()
+        self.client.login(username='student', password='test123')
+    
+    def test_keyset_pages_cover_catalog_once(self):
+        """Test following next links visits every course exactly once"""
+        seen = []
+        url = reverse('courses:list')
+        while url:
+            response = self.client.get(url)
+            seen.extend(course.id for course in response.context['courses'])
+            next_url = response.context['next_url']
+            url = reverse('courses:list') + next_url if next_url else None
+        
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(set(seen), set(Course.objects.values_list('id', flat=True)))
+    
+    def test_filters(self):
+        """Test category, price range and free/paid filters"""
+        response = self.client.get(reverse('courses:list'), {
+            'category': 'programming',
+            'pricing': 'paid',
+            'min_price': '110',
+            'max_price': '120',
+        })
+        courses = response.context['courses']
+        self.assertTrue(courses)
+        for course in courses:
+            self.assertEqual(course.category, 'programming')
+            self.assertTrue(110 <= course.price <= 120)
+        
+        response = self.client.get(reverse('courses:list'), {'pricing': 'free'})
+        self.assertEqual(len(response.context['courses']), 10)
+    
+    def test_enrolled_courses_is_set(self):
+        """Test enrolled membership is a set fetched once per request"""
+        course = Course.objects.first()
+        Enrollment.objects.create(student=self.student, course=course)
+        response = self.client.get(reverse('courses:list'), {'sort': 'popular'})
+        self.assertEqual(response.context['enrolled_courses'], {course.id})
+        self.assertEqual(response.context['courses'][0], course)
+
+
+def read_body(response):
+    """Collect a streaming response body produced by an async iterator"""
+    async def consume():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(consume)()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class LessonMediaViewTestCase(TestCase):
+    """Test cases for protected, range-capable lesson media"""
+    
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.instructor.profile.role = 'instructor'
+        self.instructor.profile.save()
+        self.student = User.objects.create_user(
+            username='student',
+            password='test123'
+        )
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.content = bytes(range(256)) * 40
+        self.lesson = Lesson.objects.create(
+            course=self.course,
+            title='Video Lesson',
+            video_file=SimpleUploadedFile('intro.mp4', self.content, 'video/mp4')
+        )
+        self.url = reverse('courses:lesson_media', args=[self.lesson.id, 'video'])
+        self.client = Client()
+        self.client.login(username='student', password='test123')
+    
+    def test_requires_enrollment(self):
+        """Test students who are not enrolled are refused"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+    
+    def test_full_and_range_responses(self):
+        """Test 200 full body, 206 partial body and 416 past the end"""
+        Enrollment.objects.create(student=self.student, course=self.course)
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_body(response), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(read_body(response), self.content[100:200])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(read_body(response), self.content[-10:])
+        
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_range_of_empty_file_is_unsatisfiable(self):
+        """Test no range, suffix ranges included, can be served from an empty file"""
+        self.assertEqual(parse_range_header('bytes=-5', 0), 'unsatisfiable')
+        self.assertEqual(parse_range_header('bytes=0-', 0), 'unsatisfiable')
+        self.assertEqual(parse_range_header('bytes=-5', 3), (0, 2))
+    
+    def test_if_range_mismatch_sends_full_file(self):
+        """Test a stale If-Range validator gets the whole file"""
+        Enrollment.objects.create(student=self.student, course=self.course)
+        response = self.client.get(
+            self.url, 
+            HTTP_RANGE='bytes=0-9', 
+            HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+    
+    @override_settings(LESSON_MEDIA_OFFLOAD='x-accel')
+    def test_accel_redirect(self):
+        """Test offload mode hands the transfer to the proxy"""
+        self.client.login(username='instructor', password='test123')
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], 
+            '/protected-media/' + self.lesson.video_file.name
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ChunkedUploadTestCase(TestCase):
+    """Test cases for chunked, resumable lesson uploads"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.instructor.profile.role = 'instructor'
+        self.instructor.profile.save()
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.lesson = Lesson.objects.create(course=self.course, title='Upload Lesson')
+        self.content = bytes(range(256)) * 100
+        self.client = Client()
+        self.client.login(username='instructor', password='test123')
+    
+    def start(self, **extra):
+        data = dict(field='video_file', filename='lecture.mp4', size=len(self.content), **extra)
+        response = self.client.post(
+            reverse('courses:upload_init', args=[self.lesson.id]),
+            data=json.dumps(data),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['url']
+    
+    def put_chunk(self, url, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum:
+            headers['HTTP_X_CHUNK_CHECKSUM'] = checksum
+        return self.client.put(
+            url, 
+            data=chunk, 
+            content_type='application/octet-stream', 
+            **headers
+        )
+    
+    def test_upload_resume_and_finalize(self):
+        """Test chunks are appended, the offset can be queried and finalize attaches the file"""
+        url = self.start(sha256=hashlib.sha256(self.content).hexdigest())
+        first, second = self.content[:10000], self.content[10000:]
+        
+        response = self.put_chunk(
+            url, 0, first, 'sha256=' + hashlib.sha256(first).hexdigest()
+        )
+        self.assertEqual(response.json()['offset'], 10000)
+        
+        # A client that lost its connection asks where to resume
+        response = self.client.head(url)
+        self.assertEqual(response['Upload-Offset'], '10000')
+        
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, 409)
+        
+        self.put_chunk(url, 10000, second)
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, 200)
+        
+        self.lesson.refresh_from_db()
+        with self.lesson.video_file.open('rb') as video:
+            self.assertEqual(video.read(), self.content)
+        self.assertEqual(LessonUpload.objects.get().status, 'complete')
+    
+    def test_concurrent_finalize_returns_completed_lesson(self):
+        """Test a finalize that lost the race gets the lesson instead of an error"""
+        url = self.start()
+        self.put_chunk(url, 0, self.content)
+        stale = LessonUpload.objects.get()
+        self.assertEqual(self.client.post(url + 'finalize/').status_code, 200)
+        
+        # The part file is gone and the claim fails: both end at the winner's result
+        self.assertEqual(finalize_upload(stale), self.lesson)
+        self.assertEqual((stale.status, stale.sha256), ('complete', hashlib.sha256(self.content).hexdigest()))
+    
+    def test_chunk_write_keeps_upload_fresh(self):
+        """Test each accepted chunk moves updated_at, so cleanup spares active uploads"""
+        url = self.start()
+        stale = timezone.now() - timedelta(days=3)
+        LessonUpload.objects.update(updated_at=stale)
+        
+        self.put_chunk(url, 0, self.content[:1000])
+        self.assertGreater(LessonUpload.objects.get().updated_at, stale)
+        call_command('cleanup_uploads', stdout=io.StringIO())
+        self.assertTrue(LessonUpload.objects.exists())
+    
+    def test_out_of_order_chunk_is_rejected(self):
+        """Test a chunk at the wrong offset gets 409 with the expected offset"""
+        url = self.start()
+        response = self.put_chunk(url, 500, self.content[500:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+    
+    def test_checksum_mismatch(self):
+        """Test bad chunk and file checksums are rejected without advancing"""
+        url = self.start(sha256='0' * 64)
+        response = self.put_chunk(url, 0, self.content, 'sha256=' + '0' * 64)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['offset'], 0)
+        
+        self.put_chunk(url, 0, self.content)
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, 422)
+        self.lesson.refresh_from_db()
+        self.assertFalse(self.lesson.video_file)
+    
+    def test_only_course_instructor_can_upload(self):
+        """Test other users cannot start uploads to the lesson"""
+        User.objects.create_user(username='other', password='test123')
+        self.client.login(username='other', password='test123')
+        response = self.client.post(
+            reverse('courses:upload_init', args=[self.lesson.id]),
+            data=json.dumps({'field': 'video_file', 'filename': 'x.mp4', 'size': 1}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTestCase(TestCase):
+    """Test cases for deduplicated lesson and course media"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.content = b'%PDF-1.4 shared handout' * 500
+        self.digest = hashlib.sha256(self.content).hexdigest()
+    
+    def add_lesson(self, title, content=None):
+        return Lesson.objects.create(
+            course=self.course,
+            title=title,
+            pdf_file=SimpleUploadedFile('notes.pdf', content or self.content)
+        )
+    
+    def test_identical_uploads_share_one_blob(self):
+        """Test the same file uploaded twice is stored once under its digest"""
+        first = self.add_lesson('First')
+        second = self.add_lesson('Second')
+        
+        self.assertEqual(first.pdf_file.name, f'cas/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.pdf')
+        self.assertEqual(first.pdf_file.name, second.pdf_file.name)
+        self.assertEqual(get_blob_reference_counts()[self.digest], 2)
+        
+        with second.pdf_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(get_file_etag(first.pdf_file), f'"{self.digest}"')
+    
+    def test_garbage_collection(self):
+        """Test only unreferenced blobs past the grace period are deleted"""
+        kept = self.add_lesson('Kept')
+        orphan = self.add_lesson('Orphan', b'replaced video')
+        orphan_path = orphan.pdf_file.path
+        orphan.delete()
+        
+        call_command('gc_media_blobs', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(orphan_path))
+        
+        call_command('gc_media_blobs', '--min-age=0', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertTrue(os.path.exists(kept.pdf_file.path))
+    
+    def test_reused_blob_is_not_collected(self):
+        """Test saving content an old orphan blob holds makes the blob new again"""
+        orphan = self.add_lesson('Orphan')
+        path = orphan.pdf_file.path
+        orphan.delete()
+        os.utime(path, (0, 0))
+        
+        # Stored again, but its row is not committed when GC runs
+        orphan.pdf_file.storage.save('notes.pdf', SimpleUploadedFile('notes.pdf', self.content))
+        call_command('gc_media_blobs', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+
+
+class LessonOrderingTestCase(TestCase):
+    """Test cases for sparse lesson ordering and bulk reorder"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.instructor.profile.role = 'instructor'
+        self.instructor.profile.save()
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.client = Client()
+        self.client.login(username='instructor', password='test123')
+        for number in range(1, 6):
+            self.client.post(
+                reverse('courses:add_lesson', args=[self.course.id]),
+                {'title': f'Lesson {number}', 'description': '', 'duration': 10}
+            )
+        self.lessons = list(self.course.lessons.all())
+    
+    def orders(self):
+        return list(self.course.lessons.values_list('title', 'order'))
+    
+    def reorder(self, lessons):
+        return self.client.post(
+            reverse('courses:reorder_lessons', args=[self.course.id]),
+            data=json.dumps({'lesson_ids': [lesson.id for lesson in lessons]}),
+            content_type='application/json'
+        )
+    
+    def test_new_lessons_are_spaced(self):
+        """Test appended lessons are ORDER_GAP apart"""
+        self.assertEqual(
+            [order for _, order in self.orders()], 
+            [ORDER_GAP * number for number in range(1, 6)]
+        )
+    
+    def test_reorder_moves_only_displaced_lessons(self):
+        """Test moving one lesson updates one row in one bulk statement"""
+        first, second, third, fourth, fifth = self.lessons
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reorder([first, fifth, second, third, fourth])
+        self.assertEqual(response.json()['moved'], 1)
+        self.assertEqual(
+            sum('UPDATE' in query['sql'] for query in queries.captured_queries), 1
+        )
+        self.assertEqual(
+            [title for title, _ in self.orders()], 
+            ['Lesson 1', 'Lesson 5', 'Lesson 2', 'Lesson 3', 'Lesson 4']
+        )
+        
+        response = self.reorder(list(reversed(self.lessons)))
+        self.assertEqual(response.json()['moved'], 3)
+        self.assertEqual(
+            [title for title, _ in self.orders()], 
+            ['Lesson 5', 'Lesson 4', 'Lesson 3', 'Lesson 2', 'Lesson 1']
+        )
+    
+    def test_exhausted_gap_rebalances(self):
+        """Test repeatedly splitting one gap falls back to renumbering"""
+        order = list(self.lessons)
+        for _ in range(12):
+            # Move the last lesson between the first two every time
+            order.insert(1, order.pop())
+            self.assertEqual(self.reorder(order).status_code, 200)
+            self.assertEqual(
+                [title for title, _ in self.orders()], 
+                [lesson.title for lesson in order]
+            )
+        
+        orders = [value for _, value in self.orders()]
+        self.assertEqual(len(set(orders)), len(orders))
+        
+        call_command('rebalance_lesson_order', f'--min-gap={ORDER_GAP}', stdout=io.StringIO())
+        self.assertEqual(
+            [value for _, value in self.orders()], 
+            [ORDER_GAP * number for number in range(1, 6)]
+        )
+    
+    def test_reorder_rejects_incomplete_list(self):
+        """Test the reorder list must contain every lesson once"""
+        response = self.reorder(self.lessons[:3])
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportCoursesTestCase(TestCase):
+    """Test cases for the import_courses management command"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+        self.source = tempfile.mkdtemp()
+        with open(os.path.join(self.source, 'intro.mp4'), 'wb') as video:
+            video.write(b'intro video' * 1000)
+    
+    def write_manifest(self, name, content):
+        path = os.path.join(self.source, name)
+        with open(path, 'w') as manifest:
+            manifest.write(content)
+        return path
+    
+    def test_json_import(self):
+        """Test courses and lessons are created with counters, order and shared media"""
+        lessons = [
+            {'title': 'Welcome', 'duration': 5, 'video': 'intro.mp4'},
+            {'title': 'Setup', 'duration': 10},
+        ]
+        path = self.write_manifest('courses.json', json.dumps([
+            {'title': 'Python', 'instructor': 'instructor', 'category': 'programming',
+             'price': '10', 'lessons': lessons},
+            {'title': 'Django', 'instructor': 'instructor', 'lessons': lessons},
+            {'title': 'Orphan', 'instructor': 'nobody'},
+        ]))
+        
+        errors = io.StringIO()
+        call_command('import_courses', path, '--batch-size=2', stdout=io.StringIO(), stderr=errors)
+        
+        self.assertIn('nobody', errors.getvalue())
+        course = Course.objects.get(title='Django')
+        self.assertEqual((course.lesson_count, course.total_duration), (2, 15))
+        self.assertEqual(
+            list(course.lessons.values_list('title', 'order')), 
+            [('Welcome', ORDER_GAP), ('Setup', 2 * ORDER_GAP)]
+        )
+        videos = set(Lesson.objects.exclude(video_file='').values_list('video_file', flat=True))
+        self.assertEqual(len(videos), 1)
+    
+    def test_json_items_split_across_reads(self):
+        """Test items cut at any point between reads decode as from one read"""
+        records = [
+            {'title': 'Quoted "]}{" \\', 'lessons': [{'title': 'x' * 50}] * 3},
+            -4.5, True, None, '',
+        ]
+        for size in (1, 2, 7, 64):
+            with patch('courses.importer.JSON_READ_SIZE', size):
+                self.assertEqual(list(_iter_json_array(io.StringIO(json.dumps(records)))), records)
+                with self.assertRaises(ManifestError):
+                    list(_iter_json_array(io.StringIO('[{"title": "x"}, {"title": ')))
+    
+    def test_csv_dry_run_and_skip_existing(self):
+        """Test dry runs write nothing and re-imports can skip existing courses"""
+        path = self.write_manifest('courses.csv', (
+            'course_title,instructor,category,price,lesson_title,duration,video\n'
+            'Python,instructor,programming,0,Welcome,5,intro.mp4\n'
+            'Python,instructor,programming,0,Setup,10,\n'
+            'Broken,instructor,programming,0,Escape,1,../../etc/passwd\n'
+        ))
+        
+        call_command('import_courses', path, '--dry-run', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertFalse(Course.objects.exists())
+        
+        call_command('import_courses', path, stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('import_courses', path, '--skip-existing', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(list(Course.objects.values_list('title', flat=True)), ['Python'])
+        self.assertEqual(Lesson.objects.count(), 2)
+
+
+class CohortEnrollmentTestCase(TestCase):
+    """Test cases for bulk cohort enrollment"""
+    
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+        self.instructor.profile.role = 'instructor'
+        self.instructor.profile.save()
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.students = [
+            User.objects.create_user(username=f'student{number}', password='test123')
+            for number in range(5)
+        ]
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        self.client = Client()
+        self.client.login(username='instructor', password='test123')
+    
+    def test_enroll_usernames(self):
+        """Test each row gets a status and the counter is updated once"""
+        usernames = [
+            'student0', 'student1', 'student2', 'ghost', 'instructor', 'student1'
+        ]
+        response = self.client.post(
+            reverse('courses:cohort_enroll', args=[self.course.id]),
+            data=json.dumps({'usernames': usernames}),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(
+            [row['status'] for row in response.json()['results']], 
+            ['already_enrolled', 'enrolled', 'enrolled', 'not_found', 'not_student', 'duplicate']
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.student_count, 3)
+    
+    def test_enroll_csv_in_chunks(self):
+        """Test a CSV upload is resolved in bounded chunks"""
+        upload = SimpleUploadedFile(
+            'cohort.csv', 
+            b'username,email\n' + b''.join(
+                f'student{number},s{number}@example.com\n'.encode() for number in range(5)
+            )
+        )
+        with CaptureQueriesContext(connection) as queries:
+            results = bulk_enroll(self.course, read_usernames(upload), chunk_size=2)
+        
+        self.assertEqual(Counter(status for _, status in results), {'enrolled': 4, 'already_enrolled': 1})
+        self.assertLess(len(queries), 20)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).student_count, 5)
+    
+    def test_concurrent_enrollment_reported_as_existing(self):
+        """Test a row enrolled between the check and the insert is not reported as new"""
+        bulk_create = Enrollment.objects.bulk_create
+        
+        def enroll_first(enrollments, **kwargs):
+            # Another request enrolls student1 after bulk_enroll checked
+            Enrollment.objects.create(student=self.students[1], course=self.course)
+            return bulk_create(enrollments, **kwargs)
+        
+        with patch.object(Enrollment.objects, 'bulk_create', enroll_first):
+            results = bulk_enroll(self.course, ['student1', 'student2'])
+        
+        self.assertEqual(results, [('student1', 'already_enrolled'), ('student2', 'enrolled')])
+        self.assertEqual(Course.objects.get(pk=self.course.pk).student_count, 3)
+    
+    def test_only_instructor_or_staff(self):
+        """Test other users cannot enroll cohorts"""
+        self.client.login(username='student1', password='test123')
+        response = self.client.post(
+            reverse('courses:cohort_enroll', args=[self.course.id]),
+            data=json.dumps({'usernames': ['student2']}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(WATCH_FLUSH_INTERVAL=0)
+class WatchHeartbeatTestCase(TestCase):
+    """Test cases for buffered playback heartbeats"""
+    
+    def setUp(self):
+        cache.clear()
+        reset_watch_buffer()
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+        self.student = User.objects.create_user(username='student', password='test123')
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {number}')
+            for number in range(3)
+        ]
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client = Client()
+        self.client.login(username='student', password='test123')
+    
+    def tearDown(self):
+        reset_watch_buffer()
+    
+    def heartbeat(self, lesson, position, watched):
+        return self.client.post(
+            reverse('courses:heartbeat', args=[lesson.id]), 
+            {'position': position, 'watched': watched}
+        )
+    
+    def test_watch_page_does_not_write(self):
+        """Test viewing a lesson creates no progress rows"""
+        response = self.client.get(reverse('courses:lesson_watch', args=[self.lessons[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(LessonProgress.objects.exists())
+    
+    def test_heartbeats_are_coalesced(self):
+        """Test heartbeats are buffered and flushed as one row per pair"""
+        for position in (15, 30, 45):
+            self.assertEqual(self.heartbeat(self.lessons[0], position, 15).status_code, 204)
+        self.heartbeat(self.lessons[1], 10, 500)
+        self.assertFalse(LessonProgress.objects.exists())
+        
+        # The watch page already offers the buffered position
+        response = self.client.get(reverse('courses:lesson_watch', args=[self.lessons[0].id]))
+        self.assertEqual(response.context['resume_position'], 45)
+        
+        # Savepoint, read, insert of the new rows, re-read, update, release
+        with self.assertNumQueries(6):
+            self.assertEqual(get_watch_buffer().flush(), 2)
+        
+        first = LessonProgress.objects.get(lesson=self.lessons[0])
+        self.assertEqual((first.position_seconds, first.watched_seconds), (45, 45))
+        second = LessonProgress.objects.get(lesson=self.lessons[1])
+        self.assertEqual(second.watched_seconds, 60)
+        
+        # Existing rows accumulate watched time in SQL
+        self.heartbeat(self.lessons[0], 60, 15)
+        get_watch_buffer().flush()
+        first.refresh_from_db()
+        self.assertEqual((first.position_seconds, first.watched_seconds), (60, 60))
+        self.assertFalse(first.completed)
+    
+    def test_row_created_after_read_keeps_heartbeats(self):
+        """Test heartbeats for a row another worker inserted since the read are added to it"""
+        self.heartbeat(self.lessons[0], 30, 15)
+        progress = LessonProgress.objects.create(
+            student=self.student, lesson=self.lessons[0], position_seconds=10, watched_seconds=10
+        )
+        # The first read misses the row, as if it was inserted just after
+        missed = [{}, {(self.student.id, self.lessons[0].id): progress.pk}]
+        with patch.object(get_watch_buffer(), '_read_pks', side_effect=missed):
+            get_watch_buffer().flush()
+        
+        progress = LessonProgress.objects.get()
+        self.assertEqual((progress.position_seconds, progress.watched_seconds), (30, 25))
+        self.assertIsNotNone(progress.last_watched_at)
+    
+    def test_unenrolled_heartbeat_rejected(self):
+        """Test students must be enrolled to report progress"""
+        Enrollment.objects.all().delete()
+        self.assertEqual(self.heartbeat(self.lessons[0], 10, 10).status_code, 403)
+        self.assertEqual(len(get_watch_buffer()), 0)
+
+
+@override_settings(ENROLLMENT_CACHE_TIMEOUT=300)
+class EnrollmentCacheTestCase(TestCase):
+    """Test cases for the cached per-student enrolled-course set"""
+    
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+        self.instructor.profile.role = 'instructor'
+        self.instructor.profile.save()
+        self.student = User.objects.create_user(username='student', password='test123')
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Test Course',
+            description='Test Description'
+        )
+        self.other = Course.objects.create(
+            instructor=self.instructor,
+            title='Other Course',
+            description='Test Description'
+        )
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson')
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client = Client()
+        self.client.login(username='student', password='test123')
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def enrollment_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries if '"enrollments"' in query['sql']]
+    
+    def test_pages_use_cached_membership(self):
+        """Test course pages run no enrollment query once the set is cached"""
+        Enrollment.get_course_ids(self.student.id)
+        self.assertEqual(self.enrollment_queries(reverse('courses:list')), [])
+        self.assertEqual(
+            self.enrollment_queries(reverse('courses:lesson_watch', args=[self.lesson.id])), 
+            []
+        )
+        self.assertEqual(self.enrollment_queries(reverse('courses:detail', args=[self.other.id])), [])
+    
+    def test_enroll_invalidates(self):
+        """Test enrolling makes the course visible without waiting for expiry"""
+        self.assertEqual(Enrollment.get_course_ids(self.student.id), {self.course.id})
+        self.client.post(reverse('courses:enroll', args=[self.other.id]))
+        self.assertEqual(
+            Enrollment.get_course_ids(self.student.id), 
+            {self.course.id, self.other.id}
+        )
+    
+    def test_unenroll_invalidates(self):
+        """Test deleting an enrollment revokes access to the lessons"""
+        self.assertTrue(Enrollment.is_enrolled(self.student.id, self.course.id))
+        Enrollment.objects.filter(student=self.student).delete()
+        response = self.client.get(reverse('courses:lesson_watch', args=[self.lesson.id]))
+        self.assertRedirects(response, reverse('courses:detail', args=[self.course.id]))
+    
+    def test_bulk_enroll_invalidates(self):
+        """Test cohort enrollment invalidates the enrolled students' sets"""
+        Enrollment.get_course_ids(self.student.id)
+        bulk_enroll(self.other, ['student'])
+        self.assertIn(self.other.id, Enrollment.get_course_ids(self.student.id))
+    
+    @override_settings(ENROLLMENT_CACHE_TIMEOUT=0)
+    def test_disabled_without_shared_cache(self):
+        """Test a set cached by another worker is ignored when caching is off"""
+        Enrollment.objects.filter(student=self.student).delete()
+        cache.set(Enrollment._course_ids_cache_key(self.student.id), frozenset([self.course.id]))
+        self.assertFalse(Enrollment.is_enrolled(self.student.id, self.course.id))
+        self.assertEqual(Enrollment.get_course_ids(self.student.id), frozenset())
+    
+    def test_miss_is_rechecked(self):
+        """Test a stale cached set does not refuse a new enrollment"""
+        Enrollment.get_course_ids(self.student.id)
+        Enrollment.objects.bulk_create([Enrollment(student=self.student, course=self.other)])
+        self.assertTrue(Enrollment.is_enrolled(self.student.id, self.other.id))
+
+
+class CourseRecommendationTestCase(TestCase):
+    """Test cases for co-enrollment course recommendations"""
+    
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+        self.courses = [
+            Course.objects.create(
+                instructor=self.instructor,
+                title=f'Course {number}',
+                description='Test Description'
+            )
+            for number in range(4)
+        ]
+        self.students = [
+            User.objects.create_user(username=f'student{number}', password='test123')
+            for number in range(4)
+        ]
+        # Course 0 and 1 share three students, 0 and 2 share two, 3 shares one
+        for student, courses in zip(self.students, [(0, 1, 2), (0, 1, 2), (0, 1, 3), (3,)]):
+            Enrollment.objects.bulk_create([
+                Enrollment(student=student, course=self.courses[index]) for index in courses
+            ])
+    
+    def tearDown(self):
+        cache.clear()
+    
+    def test_neighbours_ranked_by_cosine(self):
+        """Test neighbours are stored by descending cosine similarity"""
+        call_command('refresh_course_recommendations', '--min-common=1', stdout=io.StringIO())
+        rows = list(CourseRecommendation.objects.filter(course=self.courses[0]))
+        self.assertEqual(
+            [row.recommended for row in rows], 
+            [self.courses[1], self.courses[2], self.courses[3]]
+        )
+        self.assertEqual([row.rank for row in rows], [1, 2, 3])
+        self.assertAlmostEqual(rows[0].score, 1.0)
+        self.assertAlmostEqual(rows[1].score, 2 / 6 ** 0.5)
+        self.assertEqual(rows[1].common_students, 2)
+    
+    def test_min_common_and_refresh(self):
+        """Test weak pairs are dropped and a refresh replaces old rows"""
+        call_command('refresh_course_recommendations', '--min-common=1', stdout=io.StringIO())
+        call_command(
+            'refresh_course_recommendations', '--min-common=2', '--block-cells=4', 
+            stdout=io.StringIO()
+        )
+        self.assertFalse(CourseRecommendation.objects.filter(recommended=self.courses[3]).exists())
+        self.assertEqual(CourseRecommendation.objects.filter(course=self.courses[0]).count(), 2)
+    
+    def test_page_lookups(self):
+        """Test similar courses cost one query and students only see new courses"""
+        call_command('refresh_course_recommendations', '--min-common=1', stdout=io.StringIO())
+        with self.assertNumQueries(1):
+            similar = get_similar_courses(self.courses[2].id)
+            [course.instructor.username for course in similar]
+        self.assertEqual(similar[0], self.courses[0])
+        
+        self.assertEqual(get_recommended_courses(self.students[3].id), [
+            self.courses[0], self.courses[1]
+        ])
+        
+        self.client.login(username='student3', password='test123')
+        response = self.client.get(reverse('courses:detail', args=[self.courses[2].id]))
+        self.assertContains(response, 'Students who took this also took')
@@ -0,0 +1,248 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import Lesson, LessonUpload
+
+
+# Largest chunk accepted in a single PUT
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Bytes read from the request stream and hashed at a time
+READ_SIZE = 64 * 1024
+
+_CHECKSUM_RE = re.compile(r'^sha256=([0-9a-fA-F]{64})$')
+
+
+class UploadError(Exception):
+    """Raised when a chunk or finalize request cannot be applied"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_upload_dir():
+    """Return the directory holding partially received uploads"""
+    upload_dir = Path(getattr(
+        settings, 'CHUNKED_UPLOAD_DIR', Path(settings.MEDIA_ROOT) / 'chunked_uploads'
+    ))
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return upload_dir
+
+
+def get_part_path(upload):
+    """Return the on-disk path of an upload's partial file"""
+    return get_upload_dir() / f'{upload.id}.part'
+
+
+def start_upload(lesson, user, field, filename, total_size, expected_sha256=''):
+    """
+    Create an upload session and its empty partial file
+
+    Args:
+        lesson: Lesson the file will be attached to
+        user: Uploading instructor
+        field: 'video_file' or 'pdf_file'
+        filename: Original file name
+        total_size: Size of the complete file in bytes
+        expected_sha256: Optional hex SHA-256 of the complete file
+
+    Returns:
+        LessonUpload: The new upload session
+    """
+    if field not in dict(LessonUpload.FIELD_CHOICES):
+        raise UploadError('field must be video_file or pdf_file')
+    if total_size < 0:
+        raise UploadError('size must not be negative')
+    if expected_sha256 and not re.fullmatch(r'[0-9a-fA-F]{64}', expected_sha256):
+        raise UploadError('sha256 must be 64 hex characters')
+
+    upload = LessonUpload.objects.create(
+        lesson=lesson,
+        uploaded_by=user,
+        field=field,
+        filename=os.path.basename(filename or 'upload')[:255],
+        total_size=total_size,
+        expected_sha256=expected_sha256.lower()
+    )
+    get_part_path(upload).touch()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, checksum=None):
+    """
+    Append one chunk to an upload from the request stream
+
+    The chunk is copied in READ_SIZE pieces, so at most one piece is held
+    in memory. Chunks must arrive in order: the offset has to equal the
+    number of bytes received so far. If a per-chunk checksum is given and
+    does not match, the partial file is truncated back to the offset.
+
+    Args:
+        upload: LessonUpload being written
+        offset: Byte offset the chunk starts at
+        stream: File-like object to read the chunk from (the request)
+        length: Number of bytes in the chunk
+        checksum: Optional 'sha256=<hex>' digest of the chunk
+
+    Returns:
+        int: Bytes received so far after this chunk
+    """
+    if upload.status != 'pending':
+        raise UploadError('Upload is already complete', status=409)
+    if offset != upload.received_bytes:
+        raise UploadError(
+            f'Expected offset {upload.received_bytes}, got {offset}', status=409
+        )
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes')
+    if offset + length > upload.total_size:
+        raise UploadError('Chunk extends past the declared file size', status=416)
+
+    expected_digest = None
+    if checksum:
+        match = _CHECKSUM_RE.match(checksum.strip())
+        if not match:
+            raise UploadError('Checksum must look like sha256=<hex>')
+        expected_digest = match.group(1).lower()
+
+    digest = hashlib.sha256()
+    written = 0
+    path = get_part_path(upload)
+    with open(path, 'r+b') as part:
+        part.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            digest.update(data)
+            part.write(data)
+            written += len(data)
+
+        if written != length or (expected_digest and digest.hexdigest() != expected_digest):
+            part.truncate(offset)
+            if written != length:
+                raise UploadError('Chunk body is shorter than Content-Length')
+            raise UploadError('Chunk checksum mismatch', status=422)
+
+    # Only advance if no concurrent request moved the offset meanwhile.
+    # update() skips auto_now; cleanup_uploads judges staleness by updated_at
+    received = offset + length
+    advanced = LessonUpload.objects.filter(
+        pk=upload.pk,
+        received_bytes=offset
+    ).update(received_bytes=received, updated_at=timezone.now())
+    if not advanced:
+        raise UploadError('Upload offset changed during the request', status=409)
+
+    upload.received_bytes = received
+    return received
+
+
+def finalize_upload(upload):
+    """
+    Verify a fully received upload and attach it to its lesson
+
+    The whole file is hashed from disk, checked against the SHA-256
+    declared at init (if any) and moved into media storage. On local
+    filesystem storage this is a rename, not a copy, and on the
+    content-addressed storage a file that is already stored is dropped.
+
+    Args:
+        upload: LessonUpload with every byte received
+
+    Of concurrent finalize requests, one stores the file and the others
+    get the lesson it completed.
+
+    Returns:
+        Lesson: The lesson with the new file attached
+    """
+    if upload.status == 'complete':
+        return upload.lesson
+    if upload.received_bytes != upload.total_size:
+        raise UploadError(
+            f'Only {upload.received_bytes} of {upload.total_size} bytes received',
+            status=409
+        )
+
+    path = get_part_path(upload)
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as part:
+            for data in iter(lambda: part.read(READ_SIZE), b''):
+                digest.update(data)
+    except FileNotFoundError:
+        # Another request already moved the file into storage
+        return _finalized_elsewhere(upload)
+    sha256 = digest.hexdigest()
+    if upload.expected_sha256 and sha256 != upload.expected_sha256:
+        raise UploadError('File checksum mismatch', status=422)
+
+    lesson = Lesson.objects.get(pk=upload.lesson_id)
+    field_file = getattr(lesson, upload.field)
+    name = field_file.field.generate_filename(lesson, upload.filename)
+
+    with transaction.atomic():
+        # Claim the upload first, so only one request moves the file
+        claimed = LessonUpload.objects.filter(pk=upload.pk, status='pending').update(
+            sha256=sha256, status='complete', updated_at=timezone.now()
+        )
+        if not claimed:
+            return _finalized_elsewhere(upload)
+
+        name = _store_file(field_file.storage, name, path, sha256)
+        setattr(lesson, upload.field, name)
+        lesson.save(update_fields=[upload.field])
+
+    upload.sha256 = sha256
+    upload.status = 'complete'
+    return lesson
+
+
+def _finalized_elsewhere(upload):
+    # The lesson another finalize request completed, or 409 while it runs
+    upload.refresh_from_db()
+    if upload.status == 'complete':
+        return Lesson.objects.get(pk=upload.lesson_id)
+    raise UploadError('Upload is being finalized by another request', status=409)
+
+
+def discard_upload(upload):
+    """Delete an upload session and its partial file"""
+    try:
+        os.remove(get_part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def _store_file(storage, name, path, sha256):
+    """Move the assembled file into storage, renaming when it is on local disk"""
+    if hasattr(storage, 'adopt_file'):
+        # Content-addressed storage: the digest is already known
+        return storage.adopt_file(path, name, sha256)
+
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as assembled:
+            name = storage.save(name, File(assembled))
+        os.remove(path)
+        return name
+
+    name = storage.get_available_name(name)
+    destination = storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.replace(path, destination)
+    except OSError:
+        # Different filesystem: fall back to a streamed copy
+        with open(path, 'rb') as assembled:
+            name = storage.save(name, File(assembled))
+        os.remove(path)
+    return name
@@ -8,7 +8,14 @@ urlpatterns = [
     path('<int:course_id>/', views.course_detail_view, name='detail'),
     path('create/', views.course_create_view, name='create'),
     path('<int:course_id>/add-lesson/', views.lesson_create_view, name='add_lesson'),
+    path('<int:course_id>/reorder-lessons/', views.lesson_reorder_view, name='reorder_lessons'),
     path('<int:course_id>/enroll/', views.enroll_course_view, name='enroll'),
+    path('<int:course_id>/cohort-enroll/', views.cohort_enroll_view, name='cohort_enroll'),
     path('lesson/<int:lesson_id>/', views.lesson_watch_view, name='lesson_watch'),
+    path('lesson/<int:lesson_id>/heartbeat/', views.lesson_heartbeat_view, name='heartbeat'),
     path('lesson/<int:lesson_id>/complete/', views.mark_lesson_complete, name='mark_complete'),
+    path('lesson/<int:lesson_id>/media/<str:kind>/', views.lesson_media_view, name='lesson_media'),
+    path('lesson/<int:lesson_id>/uploads/', views.upload_init_view, name='upload_init'),
+    path('uploads/<uuid:upload_id>/', views.upload_view, name='upload'),
+    path('uploads/<uuid:upload_id>/finalize/', views.upload_finalize_view, name='upload_finalize'),
 ]
@@ -1,27 +1,79 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from .models import Course, Lesson, Enrollment, LessonProgress
+from .models import Course, Lesson, Enrollment, LessonProgress, LessonUpload
+from .media import serve_protected_file
+from .ordering import ReorderError, next_order_expression, reorder_lessons
+from .services import (
+    CATALOG_SORTS, bulk_enroll, filter_catalog, get_catalog_page, get_similar_courses, 
+    read_usernames
+)
+from .uploads import (
+    MAX_CHUNK_SIZE, UploadError, discard_upload, finalize_upload, 
+    start_upload, write_chunk
+)
+from .watch_buffer import get_watch_buffer
+import json
+from collections import Counter
 
 
 @login_required
 def course_list_view(request):
     """
-    Display all available courses
+    Display available courses, one keyset-paginated page at a time
+    Supports category, price range and free/paid filters
     Shows enrollment status for students
     """
-    courses = Course.objects.all()
-    enrolled_courses = []
+    filters = {
+        'category': request.GET.get('category', ''),
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
+        'pricing': request.GET.get('pricing', ''),
+    }
+    sort = request.GET.get('sort', 'newest')
+    if sort not in CATALOG_SORTS:
+        sort = 'newest'
     
+    courses = filter_catalog(
+        Course.objects.select_related('instructor'), 
+        **filters
+    )
+    courses, next_cursor = get_catalog_page(
+        courses, 
+        sort=sort, 
+        cursor=request.GET.get('cursor')
+    )
+    
+    enrolled_courses = set()
     if request.user.profile.role == 'student':
-        enrolled_courses = Enrollment.objects.filter(
-            student=request.user
-        ).values_list('course_id', flat=True)
+        enrolled_courses = Enrollment.get_course_ids(request.user.id)
+    
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = f'?{params.urlencode()}'
+    
+    first_url = None
+    if request.GET.get('cursor'):
+        params = request.GET.copy()
+        del params['cursor']
+        first_url = f'?{params.urlencode()}'
     
     return render(request, 'courses/course_list.html', {
         'courses': courses,
-        'enrolled_courses': enrolled_courses
+        'enrolled_courses': enrolled_courses,
+        'filters': filters,
+        'sort': sort,
+        'sorts': [(key, label) for key, (_, label) in CATALOG_SORTS.items()],
+        'categories': Course.CATEGORY_CHOICES,
+        'next_url': next_url,
+        'first_url': first_url,
     })
 
 
@@ -37,14 +89,16 @@ def course_detail_view(request, course_id):
     enrollment = None
     
     if request.user.profile.role == 'student':
-        try:
-            enrollment = Enrollment.objects.get(
-                student=request.user, 
-                course=course
-            )
-            is_enrolled = True
-        except Enrollment.DoesNotExist:
-            pass
+        is_enrolled = course.id in Enrollment.get_course_ids(request.user.id)
+    if is_enrolled:
+        # Only enrolled students pay for the progress row
+        enrollment = Enrollment.objects.filter(
+            student=request.user, 
+            course=course
+        ).first()
+        if enrollment is None:
+            Enrollment.invalidate_course_ids(request.user.id)
+            is_enrolled = False
     
     is_instructor = course.instructor == request.user
     
@@ -53,7 +107,8 @@ def course_detail_view(request, course_id):
         'lessons': lessons,
         'is_enrolled': is_enrolled,
         'is_instructor': is_instructor,
-        'enrollment': enrollment
+        'enrollment': enrollment,
+        'similar_courses': get_similar_courses(course.id)
     })
 
 
@@ -111,15 +166,27 @@ def lesson_create_view(request, course_id):
         pdf_file = request.FILES.get('pdf_file')
         duration = request.POST.get('duration', 0)
         
-        lesson = Lesson.objects.create(
-            course=course,
-            title=title,
-            description=description,
-            video_file=video_file,
-            pdf_file=pdf_file,
-            duration=duration,
-            order=course.lessons.count() + 1
-        )
+        with transaction.atomic():
+            lesson = Lesson.objects.create(
+                course=course,
+                title=title,
+                description=description,
+                video_file=video_file,
+                pdf_file=pdf_file,
+                duration=duration,
+                order=next_order_expression(course.id)
+            )
+            # The instance still holds the subquery, not the number it chose
+            lesson.refresh_from_db(fields=['order'])
+        
+        if 'application/json' in request.headers.get('Accept', ''):
+            # The chunked uploader creates the lesson first, then streams
+            # its files to the upload endpoints
+            return JsonResponse({
+                'lesson_id': lesson.id,
+                'upload_url': reverse('courses:upload_init', args=[lesson.id]),
+                'redirect_url': reverse('courses:detail', args=[course_id])
+            }, status=201)
         
         messages.success(request, 'Lesson added successfully!')
         return redirect('courses:detail', course_id=course_id)
@@ -127,6 +194,28 @@ def lesson_create_view(request, course_id):
     return render(request, 'courses/lesson_create.html', {'course': course})
 
 
+@login_required
+@require_http_methods(["POST"])
+def lesson_reorder_view(request, course_id):
+    """
+    Reorder a course's lessons in one request (instructors only)
+    Expects JSON: {"lesson_ids": [every lesson ID in the new order]}
+    """
+    course = get_object_or_404(Course, id=course_id)
+    if course.instructor != request.user:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    try:
+        lesson_ids = [int(lesson_id) for lesson_id in json.loads(request.body)['lesson_ids']]
+        moved = reorder_lessons(course, lesson_ids)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected JSON with a lesson_ids list'}, status=400)
+    except ReorderError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, 'moved': moved})
+
+
 @login_required
 def enroll_course_view(request, course_id):
     """
@@ -138,10 +227,15 @@ def enroll_course_view(request, course_id):
     
     course = get_object_or_404(Course, id=course_id)
     
-    enrollment, created = Enrollment.objects.get_or_create(
-        student=request.user,
-        course=course
-    )
+    created = False
+    if course.id not in Enrollment.get_course_ids(request.user.id):
+        enrollment, created = Enrollment.objects.get_or_create(
+            student=request.user,
+            course=course
+        )
+        if not created:
+            # The cached set is stale: enrolled through another process
+            Enrollment.invalidate_course_ids(request.user.id)
     
     if created:
         messages.success(
@@ -154,6 +248,46 @@ def enroll_course_view(request, course_id):
     return redirect('courses:detail', course_id=course_id)
 
 
+@login_required
+@require_http_methods(["POST"])
+def cohort_enroll_view(request, course_id):
+    """
+    Enroll a cohort of students in a course (course instructor or staff)
+    Accepts JSON {"usernames": [...]} or a CSV upload in the 'file' field
+    """
+    course = get_object_or_404(Course, id=course_id)
+    if course.instructor != request.user and not request.user.is_staff:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    if 'file' in request.FILES:
+        usernames = read_usernames(request.FILES['file'])
+    else:
+        try:
+            usernames = json.loads(request.body)['usernames']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse(
+                {'error': 'Expected JSON with a usernames list or a CSV file'}, 
+                status=400
+            )
+        if not isinstance(usernames, list) or not all(isinstance(u, str) for u in usernames):
+            return JsonResponse({'error': 'usernames must be a list of strings'}, status=400)
+    
+    results = bulk_enroll(course, usernames)
+    
+    return JsonResponse({
+        'success': True,
+        'summary': Counter(status for _, status in results),
+        'results': [{'username': username, 'status': status} for username, status in results]
+    })
+
+
+def can_view_lesson(user, course):
+    """Students must be enrolled in a course to view its lessons"""
+    if user.profile.role != 'student':
+        return True
+    return Enrollment.is_enrolled(user.id, course.id)
+
+
 @login_required
 def lesson_watch_view(request, lesson_id):
     """
@@ -164,33 +298,74 @@ def lesson_watch_view(request, lesson_id):
     course = lesson.course
     
     # Check if student is enrolled
-    if request.user.profile.role == 'student':
-        is_enrolled = Enrollment.objects.filter(
-            student=request.user, 
-            course=course
-        ).exists()
-        if not is_enrolled:
-            messages.error(request, 'You must enroll in this course first')
-            return redirect('courses:detail', course_id=course.id)
+    if not can_view_lesson(request.user, course):
+        messages.error(request, 'You must enroll in this course first')
+        return redirect('courses:detail', course_id=course.id)
     
-    # Get or create progress
+    # Read-only: progress rows are created by heartbeats and completion
     progress = None
+    resume_position = 0
     if request.user.profile.role == 'student':
-        progress, created = LessonProgress.objects.get_or_create(
+        progress = LessonProgress.objects.filter(
             student=request.user,
             lesson=lesson
-        )
+        ).first()
+        buffered = get_watch_buffer().get_position(request.user.id, lesson.id)
+        if buffered is not None:
+            resume_position = buffered
+        elif progress:
+            resume_position = progress.position_seconds
     
-    all_lessons = course.lessons.all()
+    all_lessons = list(course.lessons.all())
+    lesson_number = next(
+        (number for number, l in enumerate(all_lessons, 1) if l.id == lesson.id), 
+        None
+    )
     
     return render(request, 'courses/lesson_watch.html', {
         'lesson': lesson,
         'course': course,
         'all_lessons': all_lessons,
-        'progress': progress
+        'lesson_number': lesson_number,
+        'progress': progress,
+        'resume_position': resume_position
     })
 
 
+# Largest playback delta credited per heartbeat; the player sends one
+# every 15 seconds, so anything above this is a stale or forged report
+MAX_HEARTBEAT_SECONDS = 60
+
+
+@login_required
+@require_http_methods(["POST"])
+def lesson_heartbeat_view(request, lesson_id):
+    """
+    Record playback position and watched time for the current student
+    Heartbeats are buffered in memory and written in batches
+    """
+    if request.user.profile.role != 'student':
+        return JsonResponse({'error': 'Only students report progress'}, status=403)
+    
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), id=lesson_id)
+    if not can_view_lesson(request.user, lesson.course):
+        return JsonResponse({'error': 'Not enrolled'}, status=403)
+    
+    try:
+        position = int(float(request.POST['position']))
+        watched = int(float(request.POST.get('watched', 0)))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'position is required'}, status=400)
+    
+    get_watch_buffer().record(
+        request.user.id,
+        lesson.id,
+        position=max(position, 0),
+        watched=min(max(watched, 0), MAX_HEARTBEAT_SECONDS)
+    )
+    return HttpResponse(status=204)
+
+
 @login_required
 def mark_lesson_complete(request, lesson_id):
     """
@@ -200,14 +375,148 @@ def mark_lesson_complete(request, lesson_id):
         return redirect('courses:lesson_watch', lesson_id=lesson_id)
     
     lesson = get_object_or_404(Lesson, id=lesson_id)
-    progress, created = LessonProgress.objects.get_or_create(
-        student=request.user,
-        lesson=lesson
-    )
     
-    progress.completed = True
-    progress.completed_at = timezone.now()
-    progress.save()
+    with transaction.atomic():
+        progress, created = LessonProgress.objects.get_or_create(
+            student=request.user,
+            lesson=lesson
+        )
+        
+        # Conditional update so a repeated or concurrent click only
+        # counts the lesson once in the materialized enrollment progress
+        newly_completed = LessonProgress.objects.filter(
+            pk=progress.pk, 
+            completed=False
+        ).update(completed=True, completed_at=timezone.now())
+        
+        if newly_completed:
+            Enrollment.record_lesson_completion(request.user.id, lesson)
     
     messages.success(request, 'Lesson marked as completed!')
     return redirect('courses:lesson_watch', lesson_id=lesson_id)
+
+
+@login_required
+@require_http_methods(["GET", "HEAD"])
+def lesson_media_view(request, lesson_id, kind):
+    """
+    Serve a lesson's video or PDF to users allowed to watch the lesson
+    Supports Range requests so video seeking does not refetch the file
+    """
+    if kind not in ('video', 'pdf'):
+        raise Http404('Unknown media type')
+    
+    lesson = get_object_or_404(Lesson, id=lesson_id)
+    field_file = lesson.video_file if kind == 'video' else lesson.pdf_file
+    if not field_file:
+        raise Http404('This lesson has no such media')
+    
+    if not can_view_lesson(request.user, lesson.course):
+        return HttpResponseForbidden('You must enroll in this course first')
+    
+    return serve_protected_file(request, field_file, download=(kind == 'pdf'))
+
+
+def _upload_status(upload):
+    return {
+        'upload_id': str(upload.id),
+        'lesson_id': upload.lesson_id,
+        'field': upload.field,
+        'filename': upload.filename,
+        'offset': upload.received_bytes,
+        'total_size': upload.total_size,
+        'status': upload.status,
+    }
+
+
+@login_required
+@require_http_methods(["POST"])
+def upload_init_view(request, lesson_id):
+    """
+    Start a chunked, resumable upload of a lesson video or PDF
+    Expects JSON: field, filename, size and optionally sha256
+    """
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), id=lesson_id)
+    if lesson.course.instructor != request.user:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        upload = start_upload(
+            lesson=lesson,
+            user=request.user,
+            field=data.get('field', 'video_file'),
+            filename=data.get('filename', ''),
+            total_size=int(data['size']),
+            expected_sha256=data.get('sha256', '')
+        )
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected JSON with field, filename and size'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    
+    response = JsonResponse(dict(
+        _upload_status(upload),
+        chunk_size=MAX_CHUNK_SIZE,
+        url=reverse('courses:upload', args=[upload.id])
+    ), status=201)
+    response['Upload-Offset'] = '0'
+    return response
+
+
+@login_required
+@require_http_methods(["GET", "HEAD", "PUT", "DELETE"])
+def upload_view(request, upload_id):
+    """
+    Chunked upload session
+    GET/HEAD report the resume offset, PUT appends a chunk at the
+    Upload-Offset header, DELETE aborts the upload
+    """
+    upload = get_object_or_404(LessonUpload, id=upload_id, uploaded_by=request.user)
+    
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        return JsonResponse({'success': True})
+    
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            write_chunk(
+                upload, 
+                offset, 
+                request, 
+                length, 
+                checksum=request.headers.get('X-Chunk-Checksum')
+            )
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset header is required'}, status=400)
+        except UploadError as e:
+            response = JsonResponse(dict(_upload_status(upload), error=str(e)), status=e.status)
+            response['Upload-Offset'] = str(upload.received_bytes)
+            return response
+    
+    response = JsonResponse(_upload_status(upload))
+    response['Upload-Offset'] = str(upload.received_bytes)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+@require_http_methods(["POST"])
+def upload_finalize_view(request, upload_id):
+    """
+    Verify a fully received upload and attach it to the lesson
+    """
+    upload = get_object_or_404(LessonUpload, id=upload_id, uploaded_by=request.user)
+    
+    try:
+        lesson = finalize_upload(upload)
+    except UploadError as e:
+        return JsonResponse(dict(_upload_status(upload), error=str(e)), status=e.status)
+    
+    return JsonResponse(dict(
+        _upload_status(upload),
+        sha256=upload.sha256,
+        redirect_url=reverse('courses:detail', args=[lesson.course_id])
+    ))
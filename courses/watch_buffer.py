@@ -0,0 +1,202 @@
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import LessonProgress
+
+
+logger = logging.getLogger(__name__)
+
+
+class WatchBuffer:
+    """
+    Write-behind buffer for playback heartbeats
+
+    Heartbeats for the same (student, lesson) are coalesced in memory:
+    the latest position wins and watched seconds add up. The buffer is
+    written to LessonProgress every `interval` seconds by a background
+    thread, as soon as it holds `max_entries` pairs, and at interpreter
+    exit. A flush costs one SELECT and one bulk_update, however many
+    heartbeats arrived; pairs without a row first cost one bulk_create of
+    empty rows and one more SELECT.
+    """
+
+    def __init__(self, interval=5.0, max_entries=500):
+        self.interval = interval
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (student_id, lesson_id) -> [position, watched delta, last heartbeat]
+        self._pending = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def record(self, student_id, lesson_id, position, watched):
+        """
+        Buffer one heartbeat
+
+        Args:
+            student_id: ID of the watching student
+            lesson_id: ID of the lesson being watched
+            position: Current playback position in seconds
+            watched: Seconds played since the previous heartbeat
+        """
+        now = timezone.now()
+        with self._lock:
+            entry = self._pending.get((student_id, lesson_id))
+            if entry is None:
+                self._pending[(student_id, lesson_id)] = [position, watched, now]
+            else:
+                entry[0] = position
+                entry[1] += watched
+                entry[2] = now
+            full = len(self._pending) >= self.max_entries
+
+        if full and not self.interval:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+        self._ensure_thread()
+
+    def get_position(self, student_id, lesson_id):
+        """Return the buffered position for a pair, or None if nothing is pending"""
+        with self._lock:
+            entry = self._pending.get((student_id, lesson_id))
+            return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Write every buffered heartbeat to the database
+
+        Returns:
+            int: Number of (student, lesson) pairs written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                self._write(pending)
+            except Exception:
+                # Put the heartbeats back so the next flush retries them
+                with self._lock:
+                    for key, (position, watched, at) in pending.items():
+                        entry = self._pending.get(key)
+                        if entry is None:
+                            self._pending[key] = [position, watched, at]
+                        else:
+                            entry[1] += watched
+                raise
+            return len(pending)
+
+    def _write(self, pending):
+        with transaction.atomic():
+            existing = self._read_pks(pending)
+            missing = [key for key in pending if key not in existing]
+            if missing:
+                # Rows another worker process created since the read are
+                # skipped here and found by the re-read, so the heartbeats
+                # are added to them like to any existing row
+                LessonProgress.objects.bulk_create([
+                    LessonProgress(student_id=student_id, lesson_id=lesson_id)
+                    for student_id, lesson_id in missing
+                ], batch_size=500, ignore_conflicts=True)
+                existing.update(self._read_pks(missing))
+
+            # Watched time is added in SQL so flushes from other worker
+            # processes are not overwritten
+            LessonProgress.objects.bulk_update([
+                LessonProgress(
+                    pk=existing[key],
+                    position_seconds=position,
+                    watched_seconds=F('watched_seconds') + watched,
+                    last_watched_at=at
+                )
+                for key, (position, watched, at) in pending.items()
+            ], ['position_seconds', 'watched_seconds', 'last_watched_at'], batch_size=200)
+
+    def _read_pks(self, keys):
+        student_ids = {student_id for student_id, _ in keys}
+        lesson_ids = {lesson_id for _, lesson_id in keys}
+        keys = set(keys)
+        return {
+            (student_id, lesson_id): pk
+            for pk, student_id, lesson_id in LessonProgress.objects.filter(
+                student_id__in=student_ids,
+                lesson_id__in=lesson_ids
+            ).values_list('pk', 'student_id', 'lesson_id')
+            if (student_id, lesson_id) in keys
+        }
+
+    def close(self):
+        """Stop the background thread and write what is still buffered"""
+        self._closed = True
+        self._wakeup.set()
+        return self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is not None or self._closed or not self.interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='watch-buffer-flush', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not flush buffered watch heartbeats')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_watch_buffer():
+    """Return the process-wide heartbeat buffer, creating it on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WatchBuffer(
+                    interval=getattr(settings, 'WATCH_FLUSH_INTERVAL', 5),
+                    max_entries=getattr(settings, 'WATCH_FLUSH_MAX_ENTRIES', 500)
+                )
+                atexit.register(_flush_at_exit, _buffer)
+    return _buffer
+
+
+def reset_watch_buffer():
+    """Flush and discard the process-wide buffer so the next use recreates it"""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        atexit.unregister(_flush_at_exit)
+        buffer.close()
+
+
+def _flush_at_exit(buffer):
+    try:
+        buffer.close()
+    except Exception:
+        logger.exception('Could not flush buffered watch heartbeats at exit')
+    finally:
+        connection.close()
@@ -1,6 +1,9 @@
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from courses.models import Course, Lesson, Enrollment, LessonProgress
 
 
 class DashboardViewTests(TestCase):
@@ -50,3 +53,36 @@ class DashboardViewTests(TestCase):
         self.client.login(username='instructor', password='test123')
         response = self.client.get(reverse('dashboards:redirect'))
         self.assertRedirects(response, reverse('dashboards:instructor'))
+
+    
+    def test_student_dashboard_query_count(self):
+        """Test student dashboard queries do not grow with enrollments"""
+        self.client.login(username='student', password='test123')
+        
+        def enroll_in_new_course(index):
+            course = Course.objects.create(
+                instructor=self.instructor,
+                title=f'Course {index}',
+                description='Test Description'
+            )
+            lesson = Lesson.objects.create(course=course, title='Lesson')
+            Enrollment.objects.create(student=self.student, course=course)
+            LessonProgress.objects.create(
+                student=self.student, 
+                lesson=lesson, 
+                completed=True
+            )
+            Enrollment.record_lesson_completion(self.student.id, lesson)
+        
+        enroll_in_new_course(0)
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(reverse('dashboards:student'))
+        
+        for index in range(1, 6):
+            enroll_in_new_course(index)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboards:student'))
+        
+        self.assertEqual(len(queries), len(baseline))
+        self.assertEqual(response.context['completed_lessons'], 6)
+        self.assertEqual(response.context['overall_progress'], 100)
@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from courses.models import Course, Enrollment, LessonProgress
+from courses.models import Course, Enrollment
+from courses.services import attach_progress, get_recommended_courses
 from session_logs.services import get_student_session_logs, get_instructor_session_logs
 from .models import (
     TechBlog, CoreSubject, TrendingSkill, LearningPath,
@@ -32,34 +33,16 @@ def student_dashboard(request):
     if request.user.profile.role != 'student':
         return redirect('dashboards:instructor')
     
-    # Get enrolled courses
-    enrollments = Enrollment.objects.filter(
-        student=request.user
-    ).select_related('course').order_by('-enrolled_at')
-    
-    # Calculate progress for each enrollment
-    for enrollment in enrollments:
-        total_lessons = enrollment.course.lessons.count()
-        completed = LessonProgress.objects.filter(
-            student=request.user,
-            lesson__course=enrollment.course,
-            completed=True
-        ).count()
-        
-        if total_lessons > 0:
-            enrollment.progress_percentage = int((completed / total_lessons) * 100)
-        else:
-            enrollment.progress_percentage = 0
+    # Get enrolled courses with progress computed in bulk
+    enrollments = attach_progress(
+        Enrollment.objects.filter(
+            student=request.user
+        ).select_related('course__instructor').order_by('-enrolled_at')
+    )
     
     # Get lesson progress statistics
-    completed_lessons = LessonProgress.objects.filter(
-        student=request.user,
-        completed=True
-    ).count()
-    
-    total_lessons_enrolled = 0
-    for enrollment in enrollments:
-        total_lessons_enrolled += enrollment.course.lessons.count()
+    completed_lessons = sum(e.completed_lessons for e in enrollments)
+    total_lessons_enrolled = sum(e.total_lessons for e in enrollments)
     
     # Get session logs (last 5)
     try:
@@ -79,7 +62,8 @@ def student_dashboard(request):
         'total_lessons': total_lessons_enrolled,
         'overall_progress': overall_progress,
         'session_logs': session_logs,
-        'total_enrollments': enrollments.count(),
+        'total_enrollments': len(enrollments),
+        'recommended_courses': get_recommended_courses(request.user.id),
         # Home page sections
         'blogs': TechBlog.objects.all()[:6],
         'core_subjects': CoreSubject.objects.all()[:6],
@@ -106,19 +90,13 @@ def instructor_dashboard(request):
         return redirect('dashboards:student')
     
     # Get instructor's courses
-    courses = Course.objects.filter(
+    courses = list(Course.objects.filter(
         instructor=request.user
-    ).order_by('-created_at')
-    
-    # Get total students across all courses
-    total_students = Enrollment.objects.filter(
-        course__instructor=request.user
-    ).count()
+    ).order_by('-created_at'))
     
-    # Get total lessons created
-    total_lessons = 0
-    for course in courses:
-        total_lessons += course.lessons.count()
+    # Totals come from the denormalized per-course counters
+    total_students = sum(course.student_count for course in courses)
+    total_lessons = sum(course.lesson_count for course in courses)
     
     # Get session logs (last 5)
     try:
@@ -133,7 +111,7 @@ def instructor_dashboard(request):
     
     context = {
         'courses': courses,
-        'total_courses': courses.count(),
+        'total_courses': len(courses),
         'total_students': total_students,
         'total_lessons': total_lessons,
         'session_logs': session_logs,
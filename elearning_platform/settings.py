@@ -36,11 +36,14 @@ INSTALLED_APPS = [
     'live_sessions',
     'session_logs',
     'dashboards',
+    'search',
+    'thumbnails',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.middleware.ProfileBackendMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -79,11 +82,38 @@ DATABASES = {
 }
 
 # Channels Layer Configuration (In-Memory - No Redis Required)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Rooms and notification groups are shared by every worker process on the
+# host through a broker started on first use (live_sessions/channel_broker.py).
+# Set CHANNEL_LAYER=memory to keep them inside a single process.
+# The broker socket must be in a directory only this user can access; set
+# CHANNEL_SOCKET_PATH (env CHANNEL_BROKER_SOCKET) when the checkout path is
+# too long for a Unix socket
+CHANNEL_SOCKET_PATH = os.getenv('CHANNEL_BROKER_SOCKET', str(BASE_DIR / 'run' / 'channels.sock'))
+if os.getenv('CHANNEL_LAYER') == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'live_sessions.channel_layer.UnixSocketChannelLayer',
+            'CONFIG': {
+                'path': CHANNEL_SOCKET_PATH,
+                'capacity': 100,
+                'expiry': 60,
+            },
+        },
+    }
+
+# ProfileBackend loads the user and their profile in one query.
+# ModelBackend stays listed so older sessions still resolve until
+# ProfileBackendMiddleware moves them over
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,6 +146,75 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Protected lesson media: set to 'x-accel' (nginx) or 'x-sendfile'
+# (Apache/lighttpd) to let the front proxy transfer the bytes
+LESSON_MEDIA_OFFLOAD = os.getenv('LESSON_MEDIA_OFFLOAD') or None
+LESSON_MEDIA_ACCEL_PREFIX = os.getenv('LESSON_MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Store course and lesson files once per distinct content, named by
+# SHA-256 (see courses/storage.py and the gc_media_blobs command)
+MEDIA_DEDUPLICATE = os.getenv('MEDIA_DEDUPLICATE', 'True') == 'True'
+
+# Playback heartbeats are buffered per process and written in batches
+# every WATCH_FLUSH_INTERVAL seconds or once this many pairs are pending
+WATCH_FLUSH_INTERVAL = 5
+WATCH_FLUSH_MAX_ENTRIES = 500
+
+# Per-student enrolled-course sets and sessions are cached. The default
+# local-memory cache is per process; set CACHE_BACKEND/CACHE_LOCATION to a
+# shared backend (e.g. memcached) when running several workers
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Separate so other cache entries never evict sessions
+    'sessions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'sessions'),
+        'KEY_PREFIX': 'sessions',
+    },
+}
+# Whether every worker process sees the same cache entries
+SHARED_CACHE = not CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache'))
+if not SHARED_CACHE:
+    CACHES['sessions']['OPTIONS'] = {'MAX_ENTRIES': 20000}
+# Seconds a student's enrolled-course set is cached; 0 disables it. An
+# unenrollment clears only the cache of the worker that handled it, so
+# the set is cached only when all workers share the cache
+ENROLLMENT_CACHE_TIMEOUT = 300 if SHARED_CACHE else 0
+
+# With a shared cache, sessions are read from it and written through to
+# django_session, so a request only queries the table on a cache miss. A
+# per-process cache would keep a session another worker logged out valid,
+# so without one sessions stay in the database. Expired rows are removed
+# by `manage.py cleanup_sessions`
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db'
+)
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Resized/WebP variants of thumbnails and profile pictures are generated
+# in a process pool; set IMAGE_VARIANTS_ASYNC=False to render inline
+IMAGE_VARIANTS_ASYNC = os.getenv('IMAGE_VARIANTS_ASYNC', 'True') == 'True'
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+
+# Whiteboard draw segments are sent to a room as one whiteboard_frame every
+# WHITEBOARD_FRAME_INTERVAL seconds, or once this many segments are pending
+WHITEBOARD_FRAME_INTERVAL = 0.033
+WHITEBOARD_FRAME_MAX_SEGMENTS = 200
+
+# Each room keeps its whiteboard for late joiners: pending strokes are
+# simplified once WHITEBOARD_LOG_COMPACT_POINTS accumulate, and beyond
+# WHITEBOARD_LOG_MAX_POINTS they are rendered into a PNG
+WHITEBOARD_LOG_COMPACT_POINTS = 2000
+WHITEBOARD_LOG_MAX_POINTS = 10000
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Login/Logout URLs
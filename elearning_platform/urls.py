@@ -9,6 +9,7 @@ urlpatterns = [
     path('courses/', include('courses.urls')),
     path('live-sessions/', include('live_sessions.urls')),
     path('logs/', include('session_logs.urls')),
+    path('search/', include('search.urls')),
     path('', include('dashboards.urls')),
 ]
 
@@ -0,0 +1,326 @@
+"""
+Channel broker shared by every worker process on the host
+
+The broker owns the channel queues and group memberships that
+UnixSocketChannelLayer exposes to the consumers, so a group_send in one
+daphne/uvicorn process reaches sockets held by any other. Workers talk
+to it over a Unix-domain socket with length-prefixed msgpack frames.
+
+This module deliberately does not import Django: it runs as its own
+small process, `python -m live_sessions.channel_broker <socket path>`,
+started by the first worker that finds no broker listening (or by
+`manage.py run_channel_broker`).
+
+Messages are kept encoded. The broker never decodes a message body, so a
+group_send is packed once by the sender and the same bytes are written
+to every member's connection.
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import stat
+import struct
+import time
+from collections import deque
+import msgpack
+
+
+# Frame opcodes, client to broker
+HELLO = 0
+SEND = 1
+GROUP_ADD = 2
+GROUP_DISCARD = 3
+GROUP_SEND = 4
+RECEIVE = 5
+CANCEL = 6
+FLUSH = 7
+# Frame opcodes, broker to client
+REPLY = 10
+DELIVER = 11
+
+# Errors carried by REPLY frames
+CHANNEL_FULL = 'full'
+
+HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Seconds between sweeps of expired messages and group memberships
+SWEEP_INTERVAL = 1.0
+
+
+def pack_frame(frame):
+    """Encode a frame as a length prefix followed by its msgpack body"""
+    body = msgpack.packb(frame, use_bin_type=True)
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader):
+    """Read one frame, or return None when the peer has closed"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (size,) = HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ValueError(f'Frame of {size} bytes exceeds the limit')
+        body = await reader.readexactly(size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return msgpack.unpackb(body, raw=False)
+
+
+class Client:
+    """One worker connection and the capacity rules it announced"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.capacity = 100
+        self.channel_capacity = []
+        self.closed = False
+
+    def configure(self, capacity, channel_capacity):
+        self.capacity = capacity
+        self.channel_capacity = [
+            (re.compile(pattern), value) for pattern, value in channel_capacity
+        ]
+
+    def get_capacity(self, channel):
+        for pattern, capacity in self.channel_capacity:
+            if pattern.match(channel):
+                return capacity
+        return self.capacity
+
+    def write(self, frame):
+        if not self.closed:
+            self.writer.write(pack_frame(frame))
+
+
+class Broker:
+    """
+    Channel queues, receive waiters and groups, served over a Unix socket
+
+    Each channel holds at most its capacity of undelivered messages; a
+    send beyond that is refused with CHANNEL_FULL, and group sends skip
+    the full member. Messages expire after the sender's expiry, and a
+    channel whose message expired undelivered is dropped from its groups,
+    as with the in-memory layer. Group memberships expire after the
+    group_expiry given when the channel joined.
+    """
+
+    def __init__(self, path, idle_timeout=None):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        # channel -> deque of (expires_at, packed message)
+        self.channels = {}
+        # channel -> deque of (client, request id) waiting in receive()
+        self.waiters = {}
+        # group -> {channel: membership expires_at}
+        self.groups = {}
+        self.clients = set()
+        self.server = None
+        self.idle_since = time.monotonic()
+
+    async def serve(self):
+        """Listen on the socket until the broker is idle for idle_timeout"""
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        async with self.server:
+            while True:
+                await asyncio.sleep(SWEEP_INTERVAL)
+                self.sweep()
+                if self.clients:
+                    self.idle_since = time.monotonic()
+                elif self.idle_timeout and time.monotonic() - self.idle_since > self.idle_timeout:
+                    break
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer)
+        self.clients.add(client)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                self.dispatch(client, frame)
+                if writer.transport.get_write_buffer_size() > 1024 * 1024:
+                    await writer.drain()
+        finally:
+            client.closed = True
+            self.clients.discard(client)
+            for waiters in self.waiters.values():
+                for waiter in [waiter for waiter in waiters if waiter[0] is client]:
+                    waiters.remove(waiter)
+            writer.close()
+
+    def dispatch(self, client, frame):
+        opcode, request_id = frame[0], frame[1]
+        error = None
+
+        if opcode == SEND:
+            _, _, channel, packed, expiry = frame
+            if not self.deliver(client, channel, packed, expiry):
+                error = CHANNEL_FULL
+        elif opcode == GROUP_SEND:
+            _, _, group, packed, expiry = frame
+            self.group_send(client, group, packed, expiry)
+        elif opcode == RECEIVE:
+            self.receive(client, request_id, frame[2])
+            return
+        elif opcode == GROUP_ADD:
+            _, _, group, channel, group_expiry = frame
+            self.groups.setdefault(group, {})[channel] = time.time() + group_expiry
+        elif opcode == GROUP_DISCARD:
+            _, _, group, channel = frame
+            members = self.groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self.groups[group]
+        elif opcode == CANCEL:
+            self.cancel(client, frame[2], frame[3])
+        elif opcode == HELLO:
+            client.configure(frame[2], frame[3])
+        elif opcode == FLUSH:
+            self.channels.clear()
+            self.groups.clear()
+
+        client.write([REPLY, request_id, error])
+
+    def deliver(self, sender, channel, packed, expiry):
+        """Hand a message to a waiting receiver or queue it; False if full"""
+        waiters = self.waiters.get(channel)
+        while waiters:
+            receiver, request_id = waiters.popleft()
+            if not waiters:
+                del self.waiters[channel]
+            if not receiver.closed:
+                receiver.write([DELIVER, request_id, packed])
+                return True
+
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = deque()
+        elif len(queue) >= sender.get_capacity(channel):
+            self.expire(channel, queue, time.time())
+            if len(queue) >= sender.get_capacity(channel):
+                return False
+        queue.append((time.time() + expiry, packed))
+        return True
+
+    def group_send(self, sender, group, packed, expiry):
+        """Deliver to every live member, dropping expired channels first"""
+        now = time.time()
+        members = self.groups.get(group, {})
+        for channel, expires_at in list(members.items()):
+            queue = self.channels.get(channel)
+            if expires_at < now or (queue and self.expire(channel, queue, now)):
+                members.pop(channel, None)
+                continue
+            self.deliver(sender, channel, packed, expiry)
+        if not members:
+            self.groups.pop(group, None)
+
+    def receive(self, client, request_id, channel):
+        queue = self.channels.get(channel)
+        if queue:
+            self.expire(channel, queue, time.time())
+        if queue:
+            _, packed = queue.popleft()
+            if not queue:
+                del self.channels[channel]
+            client.write([DELIVER, request_id, packed])
+        else:
+            self.channels.pop(channel, None)
+            self.waiters.setdefault(channel, deque()).append((client, request_id))
+
+    def cancel(self, client, channel, request_id):
+        waiters = self.waiters.get(channel)
+        if waiters and (client, request_id) in waiters:
+            waiters.remove((client, request_id))
+            if not waiters:
+                del self.waiters[channel]
+
+    def expire(self, channel, queue, now):
+        expired = False
+        while queue and queue[0][0] < now:
+            queue.popleft()
+            expired = True
+        if expired:
+            # Nobody is receiving on this channel any more
+            for members in self.groups.values():
+                members.pop(channel, None)
+        return expired
+
+    def sweep(self):
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            self.expire(channel, queue, now)
+            if not queue:
+                del self.channels[channel]
+        for group, members in list(self.groups.items()):
+            for channel, expires_at in list(members.items()):
+                if expires_at < now:
+                    del members[channel]
+            if not members:
+                del self.groups[group]
+
+
+def ensure_private_dir(path):
+    """
+    Create the directory of a socket path, accessible only to this user
+
+    Any local user could bind a socket, or plant a symlink, in a shared
+    directory such as /tmp, so the socket and its lock file must live in
+    a directory nobody else can write to.
+
+    Raises:
+        PermissionError: If the directory belongs to another user or is
+                         open to other users
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f'{directory} is not a directory owned by this user')
+    if info.st_mode & 0o077:
+        raise PermissionError(f'{directory} must not be accessible to other users (chmod 700)')
+    return directory
+
+
+def is_listening(path):
+    """Return whether a broker accepts connections on the socket path"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def run(path, idle_timeout=None):
+    """Run a broker on the socket path, replacing a stale socket file"""
+    ensure_private_dir(path)
+    if is_listening(path):
+        raise RuntimeError(f'A channel broker is already listening on {path}')
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    asyncio.run(Broker(path, idle_timeout).serve())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the channel broker')
+    parser.add_argument('path', help='Unix socket path to listen on')
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        help='Exit after this many seconds without connected workers'
+    )
+    arguments = parser.parse_args()
+    run(arguments.path, arguments.idle_timeout)
@@ -0,0 +1,273 @@
+import asyncio
+import fcntl
+import os
+import subprocess
+import sys
+import time
+import uuid
+import weakref
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+import msgpack
+from .channel_broker import (
+    CANCEL, CHANNEL_FULL, DELIVER, FLUSH, GROUP_ADD, GROUP_DISCARD, GROUP_SEND,
+    HELLO, RECEIVE, SEND, ensure_private_dir, is_listening, pack_frame, read_frame
+)
+
+
+# Seconds to wait for an auto-started broker to accept connections
+BROKER_START_TIMEOUT = 10.0
+
+
+def default_socket_path():
+    """Return the socket path in the checkout's private run/ directory"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, 'run', 'channels.sock')
+
+
+class BrokerConnection:
+    """
+    One event loop's connection to the broker
+
+    Requests carry an ID; the reader task resolves the matching future
+    when the broker replies or delivers a message. A receive() that is
+    cancelled after the broker already delivered keeps the message in
+    a local buffer so the next receive() on that channel returns it.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.pending = {}
+        # Request IDs of cancelled receives -> channel, until the broker confirms
+        self.cancelled = {}
+        # channel -> packed messages delivered after their receive was cancelled
+        self.buffered = {}
+        self.task = asyncio.ensure_future(self.read_loop())
+
+    def request(self, *fields):
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(pack_frame([fields[0], request_id, *fields[1:]]))
+        return request_id, future
+
+    async def call(self, *fields):
+        _, future = self.request(*fields)
+        return await future
+
+    async def read_loop(self):
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+                opcode, request_id, payload = frame
+                future = self.pending.pop(request_id, None)
+                if future is not None:
+                    if not future.done():
+                        future.set_result(payload)
+                elif opcode == DELIVER and request_id in self.cancelled:
+                    channel = self.cancelled[request_id]
+                    self.buffered.setdefault(channel, []).append(payload)
+        finally:
+            error = ConnectionError('Lost the connection to the channel broker')
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            self.writer.close()
+
+    async def cancel_receive(self, channel, request_id):
+        self.pending.pop(request_id, None)
+        self.cancelled[request_id] = channel
+        try:
+            # Frames are ordered: a delivery racing the cancel arrives first
+            await self.call(CANCEL, channel, request_id)
+        finally:
+            self.cancelled.pop(request_id, None)
+
+    @property
+    def alive(self):
+        return not self.task.done()
+
+    def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+class UnixSocketChannelLayer(BaseChannelLayer):
+    """
+    Channel layer for several worker processes on one host, with no
+    external service
+
+    Channels and groups live in a broker process (live_sessions.channel_broker)
+    reached over a Unix-domain socket. The first worker to find no broker
+    listening starts one, serialized by a lock file; it exits after
+    idle_timeout seconds without workers. Capacity, channel_capacity,
+    expiry and group_expiry behave as in the other channels layers.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        path=None,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        autostart=True,
+        idle_timeout=300,
+        **kwargs
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = path or default_socket_path()
+        self.group_expiry = group_expiry
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.autostart = autostart
+        self.idle_timeout = idle_timeout
+        self.client_prefix = uuid.uuid4().hex[:12]
+        self._connections = weakref.WeakKeyDictionary()
+        self._locks = weakref.WeakKeyDictionary()
+
+    # Connection management
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is not None and connection.alive:
+            return connection
+
+        lock = self._locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            connection = self._connections.get(loop)
+            if connection is None or not connection.alive:
+                connection = await self._connect()
+                self._connections[loop] = connection
+        return connection
+
+    async def _connect(self):
+        ensure_private_dir(self.path)
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.autostart:
+                raise
+            await asyncio.get_running_loop().run_in_executor(None, self.start_broker)
+            reader, writer = await asyncio.open_unix_connection(self.path)
+
+        connection = BrokerConnection(reader, writer)
+        await connection.call(HELLO, self.capacity, [
+            (pattern.pattern, capacity) for pattern, capacity in self.channel_capacity
+        ])
+        return connection
+
+    def start_broker(self):
+        """Start a broker process unless one is listening, one worker at a time"""
+        ensure_private_dir(self.path)
+        descriptor = os.open(f'{self.path}.lock', os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        with open(descriptor, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if is_listening(self.path):
+                return
+
+            command = [sys.executable, '-m', 'live_sessions.channel_broker', self.path]
+            if self.idle_timeout:
+                command += ['--idle-timeout', str(self.idle_timeout)]
+            subprocess.Popen(
+                command,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                stdin=subprocess.DEVNULL,
+                start_new_session=True
+            )
+
+            deadline = time.monotonic() + BROKER_START_TIMEOUT
+            while not is_listening(self.path):
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f'Channel broker did not start on {self.path}')
+                time.sleep(0.02)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        """Send a message onto a (general or specific) channel"""
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        assert '__asgi_channel__' not in message
+
+        connection = await self._connection()
+        error = await connection.call(SEND, channel, self.serialize(message), self.expiry)
+        if error == CHANNEL_FULL:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        """Receive the first message that arrives on the channel"""
+        assert self.valid_channel_name(channel)
+
+        connection = await self._connection()
+        buffered = connection.buffered.get(channel)
+        if buffered:
+            packed = buffered.pop(0)
+            if not buffered:
+                del connection.buffered[channel]
+            return self.deserialize(packed)
+
+        request_id, future = connection.request(RECEIVE, channel)
+        try:
+            packed = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Delivered just before the cancel: keep it for the next receive
+                if future.exception() is None:
+                    connection.buffered.setdefault(channel, []).insert(0, future.result())
+            elif connection.alive:
+                await asyncio.shield(connection.cancel_receive(channel, request_id))
+            raise
+        return self.deserialize(packed)
+
+    async def new_channel(self, prefix='specific'):
+        """Return a new channel name that only this process receives on"""
+        return f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex}'
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        connection = await self._connection()
+        await connection.call(GROUP_ADD, group, channel, self.group_expiry)
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), 'Invalid channel name'
+        assert self.valid_group_name(group), 'Invalid group name'
+        connection = await self._connection()
+        await connection.call(GROUP_DISCARD, group, channel)
+
+    async def group_send(self, group, message):
+        """Send a message to every channel in a group, skipping full ones"""
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Invalid group name'
+        connection = await self._connection()
+        await connection.call(GROUP_SEND, group, self.serialize(message), self.expiry)
+
+    # Flush extension
+
+    async def flush(self):
+        connection = await self._connection()
+        await connection.call(FLUSH)
+
+    async def close(self):
+        for connection in list(self._connections.values()):
+            connection.close()
+        self._connections.clear()
+
+    # Serialization
+
+    def serialize(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def deserialize(self, packed):
+        return msgpack.unpackb(packed, raw=False)
@@ -1,11 +1,18 @@
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
 from .models import DoubtSession
+from .protocol import SUBPROTOCOL, decode_message, encode_event, encode_message
+from session_logs.services import save_whiteboard_snapshot
+from .whiteboard import acquire_frame_batcher, release_frame_batcher
 from django.utils import timezone
 
 
+logger = logging.getLogger(__name__)
+
+
 class SignalingConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for WebRTC signaling
@@ -22,29 +29,45 @@ class SignalingConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        self.whiteboard = acquire_frame_batcher(self.channel_layer, self.room_group_name)
         
-        await self.accept()
+        # Clients offering the binary subprotocol get it; others use JSON
+        self.binary = SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=SUBPROTOCOL if self.binary else None)
+        
+        # Show the board as it is now; a room new to this process asks
+        # the members connected to other processes for theirs
+        if not self.whiteboard.log.empty:
+            await self.send_whiteboard_snapshot(await self.whiteboard.log.snapshot_async())
+        elif self.whiteboard.users == 1:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'whiteboard_sync_request',
+                    'reply_to': self.channel_name
+                }
+            )
         
         # Notify others in room that user joined
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_joined',
-                'username': self.user.username,
-                'user_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'user_joined',
+            'username': self.user.username,
+            'user_id': self.user.id
+        })
     
     async def disconnect(self, close_code):
+        # Send strokes still waiting for the next frame, and keep the
+        # board of a room this process no longer serves
+        room = await release_frame_batcher(self.room_group_name)
+        if room is not None and not room.log.empty:
+            await self.save_whiteboard(room.log)
+
         # Notify others that user left
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'user_left',
-                'username': self.user.username,
-                'user_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'user_left',
+            'username': self.user.username,
+            'user_id': self.user.id
+        })
         
         # Leave room group
         await self.channel_layer.group_discard(
@@ -52,9 +75,13 @@ class SignalingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
-        """Receive message from WebSocket"""
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        """Receive message from WebSocket, JSON text or a binary frame"""
+        try:
+            data = decode_message(bytes_data) if bytes_data is not None else json.loads(text_data)
+        except ValueError:
+            logger.warning('Dropped a malformed message in room %s', self.room_name)
+            return
         message_type = data.get('type')
         
         # Route different message types
@@ -83,240 +110,169 @@ class SignalingConsumer(AsyncWebsocketConsumer):
     
     async def handle_offer(self, data):
         """Handle WebRTC offer"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'webrtc_offer',
-                'offer': data['offer'],
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'offer',
+            'offer': data['offer'],
+            'sender': self.user.username,
+            'sender_id': self.user.id
+        })
     
     async def handle_answer(self, data):
         """Handle WebRTC answer"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'webrtc_answer',
-                'answer': data['answer'],
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'answer',
+            'answer': data['answer'],
+            'sender': self.user.username,
+            'sender_id': self.user.id
+        })
     
     async def handle_ice_candidate(self, data):
         """Handle ICE candidate"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'webrtc_ice_candidate',
-                'candidate': data['candidate'],
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'ice_candidate',
+            'candidate': data['candidate'],
+            'sender': self.user.username,
+            'sender_id': self.user.id
+        })
     
     async def handle_chat_message(self, data):
         """Handle text chat message"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': data['message'],
-                'sender': self.user.username,
-                'sender_id': self.user.id,
-                'timestamp': data.get('timestamp')
-            }
-        )
+        await self.broadcast({
+            'type': 'chat_message',
+            'message': data['message'],
+            'sender': self.user.username,
+            'sender_id': self.user.id,
+            'timestamp': data.get('timestamp')
+        })
     
     async def handle_session_request(self, data):
         """Handle session request from student"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'session_request',
-                'student_name': self.user.username,
-                'student_id': self.user.id,
-                'course_id': data.get('course_id')
-            }
-        )
+        await self.broadcast({
+            'type': 'session_request',
+            'student_name': self.user.username,
+            'student_id': self.user.id,
+            'course_id': data.get('course_id')
+        })
     
     async def handle_session_accept(self, data):
         """Handle session acceptance from instructor"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'session_accept',
-                'instructor_name': self.user.username,
-                'instructor_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'session_accept',
+            'instructor_name': self.user.username,
+            'instructor_id': self.user.id
+        })
     
     async def handle_session_end(self, data):
         """Handle session end"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'session_end',
-                'ended_by': self.user.username,
-                'chat_log': data.get('chat_log', [])
-            }
-        )
+        await self.whiteboard.flush()
+        await self.save_whiteboard(self.whiteboard.log)
+        await self.broadcast({
+            'type': 'session_end',
+            'ended_by': self.user.username,
+            'chat_log': data.get('chat_log', [])
+        })
     
     async def handle_whiteboard_draw(self, data):
-        """Handle whiteboard drawing"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'whiteboard_draw',
-                'x': data.get('x'),
-                'y': data.get('y'),
-                'x0': data.get('x0'),
-                'y0': data.get('y0'),
-                'color': data.get('color', '#000000'),
-                'size': data.get('size', 2),
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        """Handle whiteboard drawing; segments reach the room in whiteboard_frame batches"""
+        await self.whiteboard.add(self.user, data)
     
     async def handle_whiteboard_clear(self, data):
         """Handle whiteboard clear"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'whiteboard_clear',
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        # Strokes drawn before the clear must not arrive after it
+        await self.whiteboard.clear(self.user)
     
     async def handle_screen_share_start(self, data):
         """Handle screen share start"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'screen_share_start',
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
+        await self.broadcast({
+            'type': 'screen_share_start',
+            'sender': self.user.username,
+            'sender_id': self.user.id
+        })
     
     async def handle_screen_share_stop(self, data):
         """Handle screen share stop"""
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'screen_share_stop',
-                'sender': self.user.username,
-                'sender_id': self.user.id
-            }
-        )
-    
-    # Event handlers (called by channel_layer.group_send)
-    async def user_joined(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_joined',
-            'username': event['username'],
-            'user_id': event['user_id']
-        }))
+        await self.broadcast({
+            'type': 'screen_share_stop',
+            'sender': self.user.username,
+            'sender_id': self.user.id
+        })
     
-    async def user_left(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_left',
-            'username': event['username'],
-            'user_id': event['user_id']
-        }))
+    async def broadcast(self, message):
+        """
+        Send a message to everyone in the room, this client included
+
+        The message is encoded here, once, and members forward the
+        encoded form (see encoded_message) instead of each rebuilding
+        and serializing it. Messages a member must inspect or filter use
+        their own event handler instead.
+        """
+        await self.channel_layer.group_send(self.room_group_name, encode_event(message))
     
-    async def webrtc_offer(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'offer',
-            'offer': event['offer'],
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    # Event handlers (called by channel_layer.group_send)
+    async def encoded_message(self, event):
+        """Forward a message the sender already encoded"""
+        if self.binary:
+            await self.send(bytes_data=event['bytes'])
+        else:
+            await self.send(text_data=event['text'])
     
-    async def webrtc_answer(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'answer',
-            'answer': event['answer'],
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    async def send_message(self, message):
+        """Send a message to this client in the encoding it negotiated"""
+        if self.binary:
+            await self.send(bytes_data=encode_message(message))
+        else:
+            await self.send(text_data=json.dumps(message))
     
-    async def webrtc_ice_candidate(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'ice_candidate',
-            'candidate': event['candidate'],
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    async def save_whiteboard(self, log):
+        """Store the board on the session's log; failures are logged, not raised"""
+        snapshot = await log.snapshot_async(encode_image=False)
+        await database_sync_to_async(self._save_whiteboard)(snapshot)
     
-    async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': event['message'],
-            'sender': event['sender'],
-            'sender_id': event['sender_id'],
-            'timestamp': event['timestamp']
-        }))
+    def _save_whiteboard(self, snapshot):
+        session_id = DoubtSession.objects.filter(
+            room_name=self.room_name
+        ).values_list('id', flat=True).first()
+        if session_id is None:
+            return
+        try:
+            save_whiteboard_snapshot(session_id, snapshot)
+        except Exception:
+            logger.exception('Could not save the whiteboard of session %s', session_id)
     
-    async def session_request(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'session_request',
-            'student_name': event['student_name'],
-            'student_id': event['student_id'],
-            'course_id': event.get('course_id')
-        }))
-    
-    async def session_accept(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'session_accept',
-            'instructor_name': event['instructor_name'],
-            'instructor_id': event['instructor_id']
-        }))
-    
-    async def session_end(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'session_end',
-            'ended_by': event['ended_by'],
-            'chat_log': event.get('chat_log', [])
-        }))
+    async def send_whiteboard_snapshot(self, snapshot):
+        await self.send_message({
+            'type': 'whiteboard_snapshot',
+            'image': snapshot['image'],
+            'strokes': snapshot['strokes']
+        })
     
-    async def whiteboard_draw(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'whiteboard_draw',
-            'x': event['x'],
-            'y': event['y'],
-            'x0': event['x0'],
-            'y0': event['y0'],
-            'color': event['color'],
-            'size': event['size'],
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    async def whiteboard_frame(self, event):
+        # Decoded once per process, by the first consumer to log the frame
+        log = self.whiteboard.log
+        due = log.accept(event['origin'], event['seq']) and log.append(json.loads(event['text'])['strokes'])
+        await self.encoded_message(event)
+        if due:
+            await log.compact_async(only_if_due=True)
     
     async def whiteboard_clear(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'whiteboard_clear',
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+        if self.whiteboard.log.accept(event['origin'], event['seq']):
+            self.whiteboard.log.clear()
+        await self.encoded_message(event)
     
-    async def screen_share_start(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'screen_share_start',
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    async def whiteboard_sync_request(self, event):
+        """Send this process's board to a member whose process had none"""
+        if event['reply_to'] == self.channel_name or self.whiteboard.log.empty:
+            return
+        if self.whiteboard.claim_sync(event['reply_to']):
+            await self.channel_layer.send(event['reply_to'], {
+                'type': 'whiteboard_snapshot',
+                'snapshot': await self.whiteboard.log.snapshot_async()
+            })
     
-    async def screen_share_stop(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'screen_share_stop',
-            'sender': event['sender'],
-            'sender_id': event['sender_id']
-        }))
+    async def whiteboard_snapshot(self, event):
+        if self.whiteboard.log.empty:
+            self.whiteboard.log.load(event['snapshot'])
+        await self.send_whiteboard_snapshot(event['snapshot'])
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
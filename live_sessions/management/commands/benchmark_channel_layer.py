@@ -0,0 +1,186 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from live_sessions.channel_broker import is_listening
+from live_sessions.channel_layer import UnixSocketChannelLayer
+
+
+# Seconds a worker waits for its next message before counting the rest as lost
+RECEIVE_TIMEOUT = 10.0
+
+
+def run_worker(path, mode, index, workers, messages, payload, ready, start, results):
+    """Entry point of one spawned worker process"""
+    asyncio.run(_worker(path, mode, index, workers, messages, payload, ready, start, results))
+
+
+async def _worker(path, mode, index, workers, messages, payload, ready, start, results):
+    layer = UnixSocketChannelLayer(path=path, capacity=messages + 1, autostart=False)
+    channel = f'bench.{index}'
+    # Joining also opens the connection before the clock starts
+    await layer.group_add('bench', channel)
+    ready.put(index)
+    await asyncio.get_running_loop().run_in_executor(None, start.wait)
+
+    async def send_ring():
+        # Each worker sends to the next one, so every worker sends and receives
+        peer = f'bench.{(index + 1) % workers}'
+        for _ in range(messages):
+            await layer.send(peer, {'type': 'bench', 'sent': time.monotonic(), 'payload': payload})
+
+    sender = asyncio.ensure_future(send_ring()) if mode == 'send' else None
+    latencies = []
+    finished = time.monotonic()
+    try:
+        for _ in range(messages):
+            message = await asyncio.wait_for(layer.receive(channel), RECEIVE_TIMEOUT)
+            finished = time.monotonic()
+            latencies.append(finished - message['sent'])
+    except asyncio.TimeoutError:
+        pass
+    if sender is not None:
+        await sender
+    await layer.close()
+    results.put((index, latencies, finished))
+
+
+class Command(BaseCommand):
+    help = 'Measure channel layer throughput and latency across 1, 4 and 16 worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            nargs='+',
+            type=int,
+            default=[1, 4, 16],
+            help='Numbers of worker processes to measure'
+        )
+        parser.add_argument(
+            '--mode',
+            nargs='+',
+            choices=['group', 'send'],
+            default=['group', 'send'],
+            help='group: one publisher group_sends to every worker; '
+                 'send: every worker sends to the next one'
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=2000,
+            help='Messages each worker receives per run'
+        )
+        parser.add_argument(
+            '--payload',
+            type=int,
+            default=256,
+            help='Payload size in bytes'
+        )
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or min(options['workers']) < 1:
+            raise CommandError('--messages and --workers must be positive')
+
+        path = os.path.join(tempfile.mkdtemp(prefix='channels-bench-'), 'broker.sock')
+        broker = subprocess.Popen([sys.executable, '-m', 'live_sessions.channel_broker', path])
+        try:
+            deadline = time.monotonic() + 10
+            while not is_listening(path):
+                if broker.poll() is not None or time.monotonic() > deadline:
+                    raise CommandError('The channel broker did not start')
+                time.sleep(0.02)
+
+            self.stdout.write(
+                f'{"mode":<6} {"workers":>7} {"msg/s":>9} {"p50 ms":>8} '
+                f'{"p99 ms":>8} {"lost":>6}'
+            )
+            for mode in options['mode']:
+                for workers in options['workers']:
+                    latencies, elapsed = self.measure(
+                        path, mode, workers, options['messages'], 'x' * options['payload']
+                    )
+                    self.report(mode, workers, latencies, elapsed, workers * options['messages'])
+        finally:
+            broker.terminate()
+            broker.wait()
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            os.rmdir(os.path.dirname(path))
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def measure(self, path, mode, workers, messages, payload):
+        """
+        Run one measurement with fresh worker processes
+
+        Returns:
+            tuple: (latencies in seconds of every delivered message,
+                    seconds from start until the last delivery)
+        """
+        # Forget the queues and groups of the previous run
+        asyncio.run(self.flush(path))
+
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        results = context.Queue()
+        start = context.Event()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(path, mode, index, workers, messages, payload, ready, start, results)
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for _ in processes:
+                ready.get(timeout=60)
+
+            started = time.monotonic()
+            start.set()
+            if mode == 'group':
+                asyncio.run(self.publish(path, messages, payload))
+
+            latencies = []
+            finished = started
+            for _ in processes:
+                _, worker_latencies, worker_finished = results.get(timeout=RECEIVE_TIMEOUT * 2 + 60)
+                latencies.extend(worker_latencies)
+                finished = max(finished, worker_finished)
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+        return latencies, finished - started
+
+    async def publish(self, path, messages, payload):
+        layer = UnixSocketChannelLayer(path=path, capacity=messages + 1, autostart=False)
+        for _ in range(messages):
+            await layer.group_send('bench', {'type': 'bench', 'sent': time.monotonic(), 'payload': payload})
+        await layer.close()
+
+    async def flush(self, path):
+        layer = UnixSocketChannelLayer(path=path, autostart=False)
+        await layer.flush()
+        await layer.close()
+
+    def report(self, mode, workers, latencies, elapsed, expected):
+        latencies.sort()
+
+        def percentile(fraction):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+        self.stdout.write(
+            f'{mode:<6} {workers:>7} {len(latencies) / max(elapsed, 1e-9):>9.0f} '
+            f'{percentile(0.5):>8.2f} {percentile(0.99):>8.2f} {expected - len(latencies):>6}'
+        )
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from live_sessions.consumers import SignalingConsumer
+from live_sessions.protocol import SUBPROTOCOL
+
+
+class Command(BaseCommand):
+    help = 'Measure CPU time per room broadcast as the number of participants grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--participants',
+            nargs='+',
+            type=int,
+            default=[2, 10, 50, 200],
+            help='Room sizes to measure'
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=200,
+            help='Broadcasts sent per room size'
+        )
+        parser.add_argument(
+            '--binary-share',
+            type=float,
+            default=0.0,
+            help='Fraction of participants that negotiate the binary subprotocol'
+        )
+
+    def handle(self, *args, **options):
+        if options['messages'] < 1 or min(options['participants']) < 1:
+            raise CommandError('--messages and --participants must be positive')
+
+        self.stdout.write(
+            f'{"participants":>12} {"CPU us/broadcast":>17} {"CPU us/delivery":>16} {"wall ms":>8}'
+        )
+        for participants in options['participants']:
+            cpu, wall = asyncio.run(self.measure(
+                participants, options['messages'], options['binary_share']
+            ))
+            per_broadcast = cpu / options['messages'] * 1e6
+            self.stdout.write(
+                f'{participants:>12} {per_broadcast:>17.1f} '
+                f'{per_broadcast / participants:>16.1f} {wall * 1000:>8.0f}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    async def measure(self, participants, messages, binary_share):
+        """
+        Connect a room of consumers and broadcast chat messages from one of them
+
+        Returns:
+            tuple: (process CPU seconds, wall-clock seconds) from the first
+                   send until every participant received every message
+        """
+        room = f'bench{participants}'
+        binary = int(participants * binary_share)
+        communicators = []
+        for index in range(participants):
+            communicator = WebsocketCommunicator(
+                SignalingConsumer.as_asgi(), f'/ws/session/{room}/',
+                subprotocols=[SUBPROTOCOL] if index < binary else None
+            )
+            communicator.scope['user'] = User(id=index + 1, username=f'participant{index}')
+            communicator.scope['url_route'] = {'kwargs': {'room_name': room}}
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError('A participant could not connect')
+            communicators.append(communicator)
+
+        # Let the join notifications settle before measuring
+        for communicator in communicators:
+            while not await communicator.receive_nothing(timeout=0.05):
+                await communicator.receive_output()
+
+        message = {
+            'type': 'chat_message',
+            'message': 'Could you go over the derivation on the whiteboard once more?',
+            'timestamp': '14:32:05',
+        }
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for _ in range(messages):
+            await communicators[0].send_json_to(message)
+        for communicator in communicators:
+            for _ in range(messages):
+                await communicator.receive_output(timeout=30)
+        cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return cpu, wall
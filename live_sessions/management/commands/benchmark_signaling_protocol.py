@@ -0,0 +1,80 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from live_sessions.protocol import decode_message, encode_message
+
+
+def sample_messages():
+    """Representative signaling messages, as the consumer sends or receives them"""
+    stroke = {
+        'sender': 'instructor', 'sender_id': 12, 'color': '#1a73e8', 'size': 3,
+        'points': [round(120.4 + step * 3.7, 1) for step in range(16)],
+    }
+    return {
+        'whiteboard_draw': {
+            'type': 'whiteboard_draw', 'x0': 412.83, 'y0': 187.25, 'x': 415.91, 'y': 189.66,
+            'color': '#1a73e8', 'size': 3,
+        },
+        'whiteboard_frame': {'type': 'whiteboard_frame', 'strokes': [stroke]},
+        'whiteboard_frame x4': {'type': 'whiteboard_frame', 'strokes': [stroke] * 4},
+        'ice_candidate': {
+            'type': 'ice_candidate',
+            'candidate': {
+                'candidate': 'candidate:842163049 1 udp 1677729535 203.0.113.7 54321 typ srflx '
+                             'raddr 192.168.1.20 rport 54321 generation 0 ufrag sK3d network-cost 999',
+                'sdpMid': '0',
+                'sdpMLineIndex': 0,
+            },
+            'sender': 'student', 'sender_id': 48,
+        },
+        'chat_message': {
+            'type': 'chat_message', 'message': 'Could you go over the last step again?',
+            'sender': 'student', 'sender_id': 48, 'timestamp': '14:32:05',
+        },
+        'user_joined': {'type': 'user_joined', 'username': 'student', 'user_id': 48},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare encode/decode cost and size of JSON and the binary signaling subprotocol'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50000,
+            help='Encodes and decodes timed per message and format'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('--iterations must be positive')
+
+        self.stdout.write(
+            f'{"message":<20} {"JSON B":>7} {"binary B":>8} {"JSON enc us":>11} {"bin enc us":>10} '
+            f'{"JSON dec us":>11} {"bin dec us":>10}'
+        )
+        for name, message in sample_messages().items():
+            text = json.dumps(message)
+            frame = encode_message(message)
+            self.stdout.write(
+                f'{name:<20} {len(text.encode()):>7} {len(frame):>8} '
+                f'{self.time(json.dumps, message, iterations):>11.2f} '
+                f'{self.time(encode_message, message, iterations):>10.2f} '
+                f'{self.time(json.loads, text, iterations):>11.2f} '
+                f'{self.time(decode_message, frame, iterations):>10.2f}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def time(self, function, argument, iterations):
+        """Return the mean microseconds per call, best of three runs"""
+        best = None
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                function(argument)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best / iterations * 1e6
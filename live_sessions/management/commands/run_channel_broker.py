@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from live_sessions import channel_broker
+from live_sessions.channel_layer import default_socket_path
+
+
+class Command(BaseCommand):
+    help = 'Run the channel broker that the worker processes share, in the foreground'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Unix socket to listen on (default: the CHANNEL_LAYERS socket)'
+        )
+        parser.add_argument(
+            '--idle-timeout',
+            type=float,
+            help='Exit after this many seconds without connected workers'
+        )
+
+    def handle(self, *args, **options):
+        config = settings.CHANNEL_LAYERS.get('default', {}).get('CONFIG', {})
+        path = options['path'] or config.get('path') or default_socket_path()
+
+        self.stdout.write(f'Channel broker listening on {path}')
+        try:
+            channel_broker.run(path, options['idle_timeout'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Channel broker stopped'))
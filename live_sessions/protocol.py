@@ -0,0 +1,170 @@
+"""
+Binary WebSocket subprotocol for the signaling consumer
+
+A client that offers SUBPROTOCOL when it opens the socket exchanges
+binary frames: one type byte followed by a MessagePack body. Frequent
+messages have a fixed layout, so their body is an array of values in
+the order of LAYOUTS rather than a map repeating every key, and their
+coordinates travel as integer tenths of a pixel. Any other message is
+sent with type byte 0 and a map body. Clients that do not offer the
+subprotocol keep exchanging JSON text frames.
+
+Room broadcasts are encoded once, by the sender, in both forms
+(encode_event); each member's consumer forwards the form its client
+negotiated without re-encoding it.
+
+static/js/signaling_protocol.js implements the same layouts.
+"""
+import json
+import msgpack
+
+
+SUBPROTOCOL = 'elearning.msgpack.v1'
+
+GENERIC = 0
+# message type -> (type byte, fields in body order)
+LAYOUTS = {
+    'whiteboard_draw': (1, ('x0', 'y0', 'x', 'y', 'color', 'size')),
+    'ice_candidate': (2, ('candidate', 'sender', 'sender_id')),
+    'offer': (3, ('offer', 'sender', 'sender_id')),
+    'answer': (4, ('answer', 'sender', 'sender_id')),
+    'chat_message': (5, ('message', 'sender', 'sender_id', 'timestamp')),
+    'whiteboard_clear': (6, ('sender', 'sender_id')),
+    'whiteboard_frame': (7, ('strokes',)),
+    'whiteboard_snapshot': (8, ('image', 'strokes')),
+}
+TYPES = {code: (message_type, fields) for message_type, (code, fields) in LAYOUTS.items()}
+STROKE_FIELDS = ('sender', 'sender_id', 'color', 'size', 'points')
+# Fields sent as integer tenths of a pixel
+COORDINATES = frozenset(('x0', 'y0', 'x', 'y'))
+
+
+def _pack_coordinate(value):
+    try:
+        packed = round(float(value) * 10)
+    except (TypeError, ValueError, OverflowError):
+        return value
+    # Out-of-range values keep their original form rather than overflow
+    return packed if -2 ** 31 <= packed < 2 ** 31 else value
+
+
+def _unpack_coordinate(value):
+    return value / 10 if isinstance(value, int) else value
+
+
+def _pack_points(points):
+    try:
+        packed = [round(point * 10) for point in points]
+        if not packed or -2 ** 31 <= min(packed) and max(packed) < 2 ** 31:
+            return packed
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return [_pack_coordinate(point) for point in points]
+
+
+def _unpack_points(points):
+    if all(type(point) is int for point in points):
+        return [point / 10 for point in points]
+    return [_unpack_coordinate(point) for point in points]
+
+
+def encode_message(message):
+    """
+    Encode a message dict as a binary frame
+
+    Args:
+        message: Message with a 'type' key, as it would be sent as JSON
+
+    Returns:
+        bytes: Type byte followed by the MessagePack body
+    """
+    layout = LAYOUTS.get(message.get('type'))
+    if layout is None:
+        return bytes((GENERIC,)) + msgpack.packb(message, use_bin_type=True)
+
+    code, fields = layout
+    body = []
+    for field in fields:
+        value = message.get(field)
+        if field in COORDINATES:
+            value = _pack_coordinate(value)
+        elif field == 'strokes':
+            value = [
+                [stroke.get(key) for key in STROKE_FIELDS[:-1]]
+                + [_pack_points(stroke['points'])]
+                for stroke in value or []
+            ]
+        body.append(value)
+    # Trailing fields the sender left out are not sent
+    while body and body[-1] is None:
+        body.pop()
+    return bytes((code,)) + msgpack.packb(body, use_bin_type=True)
+
+
+def encode_event(message, handler='encoded_message', **fields):
+    """
+    Build a channel layer event carrying a message already encoded
+
+    Args:
+        message: Message dict as the clients should receive it
+        handler: Consumer method that handles the event; the default
+                 forwards the message as is
+        **fields: Extra event fields for handlers that inspect the event
+
+    Returns:
+        dict: Event with the JSON text and the binary frame of the message
+    """
+    return dict(
+        fields,
+        type=handler,
+        text=json.dumps(message),
+        bytes=encode_message(message)
+    )
+
+
+def decode_message(data):
+    """
+    Decode a binary frame into a message dict
+
+    Args:
+        data: Frame received from the client
+
+    Returns:
+        dict: The message, as json.loads would have returned it
+
+    Raises:
+        ValueError: If the frame is empty, has an unknown type byte or a
+                    malformed body
+    """
+    if not data:
+        raise ValueError('Empty frame')
+    try:
+        body = msgpack.unpackb(data[1:], raw=False)
+    except Exception as e:
+        raise ValueError(f'Malformed frame body: {e}') from e
+
+    if data[0] == GENERIC:
+        if not isinstance(body, dict):
+            raise ValueError('Generic frame body is not a map')
+        return body
+    if data[0] not in TYPES or not isinstance(body, list):
+        raise ValueError(f'Unknown frame type {data[0]}')
+
+    message_type, fields = TYPES[data[0]]
+    message = {'type': message_type}
+    try:
+        for field, value in zip(fields, body):
+            if field in COORDINATES:
+                value = _unpack_coordinate(value)
+            elif field == 'strokes':
+                value = [
+                    dict(
+                        zip(STROKE_FIELDS[:-1], stroke[:-1]),
+                        points=_unpack_points(stroke[-1])
+                    )
+                    for stroke in value or []
+                ]
+            message[field] = value
+    except (IndexError, KeyError, TypeError) as e:
+        raise ValueError(f'Malformed {message_type} frame') from e
+    return message
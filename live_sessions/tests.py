@@ -1,7 +1,28 @@
-from django.test import TestCase, Client
+import asyncio
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from channels.testing import WebsocketCommunicator
+from PIL import Image
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from courses.models import Course
+from .channel_broker import is_listening
+from .channel_layer import UnixSocketChannelLayer
+from .consumers import SignalingConsumer
+from .protocol import SUBPROTOCOL, decode_message, encode_message
+from .whiteboard import (
+    FrameBatcher, WhiteboardLog, acquire_frame_batcher, release_frame_batcher, simplify_points
+)
 
 
 class LiveSessionViewTests(TestCase):
@@ -50,3 +71,469 @@ class LiveSessionViewTests(TestCase):
             reverse('live_sessions:room', args=['test_room_123'])
         )
         self.assertEqual(response.status_code, 200)
+
+
+class UnixSocketChannelLayerTests(SimpleTestCase):
+    """Test the channel layer shared across processes through the broker"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'broker.sock')
+        cls.broker = subprocess.Popen([sys.executable, '-m', 'live_sessions.channel_broker', cls.path])
+        deadline = time.monotonic() + 10
+        while not is_listening(cls.path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.broker.terminate()
+        cls.broker.wait()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def make_layer(self, **kwargs):
+        return UnixSocketChannelLayer(path=self.path, autostart=False, **kwargs)
+
+    async def asyncTearDown(self):
+        layer = self.make_layer()
+        await layer.flush()
+        await layer.close()
+
+    def tearDown(self):
+        asyncio.run(self.asyncTearDown())
+
+    async def test_send_reaches_another_layer_instance(self):
+        """Test a message sent by one worker's layer is received by another's"""
+        sender, receiver = self.make_layer(), self.make_layer()
+        channel = await receiver.new_channel()
+        self.assertTrue(channel.startswith('specific.') and '..' not in channel)
+
+        await sender.send(channel, {'type': 'chat.message', 'data': b'\x00\xff', 'count': 2})
+
+        self.assertEqual(
+            await receiver.receive(channel),
+            {'type': 'chat.message', 'data': b'\x00\xff', 'count': 2}
+        )
+        await sender.close()
+        await receiver.close()
+
+    async def test_socket_directory_must_be_private(self):
+        """Test the layer refuses a socket in a directory other users can access"""
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o777)
+            layer = UnixSocketChannelLayer(path=os.path.join(directory, 'broker.sock'))
+            with self.assertRaises(PermissionError):
+                await layer.send('specific.test', {'type': 'direct'})
+            self.assertEqual(os.listdir(directory), [])
+
+    async def test_group_send_fans_out_to_members(self):
+        """Test group_send reaches every member until it is discarded"""
+        layer = self.make_layer()
+        first, second = await layer.new_channel(), await layer.new_channel()
+        await layer.group_add('room_1', first)
+        await layer.group_add('room_1', second)
+
+        await layer.group_send('room_1', {'type': 'draw', 'n': 1})
+        self.assertEqual(await layer.receive(first), {'type': 'draw', 'n': 1})
+        self.assertEqual(await layer.receive(second), {'type': 'draw', 'n': 1})
+
+        await layer.group_discard('room_1', second)
+        await layer.group_send('room_1', {'type': 'draw', 'n': 2})
+        await layer.send(second, {'type': 'direct'})
+        self.assertEqual(await layer.receive(first), {'type': 'draw', 'n': 2})
+        self.assertEqual(await layer.receive(second), {'type': 'direct'})
+        await layer.close()
+
+    async def test_send_beyond_capacity_raises_channel_full(self):
+        """Test capacity and channel_capacity bound undelivered messages"""
+        layer = self.make_layer(capacity=2, channel_capacity={'small.*': 1})
+        channel = await layer.new_channel()
+        await layer.send(channel, {'n': 1})
+        await layer.send(channel, {'n': 2})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {'n': 3})
+
+        await layer.send('small.queue', {'n': 1})
+        with self.assertRaises(ChannelFull):
+            await layer.send('small.queue', {'n': 2})
+
+        # A full member is skipped by group sends instead of failing them
+        await layer.group_add('room_2', channel)
+        await layer.group_send('room_2', {'n': 4})
+        self.assertEqual(await layer.receive(channel), {'n': 1})
+        self.assertEqual(await layer.receive(channel), {'n': 2})
+        await layer.close()
+
+    async def test_expired_messages_are_dropped_with_membership(self):
+        """Test an expired message is not delivered and its channel leaves its groups"""
+        layer = self.make_layer(expiry=0)
+        channel = await layer.new_channel()
+        await layer.group_add('room_3', channel)
+        await layer.send(channel, {'n': 1})
+        await asyncio.sleep(0.01)
+
+        layer.expiry = 60
+        await layer.group_send('room_3', {'n': 2})
+        await layer.send(channel, {'n': 3})
+        self.assertEqual(await layer.receive(channel), {'n': 3})
+        await layer.close()
+
+    async def test_cancelled_receive_does_not_lose_messages(self):
+        """Test a message racing a cancelled receive is returned by the next one"""
+        layer = self.make_layer()
+        channel = await layer.new_channel()
+        receive = asyncio.ensure_future(layer.receive(channel))
+        await asyncio.sleep(0.05)
+        receive.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await receive
+
+        await layer.send(channel, {'n': 1})
+        self.assertEqual(await layer.receive(channel), {'n': 1})
+        await layer.close()
+
+    async def test_receive_cancelled_after_delivery_keeps_message(self):
+        """Test a message delivered in the same loop pass as the cancel is not dropped"""
+        layer = self.make_layer()
+        channel = await layer.new_channel()
+        receive = asyncio.ensure_future(layer.receive(channel))
+        await asyncio.sleep(0.05)
+        connection = await layer._connection()
+        (future,) = connection.pending.values()
+        future.set_result(layer.serialize({'n': 1}))
+        receive.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await receive
+
+        self.assertEqual(await layer.receive(channel), {'n': 1})
+        await layer.close()
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    WHITEBOARD_FRAME_INTERVAL=0.02
+)
+class WhiteboardFrameTests(SimpleTestCase):
+    """Test whiteboard draw segments are coalesced into frames"""
+
+    # The last member leaving looks up the session to save the board
+    databases = {'default'}
+
+    async def connect(self, user_id, username, subprotocols=None):
+        communicator = WebsocketCommunicator(
+            SignalingConsumer.as_asgi(), '/ws/session/board/', subprotocols=subprotocols
+        )
+        communicator.scope['user'] = User(id=user_id, username=username)
+        communicator.scope['url_route'] = {'kwargs': {'room_name': 'board'}}
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, SUBPROTOCOL if subprotocols else None)
+        return communicator
+
+    async def receive_type(self, communicator, message_type):
+        while True:
+            message = await communicator.receive_json_from(timeout=1)
+            if message['type'] == message_type:
+                return message
+
+    async def test_draw_segments_arrive_as_one_frame(self):
+        """Test a stroke of many segments reaches the room as one polyline"""
+        drawer = await self.connect(1, 'instructor')
+        viewer = await self.connect(2, 'student')
+
+        for step in range(50):
+            await drawer.send_json_to({
+                'type': 'whiteboard_draw',
+                'x0': step, 'y0': step, 'x': step + 1, 'y': step + 1,
+                'color': '#ff0000', 'size': 3
+            })
+
+        frame = await self.receive_type(viewer, 'whiteboard_frame')
+        self.assertEqual(len(frame['strokes']), 1)
+        stroke = frame['strokes'][0]
+        self.assertEqual(stroke['sender_id'], 1)
+        self.assertEqual(stroke['color'], '#ff0000')
+        self.assertEqual(stroke['points'], [float(v) for step in range(51) for v in (step, step)])
+        self.assertTrue(await viewer.receive_nothing(timeout=0.1))
+
+        await drawer.disconnect()
+        await viewer.disconnect()
+
+    async def test_clear_follows_pending_strokes(self):
+        """Test strokes drawn before a clear are delivered before it"""
+        drawer = await self.connect(1, 'instructor')
+        viewer = await self.connect(2, 'student')
+        await self.receive_type(viewer, 'user_joined')
+
+        await drawer.send_json_to({'type': 'whiteboard_draw', 'x0': 0, 'y0': 0, 'x': 5, 'y': 5})
+        await drawer.send_json_to({'type': 'whiteboard_clear'})
+
+        self.assertEqual((await viewer.receive_json_from(timeout=1))['type'], 'whiteboard_frame')
+        self.assertEqual((await viewer.receive_json_from(timeout=1))['type'], 'whiteboard_clear')
+
+        await drawer.disconnect()
+        await viewer.disconnect()
+
+    async def test_late_joiner_receives_snapshot(self):
+        """Test a member joining mid-session is sent the board drawn since the last clear"""
+        drawer = await self.connect(1, 'instructor')
+        await drawer.send_json_to({'type': 'whiteboard_draw', 'x0': 0, 'y0': 0, 'x': 5, 'y': 5})
+        await drawer.send_json_to({'type': 'whiteboard_clear'})
+        for step in range(10):
+            await drawer.send_json_to({
+                'type': 'whiteboard_draw', 'x0': step, 'y0': 0, 'x': step + 1, 'y': 0
+            })
+        await self.receive_type(drawer, 'whiteboard_clear')
+        await self.receive_type(drawer, 'whiteboard_frame')
+
+        viewer = await self.connect(2, 'student')
+        snapshot = await viewer.receive_json_from(timeout=1)
+        self.assertEqual(snapshot['type'], 'whiteboard_snapshot')
+        self.assertIsNone(snapshot['image'])
+        # The straight stroke is simplified to its endpoints; the cleared one is gone
+        self.assertEqual([stroke['points'] for stroke in snapshot['strokes']], [[0.0, 0.0, 10.0, 0.0]])
+
+        await drawer.disconnect()
+        await viewer.disconnect()
+
+    async def test_binary_subprotocol_negotiated_per_client(self):
+        """Test a client offering the subprotocol exchanges binary frames, others JSON"""
+        drawer = await self.connect(1, 'instructor', subprotocols=[SUBPROTOCOL])
+        viewer = await self.connect(2, 'student')
+        await self.receive_type(viewer, 'user_joined')
+
+        await drawer.send_to(bytes_data=encode_message({
+            'type': 'whiteboard_draw', 'x0': 1.25, 'y0': 2, 'x': 3, 'y': 4, 'color': '#00ff00'
+        }))
+
+        frame = await self.receive_type(viewer, 'whiteboard_frame')
+        self.assertEqual(frame['strokes'][0]['points'], [1.2, 2.0, 3.0, 4.0])
+        while True:
+            message = decode_message(await drawer.receive_from(timeout=1))
+            if message['type'] == 'whiteboard_frame':
+                break
+        self.assertEqual(message['strokes'], frame['strokes'])
+
+        # Malformed frames are dropped without closing the socket
+        with self.assertLogs('live_sessions.consumers', 'WARNING'):
+            await drawer.send_to(bytes_data=b'\x63junk')
+            await drawer.send_to(bytes_data=encode_message({'type': 'chat_message', 'message': 'hi'}))
+            message = await self.receive_type(viewer, 'chat_message')
+        self.assertEqual((message['message'], message['sender_id']), ('hi', 1))
+
+        await drawer.disconnect()
+        await viewer.disconnect()
+
+    async def test_broadcast_is_encoded_once_for_the_room(self):
+        """Test members forward the sender's encoding in the form their client negotiated"""
+        sender = await self.connect(1, 'instructor', subprotocols=[SUBPROTOCOL])
+        viewer = await self.connect(2, 'student')
+        await self.receive_type(viewer, 'user_joined')
+
+        with patch.object(SignalingConsumer, 'send_message') as send_message:
+            await sender.send_json_to({'type': 'chat_message', 'message': 'hi'})
+            message = await self.receive_type(viewer, 'chat_message')
+            while True:
+                echoed = decode_message(await sender.receive_from(timeout=1))
+                if echoed['type'] == 'chat_message':
+                    break
+        send_message.assert_not_called()
+        self.assertEqual((message['message'], message['sender_id']), ('hi', 1))
+        self.assertEqual((echoed['message'], echoed['sender_id']), ('hi', 1))
+
+        await sender.disconnect()
+        await viewer.disconnect()
+
+    async def test_frame_sent_when_size_threshold_reached(self):
+        """Test a frame is sent without waiting for the tick once it is full"""
+        layer = InMemoryChannelLayer()
+        channel = await layer.new_channel()
+        await layer.group_add('board', channel)
+        batcher = FrameBatcher(layer, 'board', interval=60, max_segments=3)
+        user = User(id=1, username='instructor')
+
+        # Separate strokes: a colour change and a jump start new ones
+        await batcher.add(user, {'x0': 0, 'y0': 0, 'x': 1, 'y': 1})
+        await batcher.add(user, {'x0': 1, 'y0': 1, 'x': 2, 'y': 2, 'color': '#00ff00'})
+        self.assertFalse(await batcher.add(user, {'x0': 'a', 'y0': 0, 'x': 1, 'y': 1}))
+        await batcher.add(user, {'x0': 9, 'y0': 9, 'x': 10, 'y': 10, 'color': '#00ff00'})
+
+        event = await layer.receive(channel)
+        self.assertEqual(event['type'], 'whiteboard_frame')
+        frame = json.loads(event['text'])
+        self.assertEqual(decode_message(event['bytes']), frame)
+        self.assertEqual([stroke['points'] for stroke in frame['strokes']], [
+            [0.0, 0.0, 1.0, 1.0], [1.0, 1.0, 2.0, 2.0], [9.0, 9.0, 10.0, 10.0]
+        ])
+        self.assertEqual(await batcher.flush(), 0)
+
+    async def test_failed_timed_flush_is_logged(self):
+        """Test an error sending a frame on the timer is logged and awaited on release"""
+        layer = InMemoryChannelLayer()
+        batcher = acquire_frame_batcher(layer, 'failing')
+        batcher.interval = 0.01
+        user = User(id=1, username='instructor')
+
+        sending = asyncio.Event()
+
+        async def group_send(group, message):
+            await sending.wait()
+            raise ConnectionError('gone')
+
+        with patch.object(layer, 'group_send', side_effect=group_send):
+            with self.assertLogs('live_sessions.whiteboard', 'ERROR') as logs:
+                await batcher.add(user, {'x0': 0, 'y0': 0, 'x': 1, 'y': 1})
+                await asyncio.sleep(0.02)
+                self.assertIsNotNone(batcher._tick_task)
+                asyncio.get_running_loop().call_later(0.01, sending.set)
+                self.assertIs(await release_frame_batcher('failing'), batcher)
+        self.assertIn('ConnectionError: gone', logs.output[0])
+        self.assertIsNone(batcher._tick_task)
+
+    async def test_segments_are_validated(self):
+        """Test non-finite coordinates are dropped and pen, colour and position bounded"""
+        layer = InMemoryChannelLayer()
+        channel = await layer.new_channel()
+        await layer.group_add('board', channel)
+        batcher = FrameBatcher(layer, 'board', interval=60, max_segments=2)
+        user = User(id=1, username='instructor')
+
+        for bad in ('nan', 'inf', float('-inf')):
+            self.assertFalse(await batcher.add(user, {'x0': bad, 'y0': 0, 'x': 1, 'y': 1}))
+        await batcher.add(user, {'x0': -5, 'y0': 0, 'x': 1e9, 'y': 1, 'color': 'x' * 10000, 'size': 1e300})
+        await batcher.add(user, {'x0': 0, 'y0': 0, 'x': 1, 'y': 1, 'color': '#00FF00', 'size': 'nan'})
+
+        frame = json.loads((await layer.receive(channel))['text'])
+        self.assertEqual([(stroke['color'], stroke['size'], stroke['points']) for stroke in frame['strokes']], [
+            ('#000000', 50, [0.0, 0.0, 10000.0, 1.0]), ('#00FF00', 2, [0.0, 0.0, 1.0, 1.0])
+        ])
+
+
+class WhiteboardLogTests(SimpleTestCase):
+    """Test the per-room whiteboard log and its compaction"""
+
+    def stroke(self, points, sender_id=1, color='#000000', size=2):
+        return {'sender': 'instructor', 'sender_id': sender_id, 'color': color, 'size': size, 'points': points}
+
+    def test_simplify_points_keeps_corners(self):
+        """Test collinear points are dropped and corners kept"""
+        line = [float(v) for step in range(20) for v in (step, 0)]
+        self.assertEqual(simplify_points(line, 0.5), [0.0, 0.0, 19.0, 0.0])
+
+        corner = [0.0, 0.0, 5.0, 0.0, 10.0, 0.0, 10.0, 5.0, 10.0, 10.0]
+        self.assertEqual(simplify_points(corner, 0.5), [0.0, 0.0, 10.0, 0.0, 10.0, 10.0])
+
+    def test_frames_are_applied_once_and_joined(self):
+        """Test repeated frames are ignored and continuing strokes are merged"""
+        log = WhiteboardLog()
+        self.assertTrue(log.accept('a', 1))
+        log.append([self.stroke([0.0, 0.0, 1.0, 1.0])])
+        self.assertFalse(log.accept('a', 1))
+        self.assertTrue(log.accept('a', 2))
+        log.append([self.stroke([1.0, 1.0, 2.0, 0.0]), self.stroke([5.0, 5.0, 6.0, 6.0], sender_id=2)])
+
+        self.assertEqual(
+            [stroke['points'] for stroke in log.snapshot()['strokes']],
+            [[0.0, 0.0, 1.0, 1.0, 2.0, 0.0], [5.0, 5.0, 6.0, 6.0]]
+        )
+
+        log.clear()
+        self.assertTrue(log.empty)
+        self.assertEqual(log.snapshot(), {'image': None, 'strokes': []})
+
+    def test_log_is_rendered_to_png_when_too_large(self):
+        """Test strokes beyond max_points are rendered into a bounded image"""
+        log = WhiteboardLog(compact_points=10, max_points=20, max_image_size=(100, 50))
+        for row in range(8):
+            # Zig-zags do not simplify away
+            if log.append([self.stroke([float(v) for step in range(6) for v in (step * 30, row * 10 + step % 2 * 5)])]):
+                log.compact()
+
+        self.assertLessEqual(log.points, 20)
+        self.assertIsNotNone(log.image)
+        with Image.open(io.BytesIO(log.image)) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.getpixel((0, 0))[:3], (0, 0, 0))
+
+        snapshot = log.snapshot()
+        self.assertTrue(snapshot['image'].startswith('data:image/png;base64,'))
+        copy = WhiteboardLog()
+        copy.load(snapshot)
+        self.assertEqual(copy.image, log.image)
+        self.assertEqual(copy.image_size, (100, 50))
+        self.assertEqual(copy.strokes, log.strokes)
+        self.assertEqual(base64.b64decode(snapshot['image'].split(',')[1]), log.snapshot(encode_image=False)['image'])
+
+    def test_render_skips_strokes_it_cannot_draw(self):
+        """Test a stroke with non-finite points or size from a peer does not break the log"""
+        log = WhiteboardLog(max_points=1)
+        log.load({'image': None, 'strokes': [
+            self.stroke([0.0, 0.0, float('nan'), 1.0]),
+            self.stroke([0.0, 0.0, 4.0, 4.0], size=float('inf')),
+        ]})
+        log.render()
+
+        self.assertEqual((log.strokes, log.image_size), ([], (7, 7)))
+        self.assertEqual(log.snapshot(encode_image=False)['image'], log.image)
+
+    async def test_compaction_runs_beside_new_strokes(self):
+        """Test strokes appended or a clear during a threaded compaction are not lost or undone"""
+        log = WhiteboardLog(compact_points=2)
+        self.assertTrue(log.append([self.stroke([0.0, 0.0, 1.0, 0.0, 2.0, 0.0])]))
+        compaction = asyncio.ensure_future(log.compact_async(only_if_due=True))
+        await asyncio.sleep(0)
+        self.assertFalse(log.empty)
+        log.append([self.stroke([5.0, 5.0, 6.0, 6.0], sender_id=2)])
+        await compaction
+
+        self.assertEqual([stroke['points'] for stroke in log.strokes], [[0.0, 0.0, 2.0, 0.0]])
+        self.assertEqual(
+            [stroke['points'] for stroke in (await log.snapshot_async())['strokes']],
+            [[0.0, 0.0, 2.0, 0.0], [5.0, 5.0, 6.0, 6.0]]
+        )
+
+        log.append([self.stroke([0.0, 0.0, 1.0, 1.0])])
+        compaction = asyncio.ensure_future(log.compact_async())
+        await asyncio.sleep(0)
+        log.clear()
+        await compaction
+        self.assertTrue(log.empty)
+
+
+class SignalingProtocolTests(SimpleTestCase):
+    """Test the binary signaling subprotocol encoding"""
+
+    def test_layout_messages_round_trip(self):
+        """Test fixed-layout messages decode to what JSON would have carried"""
+        messages = [
+            {'type': 'whiteboard_draw', 'x0': 1.2, 'y0': -3.4, 'x': 5.0, 'y': 6.0, 'color': '#abcdef', 'size': 4},
+            {'type': 'ice_candidate', 'candidate': {'candidate': 'candidate:1', 'sdpMLineIndex': 0},
+             'sender': 'student', 'sender_id': 3},
+            {'type': 'whiteboard_frame', 'strokes': [
+                {'sender': 'instructor', 'sender_id': 1, 'color': '#000000', 'size': 2, 'points': [0.0, 0.5, 9.9, 1e12]}
+            ]},
+            {'type': 'chat_message', 'message': 'hello', 'sender': 'student', 'sender_id': 3, 'timestamp': None},
+        ]
+        for message in messages:
+            frame = encode_message(message)
+            self.assertEqual(decode_message(frame), {k: v for k, v in message.items() if v is not None})
+            self.assertLess(len(frame), len(json.dumps(message)))
+
+        self.assertEqual(encode_message(messages[0])[0], 1)
+        self.assertEqual(decode_message(encode_message({'type': 'whiteboard_draw', 'x0': 'a'})),
+                         {'type': 'whiteboard_draw', 'x0': 'a'})
+
+    def test_other_messages_use_generic_map(self):
+        """Test messages without a layout travel as a map after type byte 0"""
+        message = {'type': 'session_end', 'ended_by': 'student', 'chat_log': [{'message': 'bye'}]}
+        frame = encode_message(message)
+        self.assertEqual(frame[0], 0)
+        self.assertEqual(decode_message(frame), message)
+
+    def test_malformed_frames_raise_value_error(self):
+        """Test undecodable frames raise ValueError"""
+        for frame in [b'', b'\x63\x90', b'\x00\x91\x01', b'\x07\x91\x91\x01', b'\x01\xc1']:
+            with self.assertRaises(ValueError):
+                decode_message(frame)
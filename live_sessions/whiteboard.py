@@ -0,0 +1,493 @@
+import asyncio
+import base64
+import io
+import logging
+import math
+import re
+import uuid
+from collections import deque
+from functools import partial
+from django.conf import settings
+from PIL import Image, ImageColor, ImageDraw
+from .protocol import encode_event
+
+
+logger = logging.getLogger(__name__)
+
+# Draw segments are clamped to this canvas, in pixels, and pen sizes to
+# this range; colours other than #rrggbb fall back to the default pen
+CANVAS_LIMIT = 10000
+PEN_SIZES = (1, 50)
+DEFAULT_COLOR = '#000000'
+DEFAULT_SIZE = 2
+_COLOR_RE = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+def simplify_points(points, tolerance):
+    """
+    Simplify a polyline with the Ramer-Douglas-Peucker algorithm
+
+    Args:
+        points: Flat list [x0, y0, x1, y1, ...]
+        tolerance: Largest distance in pixels a dropped point may lie
+                   from the simplified line
+
+    Returns:
+        list: Flat list of the kept points, first and last included
+    """
+    count = len(points) // 2
+    if count < 3:
+        return list(points)
+
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = points[2 * first], points[2 * first + 1]
+        x1, y1 = points[2 * last], points[2 * last + 1]
+        dx, dy = x1 - x0, y1 - y0
+        length = (dx * dx + dy * dy) ** 0.5
+
+        farthest, distance = None, tolerance
+        for index in range(first + 1, last):
+            x, y = points[2 * index], points[2 * index + 1]
+            if length:
+                d = abs(dy * x - dx * y + x1 * y0 - y1 * x0) / length
+            else:
+                d = ((x - x0) ** 2 + (y - y0) ** 2) ** 0.5
+            if d > distance:
+                farthest, distance = index, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+
+    return [value for index in range(count) if keep[index] for value in points[2 * index:2 * index + 2]]
+
+
+def _extend_stroke(strokes, open_strokes, stroke):
+    # Continue the sender's previous stroke when this one starts where it
+    # ended with the same pen; otherwise start a new stroke
+    previous = open_strokes.get(stroke['sender_id'])
+    if (
+        previous is not None
+        and previous['color'] == stroke['color']
+        and previous['size'] == stroke['size']
+        and previous['points'][-2:] == stroke['points'][:2]
+    ):
+        previous['points'] += stroke['points'][2:]
+        return previous
+    stroke = dict(stroke, points=list(stroke['points']))
+    strokes.append(stroke)
+    open_strokes[stroke['sender_id']] = stroke
+    return stroke
+
+
+def _compact(pending, strokes, image, image_size, tolerance, max_points, max_image_size):
+    # WhiteboardLog.compact() as a function of its state, so it can run
+    # in a thread on state the event loop no longer touches
+    strokes = strokes + [
+        dict(stroke, points=simplify_points(stroke['points'], tolerance))
+        for stroke in pending
+    ]
+    points = sum(len(stroke['points']) // 2 for stroke in strokes)
+    if points > max_points:
+        image, image_size = render_strokes(image, image_size, strokes, max_image_size)
+        strokes, points = [], 0
+    return strokes, points, image, image_size
+
+
+def render_strokes(image, image_size, strokes, max_image_size):
+    """
+    Draw strokes onto a transparent PNG
+
+    Strokes with points that are not finite numbers are skipped.
+
+    Args:
+        image: PNG bytes to draw over, or None
+        image_size: (width, height) of that image
+        strokes: Strokes to draw
+        max_image_size: Largest (width, height) of the result
+
+    Returns:
+        tuple: (PNG bytes, (width, height))
+    """
+    drawable = []
+    width, height = image_size
+    for stroke in strokes:
+        points = stroke['points']
+        if not points or not all(
+            isinstance(value, (int, float)) and math.isfinite(value) for value in points
+        ):
+            continue
+        try:
+            size = min(max(int(stroke['size']), PEN_SIZES[0]), PEN_SIZES[1])
+        except (OverflowError, TypeError, ValueError):
+            size = DEFAULT_SIZE
+        try:
+            color = ImageColor.getcolor(stroke['color'], 'RGBA')
+        except (AttributeError, TypeError, ValueError):
+            color = (0, 0, 0, 255)
+        width = max(width, int(max(points[0::2]) + size) + 1)
+        height = max(height, int(max(points[1::2]) + size) + 1)
+        drawable.append((list(zip(points[0::2], points[1::2])), color, size))
+    size = (min(width, max_image_size[0]), min(height, max_image_size[1]))
+
+    # Transparent, so strokes a client drew before the image loaded stay visible
+    result = Image.new('RGBA', size, (255, 255, 255, 0))
+    if image is not None:
+        with Image.open(io.BytesIO(image)) as previous:
+            result.paste(previous.convert('RGBA'), (0, 0))
+
+    draw = ImageDraw.Draw(result)
+    for xy, color, pen in drawable:
+        draw.line(xy, fill=color, width=pen, joint='curve')
+
+    output = io.BytesIO()
+    result.save(output, 'PNG', optimize=True)
+    return output.getvalue(), size
+
+
+class WhiteboardLog:
+    """
+    What a room's whiteboard shows, kept so late joiners see it at once
+
+    Strokes are appended as frames arrive and the log is emptied on
+    clear. Once `compact_points` points are pending they are compacted:
+    strokes continuing each other are joined and simplified to within
+    `tolerance` pixels. When more than `max_points` compacted points
+    accumulate they are rendered into a PNG and dropped, so a room holds
+    at most `compact_points + max_points` points and one image no larger
+    than `max_image_size`.
+
+    Every consumer of the room in this process receives each frame and
+    clear, so messages carry their batcher's origin and sequence number
+    and the log applies each one once.
+    """
+
+    def __init__(self, compact_points=2000, max_points=10000, tolerance=0.75, max_image_size=(2560, 1440)):
+        self.compact_points = compact_points
+        self.max_points = max_points
+        self.tolerance = tolerance
+        self.max_image_size = max_image_size
+        # PNG of the strokes rendered out of the log, and its size
+        self.image = None
+        self.image_size = (0, 0)
+        self.strokes = []
+        self.points = 0
+        self._pending = []
+        self._pending_points = 0
+        self._open = {}
+        # origin -> last sequence number applied
+        self._applied = {}
+        # Pending strokes being compacted in a thread, and a counter
+        # bumped by clear() so a compaction it overtook is dropped
+        self._compacting = asyncio.Lock()
+        self._inflight = []
+        self._generation = 0
+
+    @property
+    def empty(self):
+        return self.image is None and not self.strokes and not self._pending and not self._inflight
+
+    def accept(self, origin, seq):
+        """Return whether a message is new, marking it as applied"""
+        if origin is None:
+            return True
+        if seq <= self._applied.get(origin, 0):
+            return False
+        self._applied[origin] = seq
+        return True
+
+    def append(self, strokes):
+        """
+        Add the strokes of a frame
+
+        Returns:
+            bool: Whether enough points are pending to compact the log
+        """
+        for stroke in strokes:
+            _extend_stroke(self._pending, self._open, stroke)
+            self._pending_points += len(stroke['points']) // 2
+        return self._pending_points >= self.compact_points
+
+    def clear(self):
+        """Forget everything drawn so far"""
+        self._generation += 1
+        self.image = None
+        self.image_size = (0, 0)
+        self.strokes = []
+        self.points = 0
+        self._pending = []
+        self._pending_points = 0
+        self._open = {}
+
+    def compact(self):
+        """Simplify pending strokes into the log, rendering it when it is too large"""
+        self.strokes, self.points, self.image, self.image_size = _compact(
+            self._pending, self.strokes, self.image, self.image_size,
+            self.tolerance, self.max_points, self.max_image_size
+        )
+        self._pending = []
+        self._pending_points = 0
+        self._open = {}
+
+    async def compact_async(self, only_if_due=False):
+        """
+        compact(), with the simplifying and rendering run in a thread
+
+        The event loop serves every room of the process, so it must not
+        wait on Pillow. Strokes appended meanwhile stay pending for the
+        next compaction, and a clear or load meanwhile discards the result.
+
+        Args:
+            only_if_due: Skip unless compact_points points are pending
+        """
+        async with self._compacting:
+            if only_if_due and self._pending_points < self.compact_points:
+                return
+            if not self._pending and self.points <= self.max_points:
+                return
+            generation = self._generation
+            self._inflight = self._pending
+            self._pending = []
+            self._pending_points = 0
+            self._open = {}
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(None, partial(
+                    _compact, self._inflight, self.strokes, self.image, self.image_size,
+                    self.tolerance, self.max_points, self.max_image_size
+                ))
+            finally:
+                self._inflight = []
+            if generation == self._generation:
+                self.strokes, self.points, self.image, self.image_size = result
+
+    def render(self):
+        """Draw the compacted strokes onto the log's image and drop them"""
+        self.image, self.image_size = render_strokes(
+            self.image, self.image_size, self.strokes, self.max_image_size
+        )
+        self.strokes = []
+        self.points = 0
+
+    def snapshot(self, encode_image=True):
+        """
+        Return the whiteboard in one message-sized piece
+
+        Args:
+            encode_image: Give the image as a data URL (for clients)
+                          rather than PNG bytes (for storage)
+
+        Returns:
+            dict: image (or None) and the strokes to draw over it
+        """
+        self.compact()
+        return self._snapshot(encode_image)
+
+    async def snapshot_async(self, encode_image=True):
+        """snapshot(), compacting off the event loop"""
+        await self.compact_async()
+        async with self._compacting:
+            return self._snapshot(encode_image)
+
+    def _snapshot(self, encode_image):
+        image = self.image
+        if image is not None and encode_image:
+            image = 'data:image/png;base64,' + base64.b64encode(image).decode('ascii')
+        return {'image': image, 'strokes': self.strokes}
+
+    def load(self, snapshot):
+        """Replace the log with a snapshot another process sent"""
+        self.clear()
+        image = snapshot.get('image')
+        if image:
+            self.image = base64.b64decode(image.split(',', 1)[-1])
+            with Image.open(io.BytesIO(self.image)) as decoded:
+                self.image_size = decoded.size
+        self.strokes = [dict(stroke) for stroke in snapshot.get('strokes') or []]
+        self.points = sum(len(stroke['points']) // 2 for stroke in self.strokes)
+
+
+class FrameBatcher:
+    """
+    Coalesces the whiteboard draw segments of one room into frames
+
+    Every mousemove of a drawer is one segment. Instead of a group_send
+    per segment, segments are collected and sent to the room as a single
+    `whiteboard_frame` message every `interval` seconds, or as soon as
+    `max_segments` are pending. Consecutive segments of the same drawer,
+    colour and size that continue each other are merged into one stroke,
+    so a frame carries polylines rather than repeated endpoints.
+
+    The batcher also holds the room's WhiteboardLog for this process.
+    """
+
+    def __init__(self, channel_layer, group, interval=0.033, max_segments=200, log=None):
+        self.channel_layer = channel_layer
+        self.group = group
+        self.interval = interval
+        self.max_segments = max_segments
+        self.log = log or WhiteboardLog()
+        self.users = 0
+        self.origin = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._strokes = []
+        # sender_id -> that sender's last stroke in the pending frame
+        self._open = {}
+        self._segments = 0
+        self._timer = None
+        # Flush started by the timer, awaited when the last member leaves
+        self._tick_task = None
+        # reply_to channels of recently answered sync requests
+        self._synced = deque(maxlen=32)
+
+    async def add(self, user, data):
+        """
+        Buffer one draw segment from a client message
+
+        Args:
+            user: User who drew the segment
+            data: Decoded whiteboard_draw message with x0, y0, x, y and
+                  optional color and size
+
+        Returns:
+            bool: False if the segment's coordinates were not finite numbers
+        """
+        try:
+            coordinates = [float(data[key]) for key in ('x0', 'y0', 'x', 'y')]
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not all(math.isfinite(value) for value in coordinates):
+            return False
+
+        color = data.get('color')
+        if not isinstance(color, str) or not _COLOR_RE.fullmatch(color):
+            color = DEFAULT_COLOR
+        try:
+            size = min(max(int(data.get('size', DEFAULT_SIZE)), PEN_SIZES[0]), PEN_SIZES[1])
+        except (OverflowError, TypeError, ValueError):
+            size = DEFAULT_SIZE
+
+        _extend_stroke(self._strokes, self._open, {
+            'sender': user.username,
+            'sender_id': user.id,
+            'color': color,
+            'size': size,
+            'points': [round(min(max(value, 0.0), CANVAS_LIMIT), 1) for value in coordinates],
+        })
+        self._segments += 1
+
+        if self._segments >= self.max_segments or not self.interval:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._tick)
+        return True
+
+    def claim_sync(self, reply_to):
+        """Return True to the first consumer here to see a sync request"""
+        if reply_to in self._synced:
+            return False
+        self._synced.append(reply_to)
+        return True
+
+    def _tick(self):
+        self._timer = None
+        self._tick_task = asyncio.ensure_future(self.flush())
+        self._tick_task.add_done_callback(self._ticked)
+
+    def _ticked(self, task):
+        if self._tick_task is task:
+            self._tick_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                'Could not send a whiteboard frame to %s', self.group,
+                exc_info=task.exception()
+            )
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    async def flush(self):
+        """
+        Send the pending segments to the room as one frame
+
+        Returns:
+            int: Number of segments sent
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._strokes:
+            return 0
+
+        strokes, segments = self._strokes, self._segments
+        self._strokes, self._open, self._segments = [], {}, 0
+        seq = self._next_seq()
+        if self.users <= 0:
+            # No consumer left in this process to log the frame on receipt
+            self.log.accept(self.origin, seq)
+            if self.log.append(strokes):
+                await self.log.compact_async(only_if_due=True)
+        await self.channel_layer.group_send(self.group, encode_event(
+            {'type': 'whiteboard_frame', 'strokes': strokes},
+            handler='whiteboard_frame',
+            origin=self.origin,
+            seq=seq
+        ))
+        return segments
+
+    async def clear(self, user):
+        """Send pending segments, then tell the room to clear the board"""
+        await self.flush()
+        await self.channel_layer.group_send(self.group, encode_event(
+            {'type': 'whiteboard_clear', 'sender': user.username, 'sender_id': user.id},
+            handler='whiteboard_clear',
+            origin=self.origin,
+            seq=self._next_seq()
+        ))
+
+
+_batchers = {}
+
+
+def acquire_frame_batcher(channel_layer, group):
+    """Return the process-wide batcher of a room, creating it for its first member"""
+    batcher = _batchers.get(group)
+    if batcher is None:
+        batcher = _batchers[group] = FrameBatcher(
+            channel_layer,
+            group,
+            interval=getattr(settings, 'WHITEBOARD_FRAME_INTERVAL', 0.033),
+            max_segments=getattr(settings, 'WHITEBOARD_FRAME_MAX_SEGMENTS', 200),
+            log=WhiteboardLog(
+                compact_points=getattr(settings, 'WHITEBOARD_LOG_COMPACT_POINTS', 2000),
+                max_points=getattr(settings, 'WHITEBOARD_LOG_MAX_POINTS', 10000)
+            )
+        )
+    batcher.users += 1
+    return batcher
+
+
+async def release_frame_batcher(group):
+    """
+    Drop a member from a room's batcher, flushing what it still holds
+
+    Returns:
+        FrameBatcher: The batcher if its last member in this process left,
+                      otherwise None
+    """
+    batcher = _batchers.get(group)
+    if batcher is None:
+        return None
+    batcher.users -= 1
+    last = batcher.users <= 0
+    if last:
+        del _batchers[group]
+        if batcher._tick_task is not None:
+            # Its frame goes out first; a failure was logged by _ticked
+            await asyncio.wait([batcher._tick_task])
+    await batcher.flush()
+    return batcher if last else None
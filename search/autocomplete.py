@@ -0,0 +1,404 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from urllib.parse import urlencode
+from django.conf import settings
+from django.urls import reverse
+from courses.models import Course, Lesson
+
+
+# Keys are truncated to this many characters; longer queries are
+# truncated the same way before the lookup
+MAX_KEY_LENGTH = 40
+
+# Prefix ranges wider than this are answered once by a scan and then
+# served from a per-prefix top-N cache until an update touches them
+SCAN_LIMIT = 512
+CACHE_SIZE = 50
+
+_WORD_START = re.compile(r'\b\w', re.UNICODE)
+_WHITESPACE = re.compile(r'\s+')
+
+_KEY_END = '\U0010ffff'
+
+
+def normalize(text):
+    """Case-fold and collapse whitespace so lookups are case-insensitive"""
+    return _WHITESPACE.sub(' ', (text or '').casefold()).strip()
+
+
+def _keys_for(label):
+    """Index a label under every word start, so 'dja' matches 'Intro to Django'"""
+    text = normalize(label)
+    return {
+        text[match.start():match.start() + MAX_KEY_LENGTH]
+        for match in _WORD_START.finditer(text)
+    }
+
+
+class Suggestion:
+    """A single autocomplete entry"""
+
+    __slots__ = ('kind', 'object_id', 'label', 'url', 'weight', 'keys')
+
+    def __init__(self, kind, object_id, label, url, weight):
+        self.kind = kind
+        self.object_id = object_id
+        self.label = label
+        self.url = url
+        self.weight = weight
+        self.keys = _keys_for(label)
+
+    @property
+    def entry_id(self):
+        return (self.kind, self.object_id)
+
+    def as_dict(self):
+        return {
+            'type': self.kind,
+            'id': self.object_id,
+            'label': self.label,
+            'url': self.url,
+        }
+
+
+class PrefixIndex:
+    """
+    Compact prefix index over a sorted array of keys
+
+    Keys and entry IDs live in two parallel sorted lists searched with
+    bisect. Narrow prefix ranges are scanned directly; wide ranges (short
+    prefixes) are scanned once and their top entries cached until an
+    update touches one of the keys under that prefix.
+    """
+
+    def __init__(self, suggestions=()):
+        self._lock = threading.RLock()
+        self._entries = {suggestion.entry_id: suggestion for suggestion in suggestions}
+        pairs = sorted(
+            (key, entry_id)
+            for entry_id, suggestion in self._entries.items()
+            for key in suggestion.keys
+        )
+        self._keys = [key for key, _ in pairs]
+        self._ids = [entry_id for _, entry_id in pairs]
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kind, object_id):
+        return self._entries.get((kind, object_id))
+
+    def add(self, suggestion):
+        """Insert a suggestion, replacing any entry with the same kind and ID"""
+        with self._lock:
+            self.remove(suggestion.kind, suggestion.object_id)
+            entry_id = suggestion.entry_id
+            self._entries[entry_id] = suggestion
+            for key in suggestion.keys:
+                position = bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, entry_id)
+            self._invalidate(suggestion.keys)
+
+    def remove(self, kind, object_id):
+        """Remove a suggestion if present"""
+        with self._lock:
+            suggestion = self._entries.pop((kind, object_id), None)
+            if suggestion is None:
+                return
+            for key in suggestion.keys:
+                position = bisect_left(self._keys, key)
+                while self._ids[position] != suggestion.entry_id:
+                    position += 1
+                del self._keys[position]
+                del self._ids[position]
+            self._invalidate(suggestion.keys)
+
+    def set_weight(self, kind, object_id, weight):
+        """Change the ranking weight of an existing suggestion"""
+        with self._lock:
+            suggestion = self._entries.get((kind, object_id))
+            if suggestion is None or suggestion.weight == weight:
+                return
+            suggestion.weight = weight
+            self._invalidate(suggestion.keys)
+
+    def suggest(self, query, limit=10):
+        """
+        Return the highest-weighted suggestions whose label has a word
+        starting with the query
+
+        Args:
+            query: Text typed so far
+            limit: Maximum number of suggestions (at most CACHE_SIZE)
+
+        Returns:
+            list: Suggestion objects, heaviest first
+        """
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        limit = min(limit, CACHE_SIZE)
+
+        with self._lock:
+            cached = self._cache.get(prefix)
+            if cached is not None:
+                return [self._entries[entry_id] for entry_id in cached[:limit]]
+
+            low = bisect_left(self._keys, prefix)
+            high = bisect_right(self._keys, prefix + _KEY_END, low)
+            candidates = {self._ids[position] for position in range(low, high)}
+            wide = high - low > SCAN_LIMIT
+
+            top = heapq.nsmallest(
+                CACHE_SIZE if wide else limit,
+                candidates,
+                key=self._rank_key
+            )
+            if wide:
+                self._cache[prefix] = top
+            return [self._entries[entry_id] for entry_id in top[:limit]]
+
+    def _rank_key(self, entry_id):
+        suggestion = self._entries[entry_id]
+        return (-suggestion.weight, suggestion.label.casefold(), entry_id)
+
+    def _invalidate(self, keys):
+        """Drop cached results for every prefix of the given keys"""
+        if not self._cache:
+            return
+        for key in keys:
+            for length in range(1, len(key) + 1):
+                self._cache.pop(key[:length], None)
+
+
+class CatalogAutocomplete:
+    """
+    Autocomplete over course titles, lesson titles, instructor usernames
+    and categories, ranked by enrollment count
+
+    Lessons are weighted by their course's enrollments; instructors and
+    categories by the total enrollments of their courses.
+    """
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.loaded_at = time.monotonic()
+        self._lock = threading.RLock()
+        # course_id -> (instructor_id, category, weight)
+        self._courses = {}
+        # lesson_id -> course_id, and course_id -> set of lesson IDs
+        self._lesson_course = {}
+        self._course_lessons = {}
+        # instructor_id -> username
+        self._usernames = {}
+        # instructor_id / category -> [course count, total weight]
+        self._instructors = {}
+        self._categories = {}
+
+    @classmethod
+    def from_database(cls):
+        """Build the index from the database in two queries"""
+        autocomplete = cls()
+        suggestions = []
+
+        courses = Course.objects.order_by().values_list(
+            'id', 'title', 'category', 'student_count',
+            'instructor_id', 'instructor__username'
+        )
+        for course_id, title, category, weight, instructor_id, username in courses.iterator():
+            autocomplete._usernames[instructor_id] = username
+            autocomplete._track_course(course_id, instructor_id, category, weight)
+            suggestions.append(_course_suggestion(course_id, title, weight))
+
+        lessons = Lesson.objects.order_by().values_list('id', 'title', 'course_id')
+        for lesson_id, title, course_id in lessons.iterator():
+            autocomplete._track_lesson(lesson_id, course_id)
+            suggestions.append(
+                _lesson_suggestion(lesson_id, title, autocomplete._course_weight(course_id))
+            )
+
+        for instructor_id, (_, weight) in autocomplete._instructors.items():
+            suggestions.append(_instructor_suggestion(
+                instructor_id, autocomplete._usernames[instructor_id], weight
+            ))
+        for category, (_, weight) in autocomplete._categories.items():
+            suggestions.append(_category_suggestion(category, weight))
+
+        autocomplete.index = PrefixIndex(suggestions)
+        return autocomplete
+
+    def suggest(self, query, limit=10):
+        return self.index.suggest(query, limit)
+
+    def update_course(self, course):
+        """Apply a saved course to the index"""
+        with self._lock:
+            previous = self._forget_course(course.id)
+            self._usernames[course.instructor_id] = course.instructor.username
+            self._track_course(
+                course.id, course.instructor_id, course.category, course.student_count
+            )
+            self.index.add(_course_suggestion(course.id, course.title, course.student_count))
+            for lesson_id in self._course_lessons.get(course.id, ()):
+                self.index.set_weight('lesson', lesson_id, course.student_count)
+            
+            self._sync_group('instructor', course.instructor_id)
+            self._sync_group('category', course.category)
+            if previous:
+                self._sync_group('instructor', previous[0])
+                self._sync_group('category', previous[1])
+
+    def set_course_weight(self, course_id, weight):
+        """Re-rank a course, its lessons, instructor and category after its enrollments change"""
+        with self._lock:
+            previous = self._courses.get(course_id)
+            if previous is None or previous[2] == weight:
+                return
+            instructor_id, category, _ = previous
+            self._forget_course(course_id)
+            self._track_course(course_id, instructor_id, category, weight)
+            self.index.set_weight('course', course_id, weight)
+            for lesson_id in self._course_lessons.get(course_id, ()):
+                self.index.set_weight('lesson', lesson_id, weight)
+            self._sync_group('instructor', instructor_id)
+            self._sync_group('category', category)
+
+    def remove_course(self, course_id):
+        """Remove a deleted course (its lessons are removed by their own signals)"""
+        with self._lock:
+            previous = self._forget_course(course_id)
+            self.index.remove('course', course_id)
+            if previous:
+                self._sync_group('instructor', previous[0])
+                self._sync_group('category', previous[1])
+
+    def update_lesson(self, lesson):
+        """Apply a saved lesson to the index"""
+        with self._lock:
+            self._forget_lesson(lesson.id)
+            self._track_lesson(lesson.id, lesson.course_id)
+            self.index.add(_lesson_suggestion(
+                lesson.id, lesson.title, self._course_weight(lesson.course_id)
+            ))
+
+    def remove_lesson(self, lesson_id):
+        """Remove a deleted lesson"""
+        with self._lock:
+            self._forget_lesson(lesson_id)
+            self.index.remove('lesson', lesson_id)
+
+    def _course_weight(self, course_id):
+        return self._courses.get(course_id, (None, None, 0))[2]
+
+    def _track_course(self, course_id, instructor_id, category, weight):
+        self._courses[course_id] = (instructor_id, category, weight)
+        for groups, key in ((self._instructors, instructor_id), (self._categories, category)):
+            totals = groups.setdefault(key, [0, 0])
+            totals[0] += 1
+            totals[1] += weight
+
+    def _forget_course(self, course_id):
+        previous = self._courses.pop(course_id, None)
+        if previous:
+            instructor_id, category, weight = previous
+            for groups, key in ((self._instructors, instructor_id), (self._categories, category)):
+                totals = groups[key]
+                totals[0] -= 1
+                totals[1] -= weight
+                if totals[0] == 0:
+                    del groups[key]
+        return previous
+
+    def _track_lesson(self, lesson_id, course_id):
+        self._lesson_course[lesson_id] = course_id
+        self._course_lessons.setdefault(course_id, set()).add(lesson_id)
+
+    def _forget_lesson(self, lesson_id):
+        course_id = self._lesson_course.pop(lesson_id, None)
+        if course_id is not None:
+            lessons = self._course_lessons[course_id]
+            lessons.discard(lesson_id)
+            if not lessons:
+                del self._course_lessons[course_id]
+
+    def _sync_group(self, kind, key):
+        """Add, reweight or drop an instructor/category entry after a course change"""
+        groups = self._instructors if kind == 'instructor' else self._categories
+        totals = groups.get(key)
+        if totals is None:
+            self.index.remove(kind, key)
+            return
+        
+        if kind == 'instructor':
+            suggestion = _instructor_suggestion(key, self._usernames[key], totals[1])
+        else:
+            suggestion = _category_suggestion(key, totals[1])
+        
+        existing = self.index.get(kind, key)
+        if existing is None or existing.label != suggestion.label:
+            self.index.add(suggestion)
+        else:
+            self.index.set_weight(kind, key, totals[1])
+
+
+def _course_suggestion(course_id, title, weight):
+    return Suggestion('course', course_id, title, reverse('courses:detail', args=[course_id]), weight)
+
+
+def _lesson_suggestion(lesson_id, title, weight):
+    return Suggestion('lesson', lesson_id, title, reverse('courses:lesson_watch', args=[lesson_id]), weight)
+
+
+def _instructor_suggestion(instructor_id, username, weight):
+    url = f"{reverse('search:search')}?{urlencode({'q': username})}"
+    return Suggestion('instructor', instructor_id, username, url, weight)
+
+
+def _category_suggestion(category, weight):
+    label = dict(Course.CATEGORY_CHOICES).get(category, category)
+    url = f"{reverse('courses:list')}?{urlencode({'category': category})}"
+    return Suggestion('category', category, label, url, weight)
+
+
+_autocomplete = None
+_load_lock = threading.Lock()
+
+
+def get_autocomplete():
+    """
+    Return the process-wide autocomplete index, loading it on first use
+
+    The index is rebuilt once it is older than
+    SEARCH_AUTOCOMPLETE_MAX_AGE seconds, which picks up enrollment
+    counts and edits made by other worker processes (and by bulk
+    enrollment, which sends no signals). Changes made in this process
+    are applied by search.signals as they are committed.
+    """
+    global _autocomplete
+    max_age = getattr(settings, 'SEARCH_AUTOCOMPLETE_MAX_AGE', 900)
+
+    current = _autocomplete
+    if current is not None and time.monotonic() - current.loaded_at < max_age:
+        return current
+
+    with _load_lock:
+        if _autocomplete is current:
+            _autocomplete = CatalogAutocomplete.from_database()
+        return _autocomplete
+
+
+def get_loaded_autocomplete():
+    """Return the index only if it has already been loaded"""
+    return _autocomplete
+
+
+def reset_autocomplete():
+    """Discard the loaded index so the next lookup reloads it"""
+    global _autocomplete
+    with _load_lock:
+        _autocomplete = None
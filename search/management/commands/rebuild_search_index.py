@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from search.services import DOCUMENT_TYPES, is_search_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from courses, lessons and resources'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'doc_types',
+            nargs='*',
+            choices=sorted(DOCUMENT_TYPES),
+            help='Only rebuild these document types (default: all)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Documents inserted per batch'
+        )
+
+    def handle(self, *args, **options):
+        if not is_search_available():
+            raise CommandError('Full-text search requires the SQLite database backend')
+        
+        def report(doc_type, count):
+            self.stdout.write(f'  Indexed {count} {doc_type} document(s)')
+        
+        started = time.perf_counter()
+        counts = rebuild_index(
+            batch_size=options['batch_size'],
+            doc_types=options['doc_types'],
+            progress=report
+        )
+        elapsed = time.perf_counter() - started
+        
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} document(s) in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+CREATE_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    title,
+    body,
+    doc_type UNINDEXED,
+    object_id UNINDEXED,
+    url UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+)
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX_SQL)
+    # Rank with BM25, weighting title matches above body matches
+    schema_editor.execute(
+        "INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"
+    )
+    # Index what the tables already hold; the signals keep it current
+    from search.services import rebuild_index
+    rebuild_index(apps=apps)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS search_index')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('dashboards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
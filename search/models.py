@@ -0,0 +1,5 @@
+from django.db import models
+
+# No Django models needed for search app
+# The full-text index is an SQLite FTS5 virtual table created by
+# migrations/0001_initial.py and maintained through services.py
@@ -0,0 +1,308 @@
+import re
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from courses.models import Course, Lesson
+from dashboards.models import TechBlog, FreeResource, PlacementOpportunity
+
+
+INDEX_TABLE = 'search_index'
+
+# Markers wrapped around matched terms by FTS5; they cannot occur in
+# escaped HTML, so they are swapped for <mark> tags after escaping
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+MAX_QUERY_TERMS = 10
+
+
+def _course_document(course):
+    return (
+        course.title,
+        f"{course.description}\n{course.get_category_display()}",
+        reverse('courses:detail', args=[course.id])
+    )
+
+
+def _lesson_document(lesson):
+    return (
+        lesson.title,
+        lesson.description,
+        reverse('courses:lesson_watch', args=[lesson.id])
+    )
+
+
+def _blog_document(blog):
+    return (
+        blog.title,
+        f"{blog.excerpt}\n{blog.content}\n{blog.author}\n{blog.category}",
+        reverse('dashboards:blogs')
+    )
+
+
+def _resource_document(resource):
+    return (
+        resource.title,
+        f"{resource.description}\n{resource.subject}",
+        resource.file_url
+    )
+
+
+def _placement_document(placement):
+    skills = placement.required_skills
+    if isinstance(skills, (list, tuple)):
+        skills = ' '.join(str(skill) for skill in skills)
+    return (
+        f"{placement.company_name} - {placement.position}",
+        f"{placement.description}\n{placement.salary_range}\n{skills or ''}",
+        placement.application_link
+    )
+
+
+# doc_type: (rowid code, model, label, document builder)
+DOCUMENT_TYPES = {
+    'course': (1, Course, 'Course', _course_document),
+    'lesson': (2, Lesson, 'Lesson', _lesson_document),
+    'blog': (3, TechBlog, 'Tech Blog', _blog_document),
+    'resource': (4, FreeResource, 'Free Resource', _resource_document),
+    'placement': (5, PlacementOpportunity, 'Placement', _placement_document),
+}
+
+_TYPE_BY_MODEL = {
+    model: doc_type
+    for doc_type, (_, model, _, _) in DOCUMENT_TYPES.items()
+}
+
+
+def is_search_available():
+    """Return True if the database supports the FTS5 search index"""
+    return connection.vendor == 'sqlite'
+
+
+def get_doc_type(model):
+    """Return the doc_type indexed for a model class, or None"""
+    return _TYPE_BY_MODEL.get(model)
+
+
+def _rowid(doc_type, object_id):
+    """Pack doc type and primary key into one rowid so updates are point lookups"""
+    return object_id * 8 + DOCUMENT_TYPES[doc_type][0]
+
+
+def _document_row(doc_type, instance):
+    title, body, url = DOCUMENT_TYPES[doc_type][3](instance)
+    return (_rowid(doc_type, instance.pk), title, body or '', doc_type, instance.pk, url)
+
+
+def index_object(instance):
+    """
+    Add or refresh a single object in the search index
+
+    Args:
+        instance: Instance of one of the models in DOCUMENT_TYPES
+    """
+    doc_type = get_doc_type(type(instance))
+    if doc_type is None or not is_search_available():
+        return
+
+    row = _document_row(doc_type, instance)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [row[0]])
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, title, body, doc_type, object_id, url) '
+            f'VALUES (%s, %s, %s, %s, %s, %s)',
+            row
+        )
+
+
+def index_objects(instances, batch_size=1000):
+    """
+    Add or refresh many objects in the search index
+
+    Equivalent to index_object() for each instance, with one DELETE and
+    one INSERT statement per batch.
+
+    Args:
+        instances: Iterable of instances of the models in DOCUMENT_TYPES
+        batch_size: Rows written per executemany batch
+
+    Returns:
+        int: Number of documents indexed
+    """
+    if not is_search_available():
+        return 0
+
+    rows = [
+        _document_row(doc_type, instance)
+        for doc_type, instance in (
+            (get_doc_type(type(instance)), instance) for instance in instances
+        )
+        if doc_type is not None
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.executemany(
+                f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [(row[0],) for row in batch]
+            )
+            cursor.executemany(
+                f'INSERT INTO {INDEX_TABLE} (rowid, title, body, doc_type, object_id, url) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                batch
+            )
+    return len(rows)
+
+
+def remove_object(instance):
+    """
+    Remove a single object from the search index
+
+    Args:
+        instance: Instance of one of the models in DOCUMENT_TYPES
+    """
+    doc_type = get_doc_type(type(instance))
+    if doc_type is None or not is_search_available():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s',
+            [_rowid(doc_type, instance.pk)]
+        )
+
+
+def rebuild_index(batch_size=1000, doc_types=None, progress=None, apps=None):
+    """
+    Rebuild the search index from the source tables
+
+    Args:
+        batch_size: Rows inserted per executemany batch
+        doc_types: Optional list of doc types to rebuild (default: all)
+        progress: Optional callable(doc_type, count) called after each type
+        apps: Optional app registry of a migration, whose historical
+              models are read instead of the current ones
+
+    Returns:
+        dict: Number of documents indexed per doc type
+    """
+    doc_types = doc_types or list(DOCUMENT_TYPES)
+    insert_sql = (
+        f'INSERT INTO {INDEX_TABLE} (rowid, title, body, doc_type, object_id, url) '
+        f'VALUES (%s, %s, %s, %s, %s, %s)'
+    )
+    counts = {}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for doc_type in doc_types:
+            model = DOCUMENT_TYPES[doc_type][1]
+            if apps is not None:
+                model = apps.get_model(model._meta.label)
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE doc_type = %s', [doc_type])
+
+            count = 0
+            batch = []
+            for instance in model.objects.order_by().iterator(chunk_size=batch_size):
+                batch.append(_document_row(doc_type, instance))
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert_sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert_sql, batch)
+                count += len(batch)
+
+            counts[doc_type] = count
+            if progress:
+                progress(doc_type, count)
+
+        # Merge the b-tree segments written by the bulk insert
+        cursor.execute(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')")
+
+    return counts
+
+
+def build_match_query(text):
+    """
+    Turn free-form user input into a safe FTS5 MATCH expression
+
+    Every word is quoted so FTS5 operators in the input are treated as
+    text, and the last word is matched as a prefix for partial input.
+
+    Args:
+        text: Raw search string
+
+    Returns:
+        str: MATCH expression, or '' if the input has no searchable words
+    """
+    terms = re.findall(r'\w+', text or '')[:MAX_QUERY_TERMS]
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search(text, limit=20, doc_types=None):
+    """
+    Run a ranked full-text search
+
+    Results are ordered by BM25 with title matches weighted above body
+    matches, and carry HTML-safe title and snippet strings with matched
+    terms wrapped in <mark> tags.
+
+    Args:
+        text: Raw search string
+        limit: Maximum number of results
+        doc_types: Optional list of doc types to restrict the search to
+
+    Returns:
+        list: Result dicts with doc_type, label, object_id, url,
+              title, snippet and score
+    """
+    match = build_match_query(text)
+    if not match or not is_search_available():
+        return []
+
+    sql = (
+        f"SELECT doc_type, object_id, url, "
+        f"highlight({INDEX_TABLE}, 0, %s, %s), "
+        f"snippet({INDEX_TABLE}, 1, %s, %s, '…', 24), "
+        f"rank "
+        f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s"
+    )
+    params = [_MATCH_START, _MATCH_END, _MATCH_START, _MATCH_END, match]
+
+    if doc_types:
+        doc_types = [doc_type for doc_type in doc_types if doc_type in DOCUMENT_TYPES]
+        if not doc_types:
+            return []
+        sql += f" AND doc_type IN ({', '.join(['%s'] * len(doc_types))})"
+        params.extend(doc_types)
+
+    sql += ' ORDER BY rank LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        {
+            'doc_type': doc_type,
+            'label': DOCUMENT_TYPES[doc_type][2],
+            'object_id': object_id,
+            'url': url,
+            'title': _render_highlight(title),
+            'snippet': _render_highlight(snippet),
+            'score': -rank,
+        }
+        for doc_type, object_id, url, title, snippet, rank in rows
+    ]
+
+
+def _render_highlight(text):
+    """Escape indexed text and turn the FTS5 match markers into <mark> tags"""
+    html = escape(text or '')
+    html = html.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+    return mark_safe(html)
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from courses.models import Course, Enrollment, Lesson
+from .autocomplete import get_loaded_autocomplete
+from .services import DOCUMENT_TYPES, index_object, remove_object
+
+
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Refresh the indexed document when a searchable object is saved"""
+    if not raw:
+        index_object(instance)
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop the indexed document when a searchable object is deleted"""
+    remove_object(instance)
+
+
+for _, model, _, _ in DOCUMENT_TYPES.values():
+    post_save.connect(
+        update_search_index, 
+        sender=model, 
+        dispatch_uid=f'search_index_save_{model._meta.label_lower}'
+    )
+    post_delete.connect(
+        remove_from_search_index, 
+        sender=model, 
+        dispatch_uid=f'search_index_delete_{model._meta.label_lower}'
+    )
+
+
+# The autocomplete index lives in process memory, so it is only updated
+# once the change is committed, and only if it has been loaded already
+@receiver(post_save, sender=Course)
+def update_course_autocomplete(sender, instance, raw=False, **kwargs):
+    """Apply a saved course to the loaded autocomplete index"""
+    autocomplete = get_loaded_autocomplete()
+    if autocomplete is not None and not raw:
+        transaction.on_commit(lambda: autocomplete.update_course(instance))
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_autocomplete(sender, instance, **kwargs):
+    """Remove a deleted course from the loaded autocomplete index"""
+    autocomplete = get_loaded_autocomplete()
+    if autocomplete is not None:
+        course_id = instance.id
+        transaction.on_commit(lambda: autocomplete.remove_course(course_id))
+
+
+@receiver(post_save, sender=Lesson)
+def update_lesson_autocomplete(sender, instance, raw=False, **kwargs):
+    """Apply a saved lesson to the loaded autocomplete index"""
+    autocomplete = get_loaded_autocomplete()
+    if autocomplete is not None and not raw:
+        transaction.on_commit(lambda: autocomplete.update_lesson(instance))
+
+
+@receiver(post_delete, sender=Lesson)
+def remove_lesson_autocomplete(sender, instance, **kwargs):
+    """Remove a deleted lesson from the loaded autocomplete index"""
+    autocomplete = get_loaded_autocomplete()
+    if autocomplete is not None:
+        lesson_id = instance.id
+        transaction.on_commit(lambda: autocomplete.remove_lesson(lesson_id))
+
+
+def _refresh_course_weight(course_id):
+    autocomplete = get_loaded_autocomplete()
+    if autocomplete is None:
+        return
+
+    def refresh():
+        weight = Course.objects.filter(pk=course_id).values_list('student_count', flat=True).first()
+        if weight is not None:
+            autocomplete.set_course_weight(course_id, weight)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Enrollment)
+def update_course_weight(sender, instance, created, raw=False, **kwargs):
+    """Re-rank the course in the loaded autocomplete index when a student enrolls"""
+    if created and not raw:
+        _refresh_course_weight(instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def reduce_course_weight(sender, instance, **kwargs):
+    """Re-rank the course in the loaded autocomplete index when a student leaves"""
+    _refresh_course_weight(instance.course_id)
@@ -0,0 +1,230 @@
+import io
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+from courses.models import Course, Enrollment, Lesson
+from dashboards.models import FreeResource
+from .autocomplete import PrefixIndex, Suggestion, get_autocomplete, reset_autocomplete
+from .services import build_match_query, rebuild_index, search
+
+
+class SearchIndexTests(TestCase):
+    """Test cases for the FTS5 search index"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='test123'
+        )
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Django Web Development',
+            description='Build web applications with <b>Python</b>'
+        )
+        self.lesson = Lesson.objects.create(
+            course=self.course,
+            title='Models and Databases',
+            description='Learn how Django models map to database tables'
+        )
+        FreeResource.objects.create(
+            title='SQL Cheat Sheet',
+            description='Quick reference for database queries',
+            resource_type='cheatsheet',
+            file_url='https://example.com/sql.pdf',
+            subject='Database'
+        )
+    
+    def test_signals_index_and_remove(self):
+        """Test saved objects are searchable and deleted ones disappear"""
+        results = search('database')
+        self.assertEqual(
+            {result['doc_type'] for result in results},
+            {'lesson', 'resource'}
+        )
+        
+        self.lesson.delete()
+        results = search('database')
+        self.assertEqual([result['doc_type'] for result in results], ['resource'])
+    
+    def test_update_replaces_document(self):
+        """Test editing an object replaces its indexed text"""
+        self.course.title = 'Flask Microservices'
+        self.course.save()
+        self.assertEqual(search('flask')[0]['object_id'], self.course.id)
+        self.assertEqual(len(search('django', doc_types=['course'])), 0)
+    
+    def test_title_ranks_above_body(self):
+        """Test BM25 weighting puts title matches first"""
+        results = search('django')
+        self.assertEqual(results[0]['doc_type'], 'course')
+    
+    def test_highlight_is_escaped(self):
+        """Test snippets escape indexed HTML and mark matched terms"""
+        result = search('python')[0]
+        self.assertIn('<mark>Python</mark>', result['snippet'])
+        self.assertIn('&lt;b&gt;', result['snippet'])
+    
+    def test_prefix_and_operator_input(self):
+        """Test partial words match and FTS5 syntax in input is neutralised"""
+        self.assertEqual(build_match_query('web dev'), '"web" "dev"*')
+        self.assertTrue(search('develop'))
+        self.assertEqual(search('NEAR( "AND'), [])
+    
+    def test_rebuild_index(self):
+        """Test the bulk rebuild indexes every document type"""
+        counts = rebuild_index(batch_size=1)
+        self.assertEqual(counts['course'], 1)
+        self.assertEqual(counts['lesson'], 1)
+        self.assertEqual(counts['resource'], 1)
+        self.assertEqual(len(search('database')), 2)
+    
+    def test_migration_indexes_existing_rows(self):
+        """Test the rebuild run by the migration reads its historical models"""
+        state = MigrationLoader(connection).project_state(('search', '0001_initial'))
+        counts = rebuild_index(apps=state.apps)
+        self.assertEqual((counts['course'], counts['lesson'], counts['resource']), (1, 1, 1))
+        self.assertEqual(search('python')[0]['object_id'], self.course.id)
+    
+    def test_search_view(self):
+        """Test the search page renders highlighted results"""
+        client = Client()
+        client.login(username='instructor', password='test123')
+        response = client.get(reverse('search:search'), {'q': 'models'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<mark>Models</mark>', html=False)
+    
+    def test_import_indexes_only_new_objects(self):
+        """Test import_courses indexes what it created and leaves the rest alone"""
+        reset_autocomplete()
+        get_autocomplete()
+        # Changed without signals: a full rebuild would pick this up
+        Course.objects.filter(pk=self.course.pk).update(title='Unindexed Title')
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as manifest:
+            json.dump([{
+                'title': 'Rust Systems Programming', 'instructor': 'instructor',
+                'lessons': [{'title': 'Ownership and Borrowing'}],
+            }], manifest)
+        try:
+            call_command('import_courses', manifest.name, stdout=io.StringIO())
+        finally:
+            os.remove(manifest.name)
+        
+        self.assertEqual(search('rust')[0]['doc_type'], 'course')
+        self.assertEqual(search('ownership')[0]['doc_type'], 'lesson')
+        self.assertEqual(search('unindexed'), [])
+        labels = [suggestion.label for suggestion in get_autocomplete().suggest('ow')]
+        self.assertIn('Ownership and Borrowing', labels)
+        reset_autocomplete()
+
+
+
+class PrefixIndexTests(TestCase):
+    """Test cases for the in-memory autocomplete prefix index"""
+    
+    def test_word_prefix_and_ranking(self):
+        """Test any word start matches and heavier entries come first"""
+        index = PrefixIndex([
+            Suggestion('course', 1, 'Intro to Django', '/1/', 5),
+            Suggestion('course', 2, 'Django REST Framework', '/2/', 50),
+            Suggestion('course', 3, 'Data Science', '/3/', 500),
+        ])
+        labels = [s.label for s in index.suggest('dj')]
+        self.assertEqual(labels, ['Django REST Framework', 'Intro to Django'])
+        self.assertEqual(index.suggest('D')[0].label, 'Data Science')
+        self.assertEqual(index.suggest('xyz'), [])
+    
+    def test_incremental_updates_invalidate_cache(self):
+        """Test add, remove and reweight are reflected in cached wide prefixes"""
+        index = PrefixIndex([
+            Suggestion('lesson', i, f'Lesson {i}', f'/{i}/', i)
+            for i in range(1000)
+        ])
+        self.assertEqual(index.suggest('les', 1)[0].object_id, 999)
+        
+        index.set_weight('lesson', 5, 10000)
+        self.assertEqual(index.suggest('les', 1)[0].object_id, 5)
+        
+        index.remove('lesson', 5)
+        self.assertEqual(index.suggest('les', 1)[0].object_id, 999)
+        
+        index.add(Suggestion('lesson', 2000, 'Lesson extra', '/x/', 99999))
+        self.assertEqual(index.suggest('les', 1)[0].object_id, 2000)
+        self.assertEqual(len(index), 1000)
+
+
+class AutocompleteViewTests(TestCase):
+    """Test cases for the autocomplete endpoint"""
+    
+    def setUp(self):
+        reset_autocomplete()
+        self.instructor = User.objects.create_user(
+            username='djangoguru',
+            password='test123'
+        )
+        self.course = Course.objects.create(
+            instructor=self.instructor,
+            title='Django Web Development',
+            description='Test Description',
+            category='web_dev'
+        )
+        self.client = Client()
+        self.client.login(username='djangoguru', password='test123')
+    
+    def tearDown(self):
+        reset_autocomplete()
+    
+    def suggest(self, query):
+        response = self.client.get(reverse('search:autocomplete'), {'q': query})
+        return [(s['type'], s['label']) for s in response.json()['suggestions']]
+    
+    def test_suggestions_and_signal_updates(self):
+        """Test suggestions cover every kind and follow course/lesson changes"""
+        self.assertEqual(set(self.suggest('dja')), {
+            ('course', 'Django Web Development'),
+            ('instructor', 'djangoguru'),
+        })
+        self.assertIn(('category', 'Web Development'), self.suggest('web'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(course=self.course, title='Django Models')
+        self.assertIn(('lesson', 'Django Models'), self.suggest('django m'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+            self.course.title = 'Flask Basics'
+            self.course.save()
+        self.assertEqual(self.suggest('django m'), [])
+        self.assertIn(('course', 'Flask Basics'), self.suggest('fla'))
+    
+    def test_enrollments_rerank_without_reload(self):
+        """Test enrolling and unenrolling change the ranking of the loaded index"""
+        other = Course.objects.create(
+            instructor=self.instructor,
+            title='Django REST APIs',
+            description='Test Description',
+            category='web_dev'
+        )
+        student = User.objects.create_user(username='student', password='test123')
+        get_autocomplete()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=student, course=other)
+        self.assertEqual(self.suggest('django')[0], ('course', 'Django REST APIs'))
+        self.assertEqual(get_autocomplete().index.get('category', 'web_dev').weight, 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=student, course=self.course)
+            Enrollment.objects.filter(course=other).delete()
+        self.assertEqual(self.suggest('django')[0], ('course', 'Django Web Development'))
+    
+    def test_loaded_lazily_once(self):
+        """Test the index is built on first use and reused afterwards"""
+        first = get_autocomplete()
+        with self.assertNumQueries(0):
+            self.assertIs(get_autocomplete(), first)
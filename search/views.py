@@ -0,0 +1,49 @@
+from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from .autocomplete import get_autocomplete
+from .services import DOCUMENT_TYPES, is_search_available, search
+
+
+@login_required
+def search_view(request):
+    """
+    Full-text search across courses, lessons and resources
+    Results are ranked with BM25 and show highlighted snippets
+    """
+    query = request.GET.get('q', '').strip()
+    doc_type = request.GET.get('type', '')
+    if doc_type not in DOCUMENT_TYPES:
+        doc_type = ''
+    
+    results = []
+    if query:
+        results = search(query, doc_types=[doc_type] if doc_type else None)
+    
+    return render(request, 'search/results.html', {
+        'query': query,
+        'doc_type': doc_type,
+        'doc_types': [(key, value[2]) for key, value in DOCUMENT_TYPES.items()],
+        'results': results,
+        'search_available': is_search_available(),
+    })
+
+
+@login_required
+def autocomplete_view(request):
+    """
+    Search-as-you-type suggestions from the in-memory prefix index
+    Returns course titles, lesson titles, instructors and categories
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        limit = 8
+    
+    suggestions = get_autocomplete().suggest(query, limit)
+    
+    return JsonResponse({
+        'query': query,
+        'suggestions': [suggestion.as_dict() for suggestion in suggestions]
+    })
@@ -41,7 +41,8 @@ class SessionLog:
     """
     
     @staticmethod
-    def create_log(student_id, instructor_id, course_id, start_time, end_time=None, chat_transcript=None):
+    def create_log(student_id, instructor_id, course_id, start_time, end_time=None, chat_transcript=None,
+                   session_id=None):
         """
         Create a new session log in MongoDB
         
@@ -52,11 +53,13 @@ class SessionLog:
             start_time: Session start datetime
             end_time: Session end datetime (optional)
             chat_transcript: List of chat messages (optional)
+            session_id: ID of the DoubtSession being logged (optional)
         
         Returns:
             str: Inserted document ID
         """
         log_data = {
+            'session_id': session_id,
             'student_id': student_id,
             'instructor_id': instructor_id,
             'course_id': course_id,
@@ -141,6 +144,21 @@ class SessionLog:
             }}
         )
     
+    @staticmethod
+    def update_whiteboard(session_id, whiteboard):
+        """
+        Store the final whiteboard of a session on its log
+        
+        Args:
+            session_id: ID of the DoubtSession
+            whiteboard: Snapshot dict with the PNG image bytes (or None)
+                        and the strokes drawn over it
+        """
+        session_logs_collection.update_one(
+            {'session_id': session_id},
+            {'$set': {'whiteboard': whiteboard}}
+        )
+    
     @staticmethod
     def get_all_logs():
         """
@@ -42,6 +42,21 @@ def end_session_log(log_id, chat_log):
     SessionLog.update_log(log_id, end_time, chat_log)
 
 
+def save_whiteboard_snapshot(session_id, snapshot):
+    """
+    Store the final whiteboard of a session alongside its log
+    
+    Args:
+        session_id: ID of the DoubtSession
+        snapshot: WhiteboardLog.snapshot(encode_image=False)
+    """
+    SessionLog.update_whiteboard(session_id, {
+        'image': snapshot['image'],
+        'strokes': snapshot['strokes'],
+        'saved_at': datetime.now()
+    })
+
+
 def get_student_session_logs(student_id):
     """
     Get all session logs for a student with enriched data
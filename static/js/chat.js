@@ -47,13 +47,11 @@ class ChatManager {
         this.addMessage(this.userName, message, timestamp, true);
 
         // Send to other user
-        if (this.signalingSocket && this.signalingSocket.readyState === WebSocket.OPEN) {
-            this.signalingSocket.send(JSON.stringify({
-                type: 'chat_message',
-                message: message,
-                timestamp: timestamp
-            }));
-        }
+        SignalingProtocol.send(this.signalingSocket, {
+            type: 'chat_message',
+            message: message,
+            timestamp: timestamp
+        });
 
         // Clear input
         this.chatInput.value = '';
@@ -0,0 +1,154 @@
+/**
+ * Chunked Uploader
+ * Uploads lesson files in resumable chunks with per-chunk SHA-256 checksums
+ */
+class ChunkedUploader {
+    constructor(options = {}) {
+        this.csrfToken = options.csrfToken || '';
+        this.chunkSize = options.chunkSize || 8 * 1024 * 1024;
+        this.maxRetries = options.maxRetries || 5;
+        this.onProgress = options.onProgress || (() => {});
+    }
+
+    /**
+     * Upload one file to a lesson field ('video_file' or 'pdf_file')
+     */
+    async upload(initUrl, field, file) {
+        const storageKey = `chunked-upload:${initUrl}:${field}:${file.name}:${file.size}:${file.lastModified}`;
+        let session = await this.resume(storageKey);
+
+        if (!session) {
+            session = await this.request(initUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ field: field, filename: file.name, size: file.size })
+            });
+            localStorage.setItem(storageKey, session.url);
+        }
+
+        const chunkSize = Math.min(this.chunkSize, session.chunk_size || this.chunkSize);
+        let offset = session.offset;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + chunkSize);
+            try {
+                const result = await this.request(session.url, {
+                    method: 'PUT',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Upload-Offset': String(offset),
+                        'X-Chunk-Checksum': await this.checksum(chunk)
+                    },
+                    body: chunk
+                });
+                offset = result.offset;
+                retries = 0;
+                this.onProgress(field, offset, file.size);
+            } catch (error) {
+                if (++retries > this.maxRetries) throw error;
+                // Ask the server where to continue from, then retry
+                await new Promise(resolve => setTimeout(resolve, 500 * retries));
+                offset = (await this.request(session.url, { method: 'GET' })).offset;
+            }
+        }
+
+        const result = await this.request(session.url + 'finalize/', { method: 'POST' });
+        localStorage.removeItem(storageKey);
+        return result;
+    }
+
+    async resume(storageKey) {
+        const url = localStorage.getItem(storageKey);
+        if (!url) return null;
+
+        try {
+            const session = await this.request(url, { method: 'GET' });
+            if (session.status === 'pending') {
+                return Object.assign(session, { url: url });
+            }
+        } catch (error) {
+            console.warn('Could not resume upload:', error);
+        }
+        localStorage.removeItem(storageKey);
+        return null;
+    }
+
+    async checksum(blob) {
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        const hex = Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0'))
+            .join('');
+        return `sha256=${hex}`;
+    }
+
+    async request(url, options) {
+        options.headers = Object.assign({
+            'X-CSRFToken': this.csrfToken,
+            'Accept': 'application/json'
+        }, options.headers || {});
+        options.credentials = 'same-origin';
+
+        const response = await fetch(url, options);
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(data.error || `Upload request failed (${response.status})`);
+            error.status = response.status;
+            throw error;
+        }
+        return data;
+    }
+}
+
+/**
+ * Route a lesson form's file inputs through the chunked uploader
+ */
+function setupChunkedLessonForm(form) {
+    if (!form || !window.crypto || !crypto.subtle) return;
+
+    form.addEventListener('submit', async (event) => {
+        event.preventDefault();
+
+        const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+        const progress = form.querySelector('[data-upload-progress]');
+        const submit = form.querySelector('[type=submit]');
+        const files = Array.from(form.querySelectorAll('input[type=file]'))
+            .filter(input => input.files.length)
+            .map(input => [input.name, input.files[0]]);
+
+        const data = new FormData(form);
+        files.forEach(([name]) => data.delete(name));
+
+        const uploader = new ChunkedUploader({
+            csrfToken: csrfToken,
+            onProgress: (field, sent, total) => {
+                if (!progress) return;
+                const bar = progress.querySelector('.progress-bar');
+                const percent = Math.floor(sent * 100 / total);
+                bar.style.width = `${percent}%`;
+                bar.textContent = `${field.replace('_file', '')} ${percent}%`;
+            }
+        });
+
+        submit.disabled = true;
+        if (progress) progress.classList.remove('d-none');
+
+        try {
+            // Keep the created lesson so a retry after a failed upload
+            // resumes its files instead of adding the lesson twice
+            form.createdLesson = form.createdLesson ||
+                await uploader.request(form.action, { method: 'POST', body: data });
+            const lesson = form.createdLesson;
+            for (const [field, file] of files) {
+                await uploader.upload(lesson.upload_url, field, file);
+            }
+            window.location.href = lesson.redirect_url;
+        } catch (error) {
+            console.error('Lesson upload failed:', error);
+            alert(`Upload failed: ${error.message}. Submit again to resume.`);
+            submit.disabled = false;
+        }
+    });
+}
+
+document.querySelectorAll('form[data-chunked-upload]').forEach(setupChunkedLessonForm);
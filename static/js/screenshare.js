@@ -62,11 +62,9 @@ class ScreenShareManager {
             }
 
             // Notify other user
-            if (window.signalingSocket && window.signalingSocket.readyState === WebSocket.OPEN) {
-                window.signalingSocket.send(JSON.stringify({
-                    type: 'screen_share_start'
-                }));
-            }
+            SignalingProtocol.send(window.signalingSocket, {
+                type: 'screen_share_start'
+            });
 
             // Handle screen share stop
             this.screenTrack.onended = () => {
@@ -104,11 +102,9 @@ class ScreenShareManager {
             }
 
             // Notify other user
-            if (window.signalingSocket && window.signalingSocket.readyState === WebSocket.OPEN) {
-                window.signalingSocket.send(JSON.stringify({
-                    type: 'screen_share_stop'
-                }));
-            }
+            SignalingProtocol.send(window.signalingSocket, {
+                type: 'screen_share_stop'
+            });
 
             this.showNotification('Screen sharing stopped', 'success');
         } catch (error) {
@@ -0,0 +1,262 @@
+/**
+ * Signaling Protocol
+ * Binary WebSocket subprotocol for the session room, with JSON fallback
+ *
+ * A socket opened with connect() offers the binary subprotocol. When the
+ * server accepts it, messages travel as one type byte followed by a
+ * MessagePack body, using the same layouts as live_sessions/protocol.py;
+ * otherwise they stay JSON text. send() and decode() pick the right
+ * encoding for the socket, so callers only handle plain objects.
+ */
+const SignalingProtocol = (() => {
+    const SUBPROTOCOL = 'elearning.msgpack.v1';
+    const GENERIC = 0;
+
+    // Message type -> [type byte, fields in body order]
+    const LAYOUTS = {
+        whiteboard_draw: [1, ['x0', 'y0', 'x', 'y', 'color', 'size']],
+        ice_candidate: [2, ['candidate', 'sender', 'sender_id']],
+        offer: [3, ['offer', 'sender', 'sender_id']],
+        answer: [4, ['answer', 'sender', 'sender_id']],
+        chat_message: [5, ['message', 'sender', 'sender_id', 'timestamp']],
+        whiteboard_clear: [6, ['sender', 'sender_id']],
+        whiteboard_frame: [7, ['strokes']],
+        whiteboard_snapshot: [8, ['image', 'strokes']]
+    };
+    const TYPES = {};
+    for (const [type, [code, fields]] of Object.entries(LAYOUTS)) {
+        TYPES[code] = [type, fields];
+    }
+    const STROKE_FIELDS = ['sender', 'sender_id', 'color', 'size'];
+    // Fields sent as integer tenths of a pixel
+    const COORDINATES = new Set(['x0', 'y0', 'x', 'y']);
+
+    const textEncoder = new TextEncoder();
+    const textDecoder = new TextDecoder();
+
+    // Minimal MessagePack: nil, booleans, numbers, strings, binary,
+    // arrays and maps, which is all the signaling messages use
+
+    function pack(value, out) {
+        if (value === null || value === undefined) {
+            out.push(0xc0);
+        } else if (value === false || value === true) {
+            out.push(value ? 0xc3 : 0xc2);
+        } else if (typeof value === 'number') {
+            packNumber(value, out);
+        } else if (typeof value === 'string') {
+            const bytes = textEncoder.encode(value);
+            if (bytes.length < 32) {
+                out.push(0xa0 | bytes.length);
+            } else if (bytes.length < 0x100) {
+                out.push(0xd9, bytes.length);
+            } else if (bytes.length < 0x10000) {
+                out.push(0xda, bytes.length >> 8, bytes.length & 0xff);
+            } else {
+                out.push(0xdb, ...uint32(bytes.length));
+            }
+            for (const byte of bytes) out.push(byte);
+        } else if (value instanceof Uint8Array) {
+            out.push(0xc6, ...uint32(value.length));
+            for (const byte of value) out.push(byte);
+        } else if (Array.isArray(value)) {
+            packLength(value.length, 0x90, 0xdc, out);
+            for (const item of value) pack(item, out);
+        } else {
+            const entries = Object.entries(value).filter(([, item]) => item !== undefined);
+            packLength(entries.length, 0x80, 0xde, out);
+            for (const [key, item] of entries) {
+                pack(key, out);
+                pack(item, out);
+            }
+        }
+    }
+
+    function packLength(length, fixPrefix, prefix16, out) {
+        if (length < 16) {
+            out.push(fixPrefix | length);
+        } else if (length < 0x10000) {
+            out.push(prefix16, length >> 8, length & 0xff);
+        } else {
+            out.push(prefix16 + 1, ...uint32(length));
+        }
+    }
+
+    function packNumber(value, out) {
+        if (Number.isInteger(value) && value >= -0x80000000 && value <= 0xffffffff) {
+            if (value >= 0 && value < 0x80) {
+                out.push(value);
+            } else if (value < 0 && value >= -32) {
+                out.push(value & 0xff);
+            } else if (value >= -0x8000 && value < 0x8000) {
+                out.push(0xd1, (value >> 8) & 0xff, value & 0xff);
+            } else if (value < 0) {
+                out.push(0xd2, ...uint32(value >>> 0));
+            } else {
+                out.push(0xce, ...uint32(value));
+            }
+            return;
+        }
+        const view = new DataView(new ArrayBuffer(8));
+        view.setFloat64(0, value);
+        out.push(0xcb);
+        for (let i = 0; i < 8; i++) out.push(view.getUint8(i));
+    }
+
+    function uint32(value) {
+        return [(value >>> 24) & 0xff, (value >>> 16) & 0xff, (value >>> 8) & 0xff, value & 0xff];
+    }
+
+    function unpack(view, state) {
+        const byte = view.getUint8(state.offset++);
+        if (byte < 0x80) return byte;
+        if (byte >= 0xe0) return byte - 0x100;
+        if ((byte & 0xe0) === 0xa0) return readString(view, state, byte & 0x1f);
+        if ((byte & 0xf0) === 0x90) return readArray(view, state, byte & 0x0f);
+        if ((byte & 0xf0) === 0x80) return readMap(view, state, byte & 0x0f);
+
+        const read = (size, getter) => {
+            const value = view[getter](state.offset);
+            state.offset += size;
+            return value;
+        };
+        switch (byte) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return readBinary(view, state, read(1, 'getUint8'));
+            case 0xc5: return readBinary(view, state, read(2, 'getUint16'));
+            case 0xc6: return readBinary(view, state, read(4, 'getUint32'));
+            case 0xca: return read(4, 'getFloat32');
+            case 0xcb: return read(8, 'getFloat64');
+            case 0xcc: return read(1, 'getUint8');
+            case 0xcd: return read(2, 'getUint16');
+            case 0xce: return read(4, 'getUint32');
+            case 0xcf: return Number(read(8, 'getBigUint64'));
+            case 0xd0: return read(1, 'getInt8');
+            case 0xd1: return read(2, 'getInt16');
+            case 0xd2: return read(4, 'getInt32');
+            case 0xd3: return Number(read(8, 'getBigInt64'));
+            case 0xd9: return readString(view, state, read(1, 'getUint8'));
+            case 0xda: return readString(view, state, read(2, 'getUint16'));
+            case 0xdb: return readString(view, state, read(4, 'getUint32'));
+            case 0xdc: return readArray(view, state, read(2, 'getUint16'));
+            case 0xdd: return readArray(view, state, read(4, 'getUint32'));
+            case 0xde: return readMap(view, state, read(2, 'getUint16'));
+            case 0xdf: return readMap(view, state, read(4, 'getUint32'));
+        }
+        throw new Error(`Unsupported MessagePack byte 0x${byte.toString(16)}`);
+    }
+
+    function readString(view, state, length) {
+        const bytes = new Uint8Array(view.buffer, view.byteOffset + state.offset, length);
+        state.offset += length;
+        return textDecoder.decode(bytes);
+    }
+
+    function readBinary(view, state, length) {
+        const bytes = new Uint8Array(view.buffer, view.byteOffset + state.offset, length).slice();
+        state.offset += length;
+        return bytes;
+    }
+
+    function readArray(view, state, length) {
+        const items = new Array(length);
+        for (let i = 0; i < length; i++) items[i] = unpack(view, state);
+        return items;
+    }
+
+    function readMap(view, state, length) {
+        const map = {};
+        for (let i = 0; i < length; i++) {
+            const key = unpack(view, state);
+            map[key] = unpack(view, state);
+        }
+        return map;
+    }
+
+    // Layout encoding
+
+    const packCoordinate = (value) => (typeof value === 'number' ? Math.round(value * 10) : value);
+    const unpackCoordinate = (value) => (Number.isInteger(value) ? value / 10 : value);
+
+    function encode(message) {
+        const layout = LAYOUTS[message.type];
+        const out = [];
+        if (!layout) {
+            out.push(GENERIC);
+            pack(message, out);
+            return new Uint8Array(out);
+        }
+
+        const [code, fields] = layout;
+        const body = fields.map((field) => {
+            const value = message[field];
+            if (COORDINATES.has(field)) return packCoordinate(value);
+            if (field === 'strokes') {
+                return (value || []).map((stroke) => [
+                    ...STROKE_FIELDS.map((key) => stroke[key]),
+                    stroke.points.map(packCoordinate)
+                ]);
+            }
+            return value;
+        });
+        // Trailing fields the sender left out are not sent
+        while (body.length && (body[body.length - 1] === undefined || body[body.length - 1] === null)) {
+            body.pop();
+        }
+        out.push(code);
+        pack(body, out);
+        return new Uint8Array(out);
+    }
+
+    function decodeBinary(buffer) {
+        const view = new DataView(buffer);
+        const code = view.getUint8(0);
+        const body = unpack(view, { offset: 1 });
+        if (code === GENERIC) return body;
+        if (!TYPES[code]) throw new Error(`Unknown frame type ${code}`);
+
+        const [type, fields] = TYPES[code];
+        const message = { type };
+        fields.forEach((field, index) => {
+            if (index >= body.length) return;
+            let value = body[index];
+            if (COORDINATES.has(field)) {
+                value = unpackCoordinate(value);
+            } else if (field === 'strokes') {
+                value = (value || []).map((stroke) => {
+                    const decoded = {};
+                    STROKE_FIELDS.forEach((key, i) => { decoded[key] = stroke[i]; });
+                    decoded.points = stroke[STROKE_FIELDS.length].map(unpackCoordinate);
+                    return decoded;
+                });
+            }
+            message[field] = value;
+        });
+        return message;
+    }
+
+    return {
+        SUBPROTOCOL,
+
+        connect(url) {
+            const socket = new WebSocket(url, [SUBPROTOCOL]);
+            socket.binaryType = 'arraybuffer';
+            return socket;
+        },
+
+        send(socket, message) {
+            if (!socket || socket.readyState !== WebSocket.OPEN) return false;
+            socket.send(socket.protocol === SUBPROTOCOL ? encode(message) : JSON.stringify(message));
+            return true;
+        },
+
+        decode(event) {
+            return event.data instanceof ArrayBuffer ? decodeBinary(event.data) : JSON.parse(event.data);
+        },
+
+        encode,
+        decodeBinary
+    };
+})();
@@ -0,0 +1,103 @@
+/**
+ * Watch Progress
+ * Sends playback heartbeats and offers to resume from the stored position
+ */
+class WatchProgress {
+    constructor(video, options = {}) {
+        this.video = video;
+        this.url = video.dataset.heartbeatUrl;
+        this.csrfToken = video.dataset.csrfToken;
+        this.resumePosition = parseInt(video.dataset.resumePosition || '0', 10);
+        this.interval = options.interval || 15000;
+
+        this.watched = 0;
+        this.lastTime = null;
+        this.timer = null;
+
+        this.setupEventListeners();
+    }
+
+    setupEventListeners() {
+        this.video.addEventListener('loadedmetadata', () => this.offerResume());
+        this.video.addEventListener('timeupdate', () => this.trackWatched());
+        this.video.addEventListener('play', () => this.start());
+        this.video.addEventListener('pause', () => this.stop());
+        this.video.addEventListener('ended', () => this.stop());
+        this.video.addEventListener('seeking', () => { this.lastTime = null; });
+
+        // Last report when the tab is hidden or closed
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') this.send(true);
+        });
+        window.addEventListener('pagehide', () => this.send(true));
+    }
+
+    offerResume() {
+        const prompt = document.getElementById('resume-prompt');
+        const position = this.resumePosition;
+        // Nothing worth resuming at the very start or end of the video
+        if (!prompt || position < 5 || position > this.video.duration - 5) return;
+
+        prompt.querySelector('[data-resume-time]').textContent = this.formatTime(position);
+        prompt.classList.remove('d-none');
+        prompt.querySelector('button').addEventListener('click', () => {
+            this.video.currentTime = position;
+            this.video.play();
+            prompt.classList.add('d-none');
+        });
+        this.video.addEventListener('play', () => prompt.classList.add('d-none'), { once: true });
+    }
+
+    trackWatched() {
+        const now = this.video.currentTime;
+        if (this.lastTime !== null && !this.video.paused) {
+            const delta = now - this.lastTime;
+            // Ignore jumps from seeking; only count real playback
+            if (delta > 0 && delta < 2) this.watched += delta;
+        }
+        this.lastTime = now;
+    }
+
+    start() {
+        if (this.timer) return;
+        this.timer = setInterval(() => this.send(false), this.interval);
+    }
+
+    stop() {
+        clearInterval(this.timer);
+        this.timer = null;
+        this.send(false);
+    }
+
+    send(useBeacon) {
+        if (!this.url || (this.watched < 1 && this.video.currentTime === this.sentPosition)) return;
+
+        const data = new FormData();
+        data.append('position', Math.floor(this.video.currentTime));
+        data.append('watched', Math.round(this.watched));
+        data.append('csrfmiddlewaretoken', this.csrfToken);
+
+        this.sentPosition = this.video.currentTime;
+        this.watched = 0;
+
+        if (useBeacon && navigator.sendBeacon) {
+            navigator.sendBeacon(this.url, data);
+        } else {
+            fetch(this.url, { method: 'POST', body: data, credentials: 'same-origin' })
+                .catch(error => console.warn('Heartbeat failed:', error));
+        }
+    }
+
+    formatTime(seconds) {
+        const minutes = Math.floor(seconds / 60);
+        const rest = String(Math.floor(seconds % 60)).padStart(2, '0');
+        return `${minutes}:${rest}`;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const video = document.getElementById('lesson-video');
+    if (video && video.dataset.heartbeatUrl) {
+        window.watchProgress = new WatchProgress(video);
+    }
+});
@@ -58,14 +58,14 @@ class WebRTCManager {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const signalingUrl = `${protocol}//${window.location.host}/ws/session/${this.roomName}/`;
 
-        this.signalingSocket = new WebSocket(signalingUrl);
+        this.signalingSocket = SignalingProtocol.connect(signalingUrl);
 
         this.signalingSocket.onopen = () => {
             console.log('Signaling connection established');
         };
 
         this.signalingSocket.onmessage = async (event) => {
-            const data = JSON.parse(event.data);
+            const data = SignalingProtocol.decode(event);
             await this.handleSignalingMessage(data);
         };
 
@@ -201,9 +201,7 @@ class WebRTCManager {
     }
 
     sendSignalingMessage(message) {
-        if (this.signalingSocket && this.signalingSocket.readyState === WebSocket.OPEN) {
-            this.signalingSocket.send(JSON.stringify(message));
-        }
+        SignalingProtocol.send(this.signalingSocket, message);
     }
 
     setupControlButtons() {
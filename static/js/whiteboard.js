@@ -108,17 +108,15 @@ class WhiteboardManager {
         this.drawLine(this.lastX, this.lastY, pos.x, pos.y);
 
         // Send to other user
-        if (window.signalingSocket && window.signalingSocket.readyState === WebSocket.OPEN) {
-            window.signalingSocket.send(JSON.stringify({
-                type: 'whiteboard_draw',
-                x: pos.x,
-                y: pos.y,
-                x0: this.lastX,
-                y0: this.lastY,
-                color: this.color,
-                size: this.size
-            }));
-        }
+        SignalingProtocol.send(window.signalingSocket, {
+            type: 'whiteboard_draw',
+            x: pos.x,
+            y: pos.y,
+            x0: this.lastX,
+            y0: this.lastY,
+            color: this.color,
+            size: this.size
+        });
 
         this.lastX = pos.x;
         this.lastY = pos.y;
@@ -142,25 +140,72 @@ class WhiteboardManager {
         this.ctx.stroke();
     }
 
-    clear() {
+    resetCanvas() {
         if (!this.ctx) return;
 
         this.ctx.fillStyle = '#ffffff';
         this.ctx.fillRect(0, 0, this.canvas.width, this.canvas.height);
+    }
+
+    clear() {
+        if (!this.ctx) return;
+
+        this.resetCanvas();
 
         // Notify other user
-        if (window.signalingSocket && window.signalingSocket.readyState === WebSocket.OPEN) {
-            window.signalingSocket.send(JSON.stringify({
-                type: 'whiteboard_clear'
-            }));
-        }
+        SignalingProtocol.send(window.signalingSocket, {
+            type: 'whiteboard_clear'
+        });
     }
 
     handleRemoteDrawing(data) {
         this.drawLine(data.x0, data.y0, data.x, data.y, data.color, data.size);
     }
 
+    handleRemoteFrame(data) {
+        // A frame holds every stroke drawn in the room since the previous
+        // one; points is a flat [x0, y0, x1, y1, ...] polyline
+        if (!this.ctx) return;
+
+        for (const stroke of data.strokes || []) {
+            const points = stroke.points;
+            if (!points || points.length < 4) continue;
+
+            this.ctx.strokeStyle = stroke.color || this.color;
+            this.ctx.lineWidth = stroke.size || this.size;
+            this.ctx.lineCap = 'round';
+            this.ctx.lineJoin = 'round';
+
+            this.ctx.beginPath();
+            this.ctx.moveTo(points[0], points[1]);
+            for (let i = 2; i + 1 < points.length; i += 2) {
+                this.ctx.lineTo(points[i], points[i + 1]);
+            }
+            this.ctx.stroke();
+        }
+    }
+
     handleRemoteClear() {
-        this.clear();
+        // Only repaint: clear() would broadcast the clear back to the room
+        this.resetCanvas();
+    }
+
+    handleSnapshot(data) {
+        // The board as the server keeps it: an image of older strokes,
+        // if any, with the recent strokes drawn over it
+        if (!this.ctx) return;
+
+        this.resetCanvas();
+        const frame = { strokes: data.strokes };
+        if (data.image) {
+            const image = new Image();
+            image.onload = () => {
+                this.ctx.drawImage(image, 0, 0);
+                this.handleRemoteFrame(frame);
+            };
+            image.src = data.image;
+        } else {
+            this.handleRemoteFrame(frame);
+        }
     }
 }
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ThumbnailsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'thumbnails'
+    verbose_name = 'Thumbnails'
+    
+    def ready(self):
+        # Import signals to generate variants for newly saved images
+        import thumbnails.signals
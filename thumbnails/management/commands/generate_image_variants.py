@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import as_completed
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from thumbnails.processing import is_stale, render_variants
+from thumbnails.variants import VARIANTS, get_pool, get_targets, reset_pool
+
+
+class Command(BaseCommand):
+    help = 'Generate resized and WebP variants for course thumbnails and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes (default: IMAGE_VARIANT_WORKERS)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants that are already up to date'
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        started = time.perf_counter()
+        
+        jobs = []
+        for label, field_name in VARIANTS:
+            model = apps.get_model(label)
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).order_by()
+            for instance in queryset.only('pk', field_name).iterator():
+                source_path, targets = get_targets(getattr(instance, field_name))
+                if targets and (force or is_stale(source_path, targets)):
+                    jobs.append((source_path, targets))
+        
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('All image variants are up to date'))
+            return
+        
+        self.stdout.write(f'Generating variants for {len(jobs)} image(s)...')
+        
+        written = failed = 0
+        pool = get_pool(options['workers'])
+        try:
+            futures = {
+                pool.submit(render_variants, source_path, targets, force): source_path
+                for source_path, targets in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'  {futures[future]}: {e}')
+        finally:
+            reset_pool(wait=True)
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} variant file(s) for {len(jobs) - failed} image(s) '
+            f'in {elapsed:.2f}s ({len(jobs) / elapsed:.1f} images/s)'
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} image(s) could not be processed'))
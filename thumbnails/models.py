@@ -0,0 +1,5 @@
+from django.db import models
+
+# No Django models needed for thumbnails app
+# Variants are plain files stored next to the original image, see
+# variants.py for the sizes generated per image field
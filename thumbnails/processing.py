@@ -0,0 +1,109 @@
+"""
+Pillow image processing for the derivative pipeline
+
+This module deliberately does not import Django: it runs inside the
+worker processes of the variant pool, which only need Pillow.
+"""
+import os
+from PIL import Image, ImageOps
+
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_FORMATS = {
+    '.jpg': 'JPEG',
+    '.png': 'PNG',
+    '.webp': 'WEBP',
+}
+
+
+def is_stale(source_path, targets):
+    """
+    Return True if any target is missing or older than the source
+
+    Args:
+        source_path: Path of the original image
+        targets: List of (path, width, height, crop) tuples
+    """
+    try:
+        source_mtime = os.stat(source_path).st_mtime
+    except FileNotFoundError:
+        return False
+
+    for path, *_ in targets:
+        try:
+            if os.stat(path).st_mtime < source_mtime:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
+
+
+def render_variants(source_path, targets, force=False):
+    """
+    Decode an image once and write every requested variant
+
+    JPEG sources are decoded with draft mode, which lets libjpeg scale
+    by 1/2, 1/4 or 1/8 while decoding, so a 12 megapixel phone photo is
+    never fully decompressed just to produce a few hundred pixels.
+    Each variant is written to a temporary file and renamed into place,
+    so readers never see a partially written image.
+
+    Args:
+        source_path: Path of the original image
+        targets: List of (path, width, height, crop) tuples; the output
+                 format follows the path's extension
+        force: Regenerate variants that are already up to date
+
+    Returns:
+        int: Number of variant files written
+    """
+    if not force and not is_stale(source_path, targets):
+        return 0
+
+    largest = max(max(width, height) for _, width, height, _ in targets)
+
+    with Image.open(source_path) as image:
+        # Square draft size keeps both sides large enough after an EXIF rotation
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info
+        )
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for path, width, height, crop in targets:
+            if crop:
+                variant = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                variant = image.copy()
+                variant.thumbnail((width, height), Image.Resampling.LANCZOS)
+            _save(variant, path)
+
+    return len(targets)
+
+
+def _save(image, path):
+    extension = os.path.splitext(path)[1].lower()
+    image_format = _FORMATS[extension]
+
+    if image_format == 'JPEG':
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+    elif image_format == 'WEBP':
+        options = {'quality': WEBP_QUALITY, 'method': 4}
+    else:
+        options = {'optimize': True}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        image.save(temporary, image_format, **options)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save
+from .variants import VARIANTS, schedule_variants
+
+
+def generate_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Queue variant generation once a saved image has been committed"""
+    if raw:
+        return
+    for label, field_name in VARIANTS:
+        if label != sender._meta.label:
+            continue
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        field_file = getattr(instance, field_name)
+        if field_file:
+            transaction.on_commit(lambda field_file=field_file: schedule_variants(field_file))
+
+
+for _label in {label for label, _ in VARIANTS}:
+    post_save.connect(
+        generate_image_variants, 
+        sender=apps.get_model(_label), 
+        dispatch_uid=f'image_variants_{_label.lower()}'
+    )
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html
+from ..variants import get_variant_specs, get_variant_urls
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def variant_url(field_file, variant):
+    """
+    Return the URL of an image variant, or of the original until the
+    variant has been generated
+    
+    Usage: {% variant_url course.thumbnail 'card' %}
+    """
+    if not field_file:
+        return ''
+    urls = get_variant_urls(field_file, variant)
+    return urls[0] if urls else field_file.url
+
+
+@register.simple_tag
+def picture(field_file, variant, alt='', css_class='', style=''):
+    """
+    Render a <picture> serving the WebP variant with a JPEG/PNG fallback,
+    or a plain <img> of the original until the variants exist
+    
+    Usage: {% picture course.thumbnail 'card' alt=course.title css_class='card-img-top' %}
+    """
+    if not field_file:
+        return ''
+    
+    urls = get_variant_urls(field_file, variant)
+    if urls is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">',
+            field_file.url, alt, css_class, style
+        )
+    
+    width, height, crop = get_variant_specs(field_file)[variant]
+    size = format_html(' width="{}" height="{}"', width, height) if crop else ''
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" alt="{}" class="{}" style="{}"{} loading="lazy" decoding="async">'
+        '</picture>',
+        urls[1], urls[0], alt, css_class, style, size
+    )
@@ -0,0 +1,75 @@
+import io
+import tempfile
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+from courses.models import Course
+from .variants import get_targets, get_variant_name, get_variant_urls, schedule_variants
+
+
+def make_image(size=(1600, 1200), image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 40)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_VARIANTS_ASYNC=False)
+class ImageVariantTests(TestCase):
+    """Test cases for the thumbnail and profile picture derivatives"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', password='test123')
+    
+    def create_course(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Course.objects.create(
+                instructor=self.instructor,
+                title='Photo Course',
+                description='Test Description',
+                **kwargs
+            )
+    
+    def test_variants_generated_on_save(self):
+        """Test a saved thumbnail gets resized JPEG and WebP variants"""
+        course = self.create_course(
+            thumbnail=SimpleUploadedFile('photo.jpeg', make_image(), 'image/jpeg')
+        )
+        
+        fallback, webp = get_variant_urls(course.thumbnail, 'card')
+        self.assertTrue(fallback.endswith('.card.jpg'))
+        self.assertTrue(webp.endswith('.card.webp'))
+        
+        storage = course.thumbnail.storage
+        with Image.open(storage.path(get_variant_name(course.thumbnail.name, 'card'))) as card:
+            self.assertEqual(card.size, (720, 400))
+        with Image.open(storage.path(get_variant_name(course.thumbnail.name, 'detail', True))) as detail:
+            self.assertEqual(detail.format, 'WEBP')
+            self.assertEqual(detail.size, (800, 600))
+        
+        # Up to date variants are not rendered again
+        self.assertIsNone(schedule_variants(course.thumbnail))
+    
+    def test_template_falls_back_to_original(self):
+        """Test the picture tag serves the original until variants exist"""
+        with self.settings(IMAGE_VARIANTS_ASYNC=True):
+            with self.captureOnCommitCallbacks(execute=False):
+                course = self.create_course(
+                    thumbnail=SimpleUploadedFile('photo.png', make_image(image_format='PNG'), 'image/png')
+                )
+        template = Template("{% load thumbnails %}{% picture course.thumbnail 'card' alt='x' %}")
+        
+        html = template.render(Context({'course': course}))
+        self.assertNotIn('<picture>', html)
+        self.assertIn(course.thumbnail.url, html)
+        
+        self.assertEqual(schedule_variants(course.thumbnail), 4)
+        html = template.render(Context({'course': course}))
+        self.assertIn('.card.webp', html)
+        self.assertIn('.card.png', html)
+    
+    def test_fields_without_variants_are_ignored(self):
+        """Test courses without a thumbnail schedule nothing"""
+        course = self.create_course()
+        self.assertEqual(get_targets(course.thumbnail), (None, []))
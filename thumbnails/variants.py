@@ -0,0 +1,166 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .processing import is_stale, render_variants
+
+
+logger = logging.getLogger(__name__)
+
+
+# Model label and image field -> {variant name: (width, height, crop)}
+# Sizes are twice the displayed CSS size so they stay sharp on HiDPI screens
+VARIANTS = {
+    ('courses.Course', 'thumbnail'): {
+        'card': (720, 400, True),
+        'detail': (800, 800, False),
+    },
+    ('accounts.UserProfile', 'profile_picture'): {
+        'avatar': (300, 300, True),
+    },
+}
+
+
+def get_variant_specs(field_file):
+    """Return the variant specs for an image field, or an empty dict"""
+    field = field_file.field
+    return VARIANTS.get((field.model._meta.label, field.name), {})
+
+
+def get_variant_name(name, variant, webp=False):
+    """
+    Return the storage name of a variant, stored next to the original
+
+    'course_thumbnails/photo.jpeg' becomes 'course_thumbnails/photo.card.jpg'
+    and 'course_thumbnails/photo.card.webp'. PNG and GIF sources keep a
+    PNG fallback so transparency survives; everything else becomes JPEG.
+    """
+    stem, extension = os.path.splitext(name)
+    if webp:
+        extension = '.webp'
+    elif extension.lower() in ('.png', '.gif'):
+        extension = '.png'
+    else:
+        extension = '.jpg'
+    return f'{stem}.{variant}{extension}'
+
+
+def get_targets(field_file):
+    """
+    Build the (path, width, height, crop) targets for an image
+
+    Returns:
+        tuple: (source path, targets), or (None, []) when the image has
+               no variants or its storage is not on the local filesystem
+    """
+    specs = get_variant_specs(field_file)
+    if not field_file or not specs:
+        return None, []
+
+    storage = field_file.storage
+    try:
+        source_path = storage.path(field_file.name)
+    except NotImplementedError:
+        return None, []
+
+    targets = []
+    for variant, (width, height, crop) in specs.items():
+        for webp in (False, True):
+            name = get_variant_name(field_file.name, variant, webp)
+            targets.append((storage.path(name), width, height, crop))
+    return source_path, targets
+
+
+def schedule_variants(field_file, force=False):
+    """
+    Generate the variants of an image off the request path
+
+    Work is handed to a process pool unless IMAGE_VARIANTS_ASYNC is
+    False, in which case the variants are rendered inline. Images whose
+    variants are already up to date are skipped without touching the pool.
+
+    Args:
+        field_file: FieldFile of a field listed in VARIANTS
+        force: Regenerate variants that are already up to date
+
+    Returns:
+        Future or int or None: The pool future, the number of files
+        written when run inline, or None if nothing was scheduled
+    """
+    source_path, targets = get_targets(field_file)
+    if not targets or not (force or is_stale(source_path, targets)):
+        return None
+
+    if not getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        return render_variants(source_path, targets, force)
+
+    try:
+        future = get_pool().submit(render_variants, source_path, targets, force)
+    except BrokenProcessPool:
+        reset_pool()
+        future = get_pool().submit(render_variants, source_path, targets, force)
+    future.add_done_callback(_log_failure(field_file.name))
+    return future
+
+
+def _log_failure(name):
+    def callback(future):
+        error = future.exception()
+        if error is not None:
+            logger.warning('Could not generate image variants for %s: %s', name, error)
+    return callback
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers=None):
+    """
+    Return the process-wide variant pool, starting it on first use
+
+    Workers are spawned rather than forked, so they never inherit the
+    parent's database connections or threads; they only import Pillow.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def reset_pool(wait=False):
+    """Shut the pool down so the next submission starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def get_variant_urls(field_file, variant):
+    """
+    Return the URLs of an image variant if it has been generated
+
+    Args:
+        field_file: FieldFile of a field listed in VARIANTS
+        variant: Variant name from VARIANTS
+
+    Returns:
+        tuple: (fallback URL, WebP URL), or None until both files exist
+    """
+    if not field_file or variant not in get_variant_specs(field_file):
+        return None
+
+    storage = field_file.storage
+    fallback = get_variant_name(field_file.name, variant)
+    webp = get_variant_name(field_file.name, variant, webp=True)
+    if not (storage.exists(fallback) and storage.exists(webp)):
+        return None
+    return storage.url(fallback), storage.url(webp)